@@ -7,8 +7,8 @@ import json # Importa json
 
 from app.core.config import settings
 # Asegúrate de que las rutas de importación sean correctas
-from app.schemas.analisis_schema import AnalisisEntrada, PrediccionResultado
-from app.services.ml_service import obtener_prediccion
+from app.schemas.analisis_schema import PrediccionResultado
+from app.services.ml_service import construir_perfil, obtener_prediccion_perfil
 from app.agents.openai_agent import generar_plan_con_rag
 
 logger = logging.getLogger(__name__)
@@ -155,63 +155,57 @@ def process_chat_message(history: List[dict]) -> tuple[str, dict | None, bool]:
         logger.info("OpenAI solicitó una llamada a herramienta. ¡Extrayendo datos!")
         try:
             tool_call = tool_calls[0]
-            # Validamos el JSON que nos pasó el LLM
+            # Única validación: el JSON que nos pasó el LLM. De aquí en adelante
+            # los datos viajan sin revalidar (RiskProfile hasta el predictor)
             tool_data = PredictionData.model_validate_json(tool_call.function.arguments)
             
             modelo_elegido = tool_data.modelo_a_usar
-            logger.info(f"Modelo elegido por el agente: {modelo_elegido}")
-            
-            # Convertimos los datos de Pydantic a un schema AnalisisEntrada
-            # El schema de Pydantic se encarga de la conversión
-            ml_input_data = tool_data.model_dump()
-            # Añadimos 'fecha' si no está, aunque el modelo ML no la use
-            ml_input_data.setdefault('fecha', '2025-01-01') 
+            logger.info("Modelo elegido por el agente: %s", modelo_elegido)
             
             # Calcular IMC si no se proporcionó pero tenemos altura y peso
-            if ml_input_data.get('imc') is None:
-                altura = ml_input_data.get('altura_cm')
-                peso = ml_input_data.get('peso_kg')
+            datos = tool_data
+            if tool_data.imc is None:
+                altura = tool_data.altura_cm
+                peso = tool_data.peso_kg
                 if altura and peso and altura > 0:
-                    ml_input_data['imc'] = peso / ((altura / 100) ** 2)
-                    logger.info(f"IMC calculado automáticamente: {ml_input_data['imc']:.2f} (peso: {peso}kg, altura: {altura}cm)")
+                    # Copia superficial sin validación; tool_data queda intacto para el frontend
+                    datos = tool_data.model_copy(update={"imc": peso / ((altura / 100) ** 2)})
+                    logger.info("IMC calculado automáticamente: %.2f (peso: %skg, altura: %scm)", datos.imc, peso, altura)
             
             # Validar que el modelo seleccionado sea apropiado para los datos disponibles
             # El modelo cardiovascular requiere HDL, LDL, triglicéridos (TODOS)
             # El modelo diabetes usa presión sistólica y colesterol total
-            tiene_hdl_ldl_trig = (ml_input_data.get('hdl_mgdl') is not None and 
-                                  ml_input_data.get('ldl_mgdl') is not None and 
-                                  ml_input_data.get('trigliceridos_mgdl') is not None)
-            tiene_presion_colesterol = (ml_input_data.get('presion_sistolica') is not None and 
-                                       ml_input_data.get('colesterol_total') is not None)
+            tiene_hdl_ldl_trig = (datos.hdl_mgdl is not None and 
+                                  datos.ldl_mgdl is not None and 
+                                  datos.trigliceridos_mgdl is not None)
+            tiene_presion_colesterol = (datos.presion_sistolica is not None and 
+                                       datos.colesterol_total is not None)
             
             # Si el agente eligió cardiovascular pero no tenemos HDL/LDL/trig completos, usar diabetes
             if modelo_elegido == "cardiovascular" and not tiene_hdl_ldl_trig:
                 if tiene_presion_colesterol:
-                    logger.warning(f"⚠️ El agente eligió 'cardiovascular' pero faltan datos completos de lípidos (HDL/LDL/triglicéridos). "
-                                 f"Cambiando a 'diabetes' que usa presión y colesterol total.")
+                    logger.warning("⚠️ El agente eligió 'cardiovascular' pero faltan datos completos de lípidos (HDL/LDL/triglicéridos). "
+                                   "Cambiando a 'diabetes' que usa presión y colesterol total.")
                     modelo_elegido = "diabetes"
-                    ml_input_data['modelo'] = "diabetes"
                 else:
-                    logger.error(f"❌ Modelo cardiovascular requiere HDL, LDL y triglicéridos, pero no están disponibles.")
+                    logger.error("❌ Modelo cardiovascular requiere HDL, LDL y triglicéridos, pero no están disponibles.")
                     return "Lo siento, para usar el modelo cardiovascular necesito los valores de HDL, LDL y triglicéridos. ¿Podrías proporcionarlos?", None, False
             
-            ml_input = AnalisisEntrada(**ml_input_data) 
-            
             # Llamamos al servicio de ML con el modelo seleccionado (posiblemente corregido)
-            pred_result = obtener_prediccion(ml_input, model_type=modelo_elegido)
-            logger.info(f"Predicción obtenida con modelo '{modelo_elegido}': score={pred_result.get('score')}, risk_level={pred_result.get('categoria_riesgo')}")
+            pred_result = obtener_prediccion_perfil(construir_perfil(datos), modelo_elegido)
+            logger.info("Predicción obtenida con modelo '%s': score=%s, risk_level=%s", modelo_elegido, pred_result.get('score'), pred_result.get('categoria_riesgo'))
             
             if "error" in pred_result:
                 return f"Tuve problemas al calcular tu predicción: {pred_result['error']}", None, False
 
-            # Convert dict to PrediccionResultado Pydantic object
-            prediccion_obj = PrediccionResultado(**pred_result)
+            # Validación en pydantic-core: más barata que model_construct (Python puro)
+            prediccion_obj = PrediccionResultado.model_validate(pred_result)
             
             # Generar respuesta humanizada (nuestro /coach RAG)
             logger.info("Generando plan con RAG...")
             plan_ia, citas_kb = generar_plan_con_rag(
                 prediccion=prediccion_obj,
-                datos=ml_input
+                datos=datos
             )
             logger.info(f"Plan generado exitosamente. Longitud: {len(plan_ia)} caracteres, Citas: {len(citas_kb)}")
 
@@ -0,0 +1,204 @@
+# back/app/agents/kb_store.py
+"""
+Base de conocimiento en memoria para el RAG del chat y del coach.
+
+Se carga una sola vez: las entradas ``kb/*.json`` ya parseadas, con su conteo
+de tokens precalculado, y el índice BM25 + LSA de los documentos ``kb/*.md``
+que usa ``KnowledgeBase``. Las búsquedas leen solo de memoria (sin abrir archivos ni
+volver a tokenizar).
+
+Un hilo vigilante compara cada ``interval_seconds`` la huella de ``kb/``
+(nombre, tamaño y mtime de cada archivo) y, si cambió, carga una instantánea
+nueva y reemplaza la referencia de una vez: las búsquedas en curso terminan
+sobre la instantánea anterior y nunca ven una KB a medio recargar.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.ml.bm25_index import BM25Index, load_or_build_index
+from app.ml.dense_index import DEFAULT_DIM
+from app.ml.rag_system import KnowledgeBase, RAGRetriever
+from app.utils.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+_PATRONES_KB = ("*.json", "*.md")
+
+
+@dataclass(frozen=True)
+class KBEntrada:
+    """Entrada ``kb/<termino>.json`` parseada, con sus tokens ya contados."""
+    termino: str
+    doc: Dict[str, Any]
+    tokens: int
+
+
+@dataclass(frozen=True)
+class KBSnapshot:
+    """Estado inmutable de la KB en un momento dado."""
+    entradas: Dict[str, KBEntrada]
+    retriever: RAGRetriever
+    huella: str
+    cargada_en: float
+    load_ms: float
+
+
+def huella_kb(kb_dir: Path) -> str:
+    """Nombre, tamaño y mtime de cada archivo de la KB (solo ``stat``, sin leer contenidos)."""
+    digest = hashlib.sha256()
+    for path in sorted(p for patron in _PATRONES_KB for p in Path(kb_dir).glob(patron)):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        digest.update(f"{path.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _cargar_entradas(kb_dir: Path) -> Dict[str, KBEntrada]:
+    entradas = {}
+    for path in sorted(Path(kb_dir).glob("*.json")):
+        try:
+            doc = json.loads(path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            logger.error("Error: El archivo '%s' no es un JSON válido.", path.name)
+            continue
+        except OSError as e:
+            logger.error("Error al leer el archivo KB '%s': %s", path, e)
+            continue
+        # Mismo texto que se envía al modelo, así el presupuesto no cambia
+        tokens = count_tokens(json.dumps(doc, ensure_ascii=False))
+        entradas[path.stem] = KBEntrada(termino=path.stem, doc=doc, tokens=tokens)
+    return entradas
+
+
+class KBStore:
+    """
+    Instantánea de la KB con recarga atómica.
+
+    Expone ``retrieve`` / ``retrieve_batch`` sobre los documentos ``.md``, así
+    que puede usarse como el retriever de ``CoachGenerator``.
+    """
+
+    def __init__(
+        self,
+        kb_dir: Path,
+        index_dir: Optional[Path] = None,
+        query_cache_size: int = 256,
+        dense_dim: int = DEFAULT_DIM,
+    ):
+        self.kb_dir = Path(kb_dir)
+        self.index_dir = Path(index_dir) if index_dir else None
+        self.query_cache_size = query_cache_size
+        self.dense_dim = dense_dim
+        self._snapshot: Optional[KBSnapshot] = None
+        self._lock = threading.Lock()
+        self._recargas = 0
+        self._ultimo_error: Optional[str] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _cargar(self) -> KBSnapshot:
+        started = time.perf_counter()
+        # Huella antes de leer: un cambio durante la carga se detecta en la próxima vuelta
+        huella = huella_kb(self.kb_dir)
+        entradas = _cargar_entradas(self.kb_dir)
+        if self.index_dir is not None:
+            index = load_or_build_index(self.kb_dir, self.index_dir, dense_dim=self.dense_dim)
+        else:
+            index = BM25Index.from_chunks(KnowledgeBase(str(self.kb_dir)).get_all_chunks(), dense_dim=self.dense_dim)
+        snapshot = KBSnapshot(
+            entradas=entradas,
+            retriever=RAGRetriever(index=index, cache_size=self.query_cache_size),
+            huella=huella,
+            cargada_en=time.time(),
+            load_ms=round((time.perf_counter() - started) * 1000, 1),
+        )
+        logger.info(
+            "KB cargada en memoria: %s entradas JSON, %s chunks .md (%.1f ms)",
+            len(entradas), len(index), snapshot.load_ms,
+        )
+        return snapshot
+
+    @property
+    def snapshot(self) -> KBSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._cargar()
+            return self._snapshot
+
+    def get_entry(self, termino: str) -> Optional[KBEntrada]:
+        return self.snapshot.entradas.get(termino)
+
+    def retrieve(self, query: str, top_k: int = 3) -> List[Dict[str, str]]:
+        return self.snapshot.retriever.retrieve(query, top_k)
+
+    def retrieve_batch(self, queries: List[str], top_k: int = 3) -> List[List[Dict[str, str]]]:
+        return self.snapshot.retriever.retrieve_batch(queries, top_k)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Recarga la KB si cambió en disco; True si se reemplazó la instantánea."""
+        current = self._snapshot
+        if current is not None and not force and huella_kb(self.kb_dir) == current.huella:
+            return False
+
+        snapshot = self._cargar()
+        with self._lock:
+            self._snapshot = snapshot
+            if current is not None:
+                self._recargas += 1
+        return True
+
+    def start_watcher(self, interval_seconds: float) -> None:
+        """Revisa ``kb/`` cada ``interval_seconds`` en un hilo daemon."""
+        if interval_seconds <= 0 or self._watcher is not None:
+            return
+
+        def watch() -> None:
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.refresh()
+                    self._ultimo_error = None
+                except Exception as e:
+                    # La instantánea anterior sigue activa
+                    self._ultimo_error = str(e)
+                    logger.error("No se pudo recargar la KB: %s", e)
+
+        self._stop.clear()
+        self._watcher = threading.Thread(target=watch, name="kb-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        stats: Dict[str, Any] = {
+            "loaded": snapshot is not None,
+            "kb_dir": str(self.kb_dir),
+            "reloads": self._recargas,
+            "watching": self._watcher is not None,
+            "last_error": self._ultimo_error,
+        }
+        if snapshot is not None:
+            stats.update({
+                "entries": {termino: entrada.tokens for termino, entrada in snapshot.entradas.items()},
+                "md_chunks": len(snapshot.retriever.chunks),
+                "loaded_at": snapshot.cargada_en,
+                "load_ms": snapshot.load_ms,
+                "query_cache": snapshot.retriever.cache_stats(),
+            })
+        return stats
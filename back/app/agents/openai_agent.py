@@ -61,6 +61,10 @@ def generar_plan_con_rag(
     prediccion: PrediccionResultado, 
     datos: AnalisisEntrada
 ) -> tuple[str, list[str]]:
+    """
+    Plan de acción con RAG. ``datos`` solo se lee por atributos: el chat pasa
+    directamente su PredictionData validado en lugar de un AnalisisEntrada.
+    """
     
     if client is None:
         logger.error("OpenAI client not initialized. Cannot generate plan.")
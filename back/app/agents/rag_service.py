@@ -1,8 +1,10 @@
 # back/app/agents/rag_service.py
+import copy
 import logging
 import os
 import json
 from pathlib import Path
+from app.agents.kb_store import KBStore
 from app.utils.token_counter import count_tokens, truncate_to_budget
 from app.core.config import settings
 
@@ -125,31 +127,31 @@ def map_feature_to_kb(feature_name: str) -> str:
     return 'default'
 
 
+_kb_store = None
+
+
+def get_kb_store() -> KBStore:
+    """KB en memoria (se carga en el primer uso; el vigilante la recarga si cambia)."""
+    global _kb_store
+    if _kb_store is None:
+        _kb_store = KBStore(
+            KB_PATH,
+            index_dir=settings.KB_INDEX_DIR if settings.KB_INDEX_ENABLED else None,
+            query_cache_size=settings.RAG_QUERY_CACHE_MAX_ENTRIES,
+            dense_dim=settings.RAG_DENSE_DIM,
+        )
+    return _kb_store
+
+
 def load_kb_content(termino_clave: str) -> dict | None:
     """
-    Carga el contenido de un archivo .json de la KB.
+    Contenido de un archivo .json de la KB (copia desde la KB en memoria).
     """
-    # ¡Cambiamos la extensión!
-    filename = f"{termino_clave}.json"
-    filepath = KB_PATH / filename
-    
-    if not filepath.exists():
-        logger.warning(f"No se encontró el archivo '{filename}' en la KB.")
-        return None
-
-    try:
-        # ¡Leemos el archivo como JSON!
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # Devolvemos el diccionario JSON completo
-            return data
-            
-    except json.JSONDecodeError:
-        logger.error(f"Error: El archivo '{filename}' no es un JSON válido.")
-        return None
-    except Exception as e:
-        logger.error(f"Error al leer el archivo KB '{filepath}': {e}")
+    entrada = get_kb_store().get_entry(termino_clave)
+    if entrada is None:
+        logger.warning(f"No se encontró el archivo '{termino_clave}.json' en la KB.")
         return None
+    return copy.deepcopy(entrada.doc)
 
 
 def buscar_en_kb(terminos_clave: list[str], max_tokens: int = None) -> tuple[str, list[str]]:
@@ -162,6 +164,9 @@ def buscar_en_kb(terminos_clave: list[str], max_tokens: int = None) -> tuple[str
     - Respeta el presupuesto de tokens
     - Trunca si es necesario
     
+    Las entradas y sus tokens vienen de la KB en memoria: sin lecturas de
+    disco ni re-tokenización (salvo al truncar ``default`` cuando nada cabe).
+    
     Args:
         terminos_clave: Lista de términos clave (drivers) para buscar
         max_tokens: Máximo de tokens permitidos (por defecto usa TOKEN_BUDGET_RAG)
@@ -172,45 +177,36 @@ def buscar_en_kb(terminos_clave: list[str], max_tokens: int = None) -> tuple[str
     if max_tokens is None:
         max_tokens = settings.TOKEN_BUDGET_RAG
     
-    logger.info(f"Iniciando búsqueda RAG (budget: {max_tokens} tokens) con drivers: {terminos_clave}")
+    logger.debug("Iniciando búsqueda RAG (budget: %s tokens) con drivers: %s", max_tokens, terminos_clave)
+    
+    # Una sola instantánea para toda la búsqueda, aunque el vigilante recargue en paralelo
+    entradas = get_kb_store().snapshot.entradas
     
     # Estructuras para priorización
     priority_docs = []  # Documentos de drivers específicos
-    default_doc = None
     citas = set()
 
     if not terminos_clave:
         terminos_clave = ["default"]
 
-    # 1. Cargar documentos de drivers (alta prioridad)
+    # 1. Documentos de drivers (alta prioridad)
     for termino in terminos_clave:
         if termino.lower() == "default":
             continue
         
         # Mapear el nombre técnico de la feature a un nombre de archivo KB
         termino_limpio = map_feature_to_kb(termino)
-        kb_entry = load_kb_content(termino_limpio)
+        kb_entry = entradas.get(termino_limpio)
         
         if kb_entry:
-            doc_tokens = count_tokens(json.dumps(kb_entry, ensure_ascii=False))
-            priority_docs.append({
-                "doc": kb_entry,
-                "tokens": doc_tokens,
-                "term": termino_limpio
-            })
-            citas.add(kb_entry.get("cita", "sin_cita"))
-            logger.info(f"Cargado documento '{termino_limpio}': {doc_tokens} tokens")
+            priority_docs.append(kb_entry)
+            citas.add(kb_entry.doc.get("cita", "sin_cita"))
+            logger.debug("Documento '%s': %s tokens", termino_limpio, kb_entry.tokens)
+        else:
+            logger.warning(f"No se encontró el archivo '{termino_limpio}.json' en la KB.")
 
-    # 2. Cargar documento default (baja prioridad)
-    kb_entry_default = load_kb_content("default")
-    if kb_entry_default:
-        default_tokens = count_tokens(json.dumps(kb_entry_default, ensure_ascii=False))
-        default_doc = {
-            "doc": kb_entry_default,
-            "tokens": default_tokens,
-            "term": "default"
-        }
-        logger.info(f"Cargado documento 'default': {default_tokens} tokens")
+    # 2. Documento default (baja prioridad)
+    default_doc = entradas.get("default")
 
     # 3. Construir contexto respetando el presupuesto de tokens
     contexto_json = []
@@ -218,25 +214,25 @@ def buscar_en_kb(terminos_clave: list[str], max_tokens: int = None) -> tuple[str
     
     # Agregar documentos prioritarios primero
     for doc_info in priority_docs:
-        if tokens_used + doc_info["tokens"] <= max_tokens:
-            contexto_json.append(doc_info["doc"])
-            tokens_used += doc_info["tokens"]
+        if tokens_used + doc_info.tokens <= max_tokens:
+            contexto_json.append(doc_info.doc)
+            tokens_used += doc_info.tokens
         else:
-            logger.warning(f"Budget alcanzado, omitiendo documento '{doc_info['term']}'")
+            logger.warning(f"Budget alcanzado, omitiendo documento '{doc_info.termino}'")
     
     # Intentar agregar default si hay espacio
-    if default_doc and tokens_used + default_doc["tokens"] <= max_tokens:
-        contexto_json.append(default_doc["doc"])
-        citas.add(default_doc["doc"].get("cita", "sin_cita"))
-        tokens_used += default_doc["tokens"]
+    if default_doc and tokens_used + default_doc.tokens <= max_tokens:
+        contexto_json.append(default_doc.doc)
+        citas.add(default_doc.doc.get("cita", "sin_cita"))
+        tokens_used += default_doc.tokens
     elif default_doc:
-        logger.warning(f"No hay espacio para 'default' ({default_doc['tokens']} tokens)")
+        logger.warning(f"No hay espacio para 'default' ({default_doc.tokens} tokens)")
 
     # 4. Si no hay contenido, lanzar error
     if not contexto_json:
         if default_doc:
             # Truncar default para que quepa
-            truncated_default = truncate_kb_entry(default_doc["doc"], max_tokens)
+            truncated_default = truncate_kb_entry(default_doc.doc, max_tokens)
             contexto_json.append(truncated_default)
             citas.add(truncated_default.get("cita", "sin_cita"))
             tokens_used = count_tokens(json.dumps(truncated_default, ensure_ascii=False))
@@ -246,10 +242,11 @@ def buscar_en_kb(terminos_clave: list[str], max_tokens: int = None) -> tuple[str
 
     # 5. Generar string JSON final
     contexto_rag_string = json.dumps(contexto_json, indent=2, ensure_ascii=False)
-    final_tokens = count_tokens(contexto_rag_string)
 
-    logger.info(f"Contexto RAG generado: {len(contexto_json)} docs, {final_tokens} tokens (budget: {max_tokens})")
-    logger.info(f"Citas incluidas: {list(citas)}")
+    logger.debug(
+        "Contexto RAG generado: %s docs, %s tokens (budget: %s), citas: %s",
+        len(contexto_json), tokens_used, max_tokens, citas,
+    )
     
     return contexto_rag_string, list(citas)
 
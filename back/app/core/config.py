@@ -13,6 +13,60 @@ class Settings(BaseSettings):
     TOKEN_BUDGET_HISTORY_PCT: float = 0.30  # 30% for history
     TOKEN_BUDGET_RAG_PCT: float = 0.70      # 70% for RAG KB
     SLIDING_WINDOW_SIZE: int = 10           # Keep last N messages
+
+    # Batch prediction
+    PREDICT_BATCH_MAX_ROWS: int = 1000      # Max rows per /predict/batch request
+    WHAT_IF_MAX_VARIANTS: int = 5000        # Max grid combinations per /simulate request
+
+    # Versioned model bundles (models/bundles/<type>/CURRENT); falls back to the pickles
+    MODEL_BUNDLES_ENABLED: bool = True
+    MODEL_BUNDLE_VERIFY_CHECKSUMS: bool = True
+    MODEL_REGISTRY_POLL_SECONDS: float = 30.0  # Check CURRENT pointers for new versions (0 = never)
+
+    # Inference backend per model: "sklearn" (default) or "onnx" (needs onnxruntime)
+    DIABETES_INFERENCE_BACKEND: str = "sklearn"
+    CARDIOVASCULAR_INFERENCE_BACKEND: str = "sklearn"
+    ONNX_INTRA_OP_THREADS: int = 1
+    ONNX_VERIFY_ON_LOAD: bool = True        # Compare against sklearn on NHANES rows before enabling
+    ONNX_EQUIVALENCE_ATOL: float = 1e-5
+
+    # Explanations: exact tree explanations allowed at once before serving approximate
+    # drivers from the nearest-neighbour reference store (models/reference/<type>-<version>.npz)
+    EXPLAINER_MAX_CONCURRENCY: int = 2
+    REFERENCE_STORE_MAX_ROWS: int = 1000    # NHANES rows used when the store is built at startup (0 = all)
+
+    # Verbose per-request predict_risk log line (DEBUG level) for this fraction of calls
+    PREDICT_LOG_SAMPLE_RATE: float = 0.01
+
+    # Prediction cache (LRU + TTL) in front of predict_risk; 0 entries disables it
+    PREDICTION_CACHE_MAX_ENTRIES: int = 1024
+    PREDICTION_CACHE_TTL_SECONDS: float = 600.0
+
+    # Micro-batching of concurrent /predict requests
+    PREDICT_MICROBATCH_ENABLED: bool = True
+    PREDICT_MICROBATCH_MAX_SIZE: int = 32   # Flush as soon as N requests are queued per model
+    PREDICT_MICROBATCH_WAIT_MS: float = 3.0 # ...or after this window
+
+    # Process pool for CPU-bound inference (0 = run in threads of the API process)
+    INFERENCE_POOL_WORKERS: int = 0
+    INFERENCE_POOL_MAX_QUEUE: int = 64      # Pending tasks beyond the workers before answering 503
+    INFERENCE_POOL_START_METHOD: str = "spawn"
+
+    # Shadow scoring: a candidate cardiovascular model (pickle in models/ or bundle version)
+    # scores a sample of live requests in a background thread; empty disables it
+    SHADOW_CARDIOVASCULAR_MODEL: str = ""
+    SHADOW_SAMPLE_RATE: float = 0.1
+    SHADOW_MAX_PENDING: int = 32            # Drop samples instead of queueing beyond this
+    SHADOW_STATS_WINDOW: int = 1000         # Comparisons kept for the rolling stats
+
+    # Prebuilt BM25 index of the KB (models/kb_index), rebuilt when the KB content changes
+    KB_INDEX_ENABLED: bool = True
+    RAG_QUERY_CACHE_MAX_ENTRIES: int = 256  # LRU of normalized retrieval queries (0 disables it)
+    KB_WATCH_POLL_SECONDS: float = 5.0      # Reload the in-memory KB when kb/ changes (0 = never)
+    RAG_DENSE_DIM: int = 128                # LSA dimensions of the dense channel fused with BM25 (0 = BM25 only)
+
+    # Startup warm-up: /health answers 503 until models, explainers and KB are loaded
+    WARMUP_ON_STARTUP: bool = True
     
     @property
     def TOKEN_BUDGET_HISTORY(self) -> int:
@@ -34,6 +88,11 @@ class Settings(BaseSettings):
         """Get path to knowledge base directory (root kb folder)."""
         return Path(__file__).parent.parent.parent.parent / "kb"
 
+    @property
+    def KB_INDEX_DIR(self) -> Path:
+        """Get path to the prebuilt BM25 index of the knowledge base."""
+        return self.MODELS_DIR / "kb_index"
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
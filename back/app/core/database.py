@@ -2,7 +2,7 @@ from supabase import create_client, Client
 from app.core.config import settings
 import logging
 import uuid
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -81,6 +81,140 @@ def obtener_historial_analisis(usuario_id: str):
         return []
 
 
+# Columnas del historial paginado: sin el plan (recomendacion_ia), las citas ni
+# los drivers, que se piden por análisis en /history/{id}
+HISTORIAL_COLUMNAS = (
+    "id", "fecha", "created_at", "modelo", "model_used", "riesgo_predicho", "categoria_riesgo",
+    "imc", "circunferencia_cintura", "peso_kg", "presion_sistolica", "colesterol_total",
+    "glucosa_mgdl", "hdl_mgdl", "ldl_mgdl", "trigliceridos_mgdl",
+)
+
+TRAYECTORIA_COLUMNAS = ("id", "fecha", "created_at", "modelo", "riesgo_predicho", "categoria_riesgo")
+
+# Máximo de filas que PostgREST entrega por solicitud (max-rows por defecto de Supabase)
+_FILAS_POR_SOLICITUD = 1000
+
+
+def _filtro_keyset(fecha: Optional[str], analisis_id: int, desc: bool = True) -> str:
+    """
+    Filtro PostgREST para las filas posteriores a (fecha, id) en orden
+    (fecha, id) con los NULL de fecha al final.
+    """
+    op = "lt" if desc else "gt"
+    if fecha is None:
+        return f"and(fecha.is.null,id.{op}.{analisis_id})"
+    return f"fecha.{op}.{fecha},and(fecha.eq.{fecha},id.{op}.{analisis_id}),fecha.is.null"
+
+
+def obtener_historial_pagina(
+    usuario_id: str,
+    limite: int = 20,
+    despues_de: Optional[Tuple[Optional[str], int]] = None,
+    columnas: Sequence[str] = HISTORIAL_COLUMNAS,
+) -> dict:
+    """
+    Una página del historial, de la más reciente a la más antigua.
+
+    Paginación keyset sobre (fecha, id): ``despues_de`` es la (fecha, id) de la
+    última fila de la página anterior, así cada página cuesta lo mismo sin
+    importar cuántos análisis tenga el usuario (sin OFFSET).
+
+    Returns:
+        {"filas": [...], "hay_mas": bool} o {"error": ...}
+    """
+    supabase = get_supabase()
+    try:
+        query = (
+            supabase.table("analisis_salud")
+            .select(",".join(columnas))
+            .eq("usuario_id", usuario_id)
+        )
+        if despues_de is not None:
+            query = query.or_(_filtro_keyset(*despues_de))
+        res = (
+            query.order("fecha", desc=True, nullsfirst=False)
+            .order("id", desc=True)
+            .limit(limite + 1)
+            .execute()
+        )
+        if getattr(res, "error", None):
+            logger.error(f"Error Supabase al obtener historial: {res.error}")
+            return {"error": str(res.error)}
+        filas = res.data or []
+        return {"filas": filas[:limite], "hay_mas": len(filas) > limite}
+    except Exception as e:
+        logger.error(f"Error al obtener historial de análisis: {e}")
+        return {"error": str(e)}
+
+
+def obtener_analisis(usuario_id: str, analisis_id: int):
+    """Fila completa de un análisis del usuario (plan y drivers incluidos), o None."""
+    supabase = get_supabase()
+    try:
+        res = (
+            supabase.table("analisis_salud")
+            .select("*")
+            .eq("usuario_id", usuario_id)
+            .eq("id", analisis_id)
+            .limit(1)
+            .execute()
+        )
+        if getattr(res, "error", None):
+            logger.error(f"Error Supabase al obtener análisis: {res.error}")
+            return None
+        return res.data[0] if res.data else None
+    except Exception as e:
+        logger.error(f"Error al obtener análisis {analisis_id}: {e}")
+        return None
+
+
+def obtener_serie_riesgo(
+    usuario_id: str,
+    modelo: Optional[str] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+) -> List[dict] | dict:
+    """
+    Filas mínimas (fecha, score, categoría, modelo) para la trayectoria, en
+    orden cronológico. Se leen en bloques keyset de ``_FILAS_POR_SOLICITUD``.
+    """
+    supabase = get_supabase()
+    filas: List[dict] = []
+    despues_de = None
+    try:
+        while True:
+            query = (
+                supabase.table("analisis_salud")
+                .select(",".join(TRAYECTORIA_COLUMNAS))
+                .eq("usuario_id", usuario_id)
+            )
+            if modelo:
+                query = query.eq("modelo", modelo)
+            if desde:
+                query = query.gte("fecha", desde)
+            if hasta:
+                query = query.lte("fecha", hasta)
+            if despues_de is not None:
+                query = query.or_(_filtro_keyset(*despues_de, desc=False))
+            res = (
+                query.order("fecha", desc=False, nullsfirst=False)
+                .order("id", desc=False)
+                .limit(_FILAS_POR_SOLICITUD)
+                .execute()
+            )
+            if getattr(res, "error", None):
+                logger.error(f"Error Supabase al obtener trayectoria: {res.error}")
+                return {"error": str(res.error)}
+            bloque = res.data or []
+            filas.extend(bloque)
+            if len(bloque) < _FILAS_POR_SOLICITUD:
+                return filas
+            despues_de = (bloque[-1]["fecha"], bloque[-1]["id"])
+    except Exception as e:
+        logger.error(f"Error al obtener trayectoria de riesgo: {e}")
+        return {"error": str(e)}
+
+
 #profiles
 def obtener_perfil(usuario_id: str):
     supabase = get_supabase()
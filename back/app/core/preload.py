@@ -0,0 +1,188 @@
+"""
+Precarga copy-on-write para servidores con varios workers (gunicorn --preload).
+
+El proceso maestro carga una sola vez todo lo que es de solo lectura (bundles
+de los modelos, explicadores, índice de drivers de referencia, planes de
+features, índice de la KB y tokenizer), llama a ``gc.freeze()`` y recién
+entonces gunicorn hace fork de los workers: las páginas de esos objetos quedan
+compartidas entre todos los workers en lugar de una copia privada por worker.
+
+Lo que no sobrevive a un fork queda para el warm-up de cada worker (lifespan):
+hilos (vigilante de versiones, modo sombra), el pool de inferencia, sesiones
+ONNX Runtime y la primera predicción (XGBoost usa OpenMP, que no es seguro
+inicializar antes de un fork).
+
+``reporte_memoria`` lee /proc/<pid>/smaps_rollup del maestro y de sus workers
+y separa la memoria compartida de la única (privada) de cada proceso:
+
+    python -m app.core.preload <pid_maestro>
+"""
+
+import gc
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Variable de entorno con el PID del maestro; los workers la heredan en el fork
+MASTER_PID_ENV = "PRELOAD_MASTER_PID"
+
+_SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def _cargar_modelos() -> None:
+    from app.ml.explainers import get_contribution_explainer, get_linear_explanation_plan, get_reference_store
+    from app.ml.model_loader import get_active_model
+    from app.ml.predictor import WARMUP_PROFILE, build_profile_matrix, get_explainer
+
+    for model_type in ("diabetes", "cardiovascular"):
+        version = get_active_model(model_type)
+        # Plan de features (numpy puro, sin OpenMP)
+        build_profile_matrix([WARMUP_PROFILE], model_type, version.feature_names)
+
+    if get_contribution_explainer("diabetes") is None:
+        get_explainer("diabetes")
+    # Solo el .npz ya guardado: construirlo corre XGBoost (OpenMP), queda para el warm-up
+    if get_reference_store("diabetes", build=False) is None:
+        logger.info("Sin índice de drivers de referencia guardado; se construye en el warm-up de cada worker")
+    get_linear_explanation_plan("cardiovascular")
+
+
+def _cargar_indice_kb() -> None:
+    from app.agents.rag_service import get_kb_store
+    from app.routes.ml_routes import get_rag_system
+
+    get_kb_store().refresh()
+    get_rag_system()
+
+
+def _cargar_tokenizer() -> None:
+    from app.utils.token_counter import get_encoding
+
+    get_encoding()
+
+
+_PRECARGA = (
+    ("models", _cargar_modelos, True),
+    ("kb_index", _cargar_indice_kb, False),
+    ("tokenizer", _cargar_tokenizer, False),
+)
+
+
+def precargar_para_fork() -> Dict[str, Any]:
+    """
+    Carga los componentes de solo lectura en este proceso y congela el GC.
+
+    Debe llamarse en el maestro antes del fork (hook ``when_ready`` de
+    gunicorn). Los componentes opcionales que fallan se registran y quedan
+    para el warm-up de cada worker.
+
+    Returns:
+        Estado y tiempo de carga por componente, más la RSS del maestro.
+    """
+    componentes: Dict[str, Dict[str, Any]] = {}
+    for name, load, required in _PRECARGA:
+        started = time.perf_counter()
+        try:
+            load()
+            componentes[name] = {"status": "ready", "load_ms": round((time.perf_counter() - started) * 1000, 1)}
+        except Exception as e:
+            if required:
+                raise
+            logger.warning("Precarga de %s falló (se cargará en cada worker): %s", name, e)
+            componentes[name] = {"status": "failed", "error": str(e)}
+
+    # Todo lo que existe ahora pasa a la generación permanente: los ciclos de
+    # GC de los workers ya no escriben en esas páginas y siguen compartidas
+    gc.collect()
+    gc.freeze()
+    os.environ[MASTER_PID_ENV] = str(os.getpid())
+
+    memoria = memoria_proceso(os.getpid())
+    logger.info(
+        "Precarga lista (%s objetos congelados, RSS maestro %.1f MB): %s",
+        gc.get_freeze_count(), memoria["rss_mb"] if memoria else -1, componentes,
+    )
+    return {"components": componentes, "frozen_objects": gc.get_freeze_count(), "memory": memoria}
+
+
+def memoria_proceso(pid: int) -> Optional[Dict[str, float]]:
+    """Memoria de un proceso según /proc/<pid>/smaps_rollup (None si no está disponible)."""
+    try:
+        text = Path(f"/proc/{pid}/smaps_rollup").read_text()
+    except OSError:
+        return None
+
+    kb = dict.fromkeys(_SMAPS_FIELDS, 0)
+    for line in text.splitlines():
+        key, _, rest = line.partition(":")
+        if key in kb:
+            kb[key] = int(rest.split()[0])
+
+    return {
+        "rss_mb": round(kb["Rss"] / 1024, 1),
+        "pss_mb": round(kb["Pss"] / 1024, 1),
+        "shared_mb": round((kb["Shared_Clean"] + kb["Shared_Dirty"]) / 1024, 1),
+        "unique_mb": round((kb["Private_Clean"] + kb["Private_Dirty"]) / 1024, 1),
+    }
+
+
+def _hijos(pid: int) -> List[int]:
+    children = []
+    for stat_path in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            # El nombre del comando va entre paréntesis y puede tener espacios
+            fields = stat_path.read_text().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(stat_path.parent.name))
+    return sorted(children)
+
+
+def reporte_memoria(master_pid: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Memoria única vs compartida del maestro y de cada worker.
+
+    Sin ``master_pid`` se usa el maestro de la precarga (heredado en el
+    entorno); sin precarga se reporta solo el proceso actual. ``pss_mb`` reparte
+    las páginas compartidas entre quienes las usan, así que la suma de PSS es
+    la memoria real del grupo.
+    """
+    if master_pid is None:
+        master_pid = int(os.environ.get(MASTER_PID_ENV, 0)) or None
+
+    if master_pid is None:
+        procesos = {"current": [os.getpid()]}
+    else:
+        procesos = {"master": [master_pid], "workers": _hijos(master_pid)}
+
+    reporte: Dict[str, Any] = {"preload": master_pid is not None, "current_pid": os.getpid()}
+    total_pss = 0.0
+    for rol, pids in procesos.items():
+        entradas = []
+        for pid in pids:
+            memoria = memoria_proceso(pid)
+            if memoria is None:
+                continue
+            total_pss += memoria["pss_mb"]
+            entradas.append({"pid": pid, **memoria})
+        reporte[rol] = entradas if rol == "workers" else (entradas[0] if entradas else None)
+    reporte["total_pss_mb"] = round(total_pss, 1)
+    return reporte
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    master_pid = int(args[0]) if args else None
+    print(json.dumps(reporte_memoria(master_pid), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_components: Dict[str, Dict] = {}
+_warmup_started = False
+_warmup_done = threading.Event()
+
+
+def _cargar_modelo(model_type: str) -> None:
+    from app.ml.model_loader import get_inference_model, load_model_bundle
+
+    load_model_bundle(model_type)
+    get_inference_model(model_type)
+
+
+def _cargar_explicador() -> None:
+    from app.ml.explainers import get_contribution_explainer
+    from app.ml.predictor import get_explainer
+
+    if get_contribution_explainer("diabetes") is None and get_explainer("diabetes") is None:
+        raise RuntimeError("No hay explicador disponible para el modelo de diabetes")
+
+
+def _cargar_drivers_referencia() -> None:
+    from app.ml.explainers import get_reference_store
+
+    if get_reference_store("diabetes") is None:
+        raise RuntimeError("No hay índice de drivers de referencia para el modelo de diabetes")
+
+
+def _prediccion_sintetica(model_type: str) -> None:
+    from app.ml.predictor import WARMUP_PROFILE, predict_risk
+
+    predict_risk(model_type=model_type, **WARMUP_PROFILE)
+
+
+def _cargar_tokenizer() -> None:
+    from app.utils.token_counter import get_encoding
+
+    if get_encoding() is None:
+        raise RuntimeError("No se pudo cargar el encoding de tiktoken")
+
+
+def _cargar_clientes_openai() -> None:
+    # Los clientes OpenAI se crean al importar los módulos de agentes
+    import app.agents.coach_agent  # noqa: F401
+    import app.agents.conversational_agent  # noqa: F401
+    import app.agents.openai_agent  # noqa: F401
+
+
+def _cargar_indice_kb() -> None:
+    from app.agents.rag_service import get_kb_store
+    from app.routes.ml_routes import get_rag_system
+
+    get_kb_store().refresh()
+    get_rag_system()
+
+
+def _vigilar_kb() -> None:
+    from app.agents.rag_service import get_kb_store
+
+    get_kb_store().start_watcher(settings.KB_WATCH_POLL_SECONDS)
+
+
+def _vigilar_versiones_modelo() -> None:
+    from app.ml.model_loader import get_model_registry
+
+    get_model_registry().start_watcher(settings.MODEL_REGISTRY_POLL_SECONDS)
+
+
+def _iniciar_modo_sombra() -> None:
+    from app.services.shadow_scoring import start_shadow_scorer
+
+    start_shadow_scorer(
+        "cardiovascular",
+        settings.SHADOW_CARDIOVASCULAR_MODEL,
+        settings.SHADOW_SAMPLE_RATE,
+        settings.SHADOW_MAX_PENDING,
+        settings.SHADOW_STATS_WINDOW,
+    )
+
+
+def _iniciar_pool_inferencia() -> None:
+    from app.services.inference_executor import start_inference_executor
+    from app.services.ml_service import usar_executor_inferencia
+
+    executor = start_inference_executor(
+        settings.INFERENCE_POOL_WORKERS,
+        settings.INFERENCE_POOL_MAX_QUEUE,
+        settings.INFERENCE_POOL_START_METHOD,
+    )
+    if executor is None:
+        return
+
+    ready = executor.wait_until_ready()
+    if ready < executor.workers:
+        raise RuntimeError(f"Solo {ready}/{executor.workers} workers de inferencia quedaron listos")
+    usar_executor_inferencia(executor)
+
+
+# (componente, función de carga, requerido para readiness)
+# Los componentes opcionales solo degradan el estado: el chat y el coach
+# tienen sus propios mensajes de "servicio no disponible".
+_WARMUP_STEPS: List[Tuple[str, Callable[[], None], bool]] = [
+    ("model_diabetes", lambda: _cargar_modelo("diabetes"), True),
+    ("model_cardiovascular", lambda: _cargar_modelo("cardiovascular"), True),
+    ("explainer_diabetes", _cargar_explicador, True),
+    ("reference_drivers_diabetes", _cargar_drivers_referencia, False),
+    ("prediction_diabetes", lambda: _prediccion_sintetica("diabetes"), True),
+    ("prediction_cardiovascular", lambda: _prediccion_sintetica("cardiovascular"), True),
+    ("inference_pool", _iniciar_pool_inferencia, True),
+    ("model_registry_watcher", _vigilar_versiones_modelo, False),
+    ("shadow_model", _iniciar_modo_sombra, False),
+    ("tokenizer", _cargar_tokenizer, False),
+    ("openai_clients", _cargar_clientes_openai, False),
+    ("kb_index", _cargar_indice_kb, False),
+    ("kb_watcher", _vigilar_kb, False),
+]
+
+
+def _registrar(name: str, required: bool, status: str, load_ms: float | None = None, error: str | None = None) -> None:
+    with _lock:
+        _components[name] = {
+            "status": status,
+            "required": required,
+            "load_ms": None if load_ms is None else round(load_ms, 1),
+            "error": error,
+        }
+
+
+def warm_up() -> None:
+    """
+    Carga todos los componentes costosos (modelos, explicadores, tokenizer,
+    clientes OpenAI, índice de la KB) y registra su estado y tiempo de carga.
+    """
+    global _warmup_started
+
+    with _lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+
+    for name, _, required in _WARMUP_STEPS:
+        _registrar(name, required, "pending")
+
+    logger.info("🔥 Iniciando warm-up de la aplicación...")
+    started = time.perf_counter()
+
+    for name, load, required in _WARMUP_STEPS:
+        _registrar(name, required, "loading")
+        step_started = time.perf_counter()
+        try:
+            load()
+        except Exception as e:
+            elapsed_ms = (time.perf_counter() - step_started) * 1000
+            log = logger.error if required else logger.warning
+            log("❌ Warm-up de '%s' falló tras %.0f ms: %s", name, elapsed_ms, e)
+            _registrar(name, required, "error", elapsed_ms, str(e))
+        else:
+            elapsed_ms = (time.perf_counter() - step_started) * 1000
+            logger.info("✓ Warm-up de '%s' listo en %.0f ms", name, elapsed_ms)
+            _registrar(name, required, "ready", elapsed_ms)
+
+    _warmup_done.set()
+    logger.info("🔥 Warm-up completo en %.0f ms (ready=%s)", (time.perf_counter() - started) * 1000, is_ready())
+
+
+def wait_for_warmup(timeout: float | None = None) -> bool:
+    """Bloquea hasta que termine el warm-up; retorna False si se agota el timeout."""
+    return _warmup_done.wait(timeout)
+
+
+def is_ready() -> bool:
+    """True cuando todos los componentes requeridos están cargados (o el warm-up está desactivado)."""
+    if not settings.WARMUP_ON_STARTUP:
+        return True
+    with _lock:
+        return _warmup_done.is_set() and all(
+            component["status"] == "ready"
+            for component in _components.values()
+            if component["required"]
+        )
+
+
+def readiness_report() -> Dict:
+    """Estado de readiness por componente con sus tiempos de carga."""
+    ready = is_ready()
+    with _lock:
+        components = {name: dict(component) for name, component in _components.items()}
+        finished = _warmup_done.is_set()
+
+    if not settings.WARMUP_ON_STARTUP:
+        status = "healthy"
+    elif ready:
+        degraded = any(component["status"] != "ready" for component in components.values())
+        status = "degraded" if degraded else "ready"
+    else:
+        status = "unavailable" if finished else "starting"
+
+    return {"status": status, "ready": ready, "components": components}
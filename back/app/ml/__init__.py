@@ -1,11 +1,12 @@
 from .model_loader import load_model_bundle, get_model, get_imputer, get_feature_names
-from .predictor import predict_risk
+from .predictor import predict_risk, predict_risk_batch
 
 __all__ = [
     'load_model_bundle',
     'get_model',
     'get_imputer',
     'get_feature_names',
-    'predict_risk'
+    'predict_risk',
+    'predict_risk_batch'
 ]
 
@@ -0,0 +1,467 @@
+"""
+Prebuilt, memory-mapped BM25 index over the knowledge base sections.
+
+Layout (one directory per KB content hash, like the model bundles):
+
+    models/kb_index/CURRENT                  -> name of the active index
+    models/kb_index/<hash>/manifest.json     -> params, avgdl, KB fingerprint
+    models/kb_index/<hash>/vocab.npy         -> sorted terms (fixed-width unicode)
+    models/kb_index/<hash>/idf.npy           -> idf per term
+    models/kb_index/<hash>/indptr.npy        -> postings offsets per term (CSR)
+    models/kb_index/<hash>/doc_ids.npy       -> postings: document of each entry
+    models/kb_index/<hash>/term_freqs.npy    -> postings: term frequency
+    models/kb_index/<hash>/weights.npy       -> postings: precomputed BM25 term weight
+    models/kb_index/<hash>/doc_len.npy       -> tokens per document
+    models/kb_index/<hash>/chunks.bin        -> JSON of each section, back to back
+    models/kb_index/<hash>/chunk_offsets.npy -> byte offsets into chunks.bin
+    models/kb_index/<hash>/dense_*.npy       -> LSA section vectors (see dense_index)
+
+Every array is loaded with ``mmap_mode="r"`` and the chunk texts are decoded
+only for the sections a query returns, so loading costs the same for ten
+sections or ten thousand, and forked workers share the pages. Scores match
+``rank_bm25.BM25Okapi`` (same idf floor and term weights).
+
+The postings are a terms x documents CSR weight matrix, so scoring a batch of
+queries is a sparse product (queries x terms) @ (terms x documents): the
+postings rows of the query terms are gathered and scatter-added per document
+with one ``np.bincount``. Only those postings are touched, whatever the KB
+size, and ``top_k`` picks the best documents with ``argpartition`` instead of
+sorting every score.
+
+The index is rebuilt only when the KB content (or the dense dimension)
+changes: a stat fingerprint (name, size, mtime of every ``*.md``) is checked
+first and the SHA-256 of the contents only when the fingerprint differs.
+
+Build or inspect it with:
+    python -m app.ml.bm25_index build [--force] [--dense-dim N]
+    python -m app.ml.bm25_index info
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import shutil
+import tempfile
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .dense_index import DEFAULT_DIM, LSAIndex
+from .spanish_analyzer import ANALYZER_NAME, analyze
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+CURRENT_POINTER = "CURRENT"
+
+# Persisted indexes built with another analyzer are rebuilt
+ANALYZER = ANALYZER_NAME
+
+
+def tokenize(text: str) -> List[str]:
+    """Index terms of ``text`` (same analyzer for indexing and queries)."""
+    return analyze(text)
+
+
+class ChunkStore(Sequence):
+    """Read-only sequence of KB sections decoded on access from ``chunks.bin``."""
+
+    def __init__(self, data, offsets: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+
+    @classmethod
+    def from_chunks(cls, chunks: List[Dict[str, str]]) -> "ChunkStore":
+        encoded = [json.dumps(chunk, ensure_ascii=False).encode("utf-8") for chunk in chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(blob) for blob in encoded], out=offsets[1:])
+        return cls(b"".join(encoded), offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return json.loads(bytes(self._data[start:end]).decode("utf-8"))
+
+
+class BM25Index:
+    """
+    BM25 (Okapi) postings in CSR form: the postings of term ``t`` are
+    ``indptr[t]:indptr[t + 1]`` in ``doc_ids`` / ``term_freqs`` / ``weights``.
+
+    ``dense`` holds the LSA vectors of the same sections (None when disabled
+    or the KB is too small).
+    """
+
+    def __init__(self, vocab: np.ndarray, idf: np.ndarray, indptr: np.ndarray, doc_ids: np.ndarray,
+                 term_freqs: np.ndarray, weights: np.ndarray, doc_len: np.ndarray, chunks: ChunkStore,
+                 manifest: Dict[str, Any], dense: Optional[LSAIndex] = None):
+        self.vocab = vocab
+        self.idf = idf
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.weights = weights
+        self.doc_len = doc_len
+        self.chunks = chunks
+        self.manifest = manifest
+        self.dense = dense
+
+    @classmethod
+    def from_chunks(cls, chunks: List[Dict[str, str]], k1: float = 1.5, b: float = 0.75,
+                    epsilon: float = 0.25, dense_dim: int = DEFAULT_DIM) -> "BM25Index":
+        """Build the index in memory from ``{'full_text', ...}`` chunks (``dense_dim=0``: BM25 only)."""
+        corpus = [tokenize(chunk["full_text"]) for chunk in chunks]
+        doc_freqs = [Counter(tokens) for tokens in corpus]
+        doc_len = np.array([len(tokens) for tokens in corpus], dtype=np.int64)
+        corpus_size = len(corpus)
+        avgdl = int(doc_len.sum()) / corpus_size if corpus_size else 0.0
+
+        # Document frequency in first-seen order, the order BM25Okapi averages idf in
+        df: Dict[str, int] = {}
+        for frequencies in doc_freqs:
+            for term in frequencies:
+                df[term] = df.get(term, 0) + 1
+
+        idf_by_term: Dict[str, float] = {}
+        idf_sum = 0.0
+        negative = []
+        for term, freq in df.items():
+            idf = math.log(corpus_size - freq + 0.5) - math.log(freq + 0.5)
+            idf_by_term[term] = idf
+            idf_sum += idf
+            if idf < 0:
+                negative.append(term)
+        eps = epsilon * (idf_sum / len(idf_by_term)) if idf_by_term else 0.0
+        for term in negative:
+            idf_by_term[term] = eps
+
+        terms = sorted(df)
+        term_ids = {term: i for i, term in enumerate(terms)}
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        for term, freq in df.items():
+            indptr[term_ids[term] + 1] = freq
+        np.cumsum(indptr, out=indptr)
+
+        cursor = indptr[:-1].copy()
+        doc_ids = np.empty(int(indptr[-1]), dtype=np.int32)
+        term_freqs = np.empty(int(indptr[-1]), dtype=np.int32)
+        for doc_id, frequencies in enumerate(doc_freqs):
+            for term, freq in frequencies.items():
+                position = cursor[term_ids[term]]
+                doc_ids[position] = doc_id
+                term_freqs[position] = freq
+                cursor[term_ids[term]] += 1
+
+        idf = np.array([idf_by_term[term] for term in terms], dtype=np.float64)
+        # Same expression (and float order) as BM25Okapi.get_scores, per posting
+        tf = term_freqs.astype(np.int64)
+        dl = doc_len[doc_ids]
+        weights = np.repeat(idf, np.diff(indptr)) * (tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))) \
+            if len(tf) else np.zeros(0, dtype=np.float64)
+
+        dense = LSAIndex.from_postings(indptr, doc_ids, term_freqs, corpus_size, dense_dim) if dense_dim > 0 else None
+
+        manifest = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "analyzer": ANALYZER,
+            "k1": k1,
+            "b": b,
+            "epsilon": epsilon,
+            "avgdl": avgdl,
+            "n_docs": corpus_size,
+            "n_terms": len(terms),
+            "n_postings": int(indptr[-1]),
+            "dense_dim": dense_dim,
+            "dense": dense.describe() if dense is not None else None,
+        }
+        vocab = np.array(terms, dtype=f"<U{max((len(t) for t in terms), default=1)}")
+        return cls(vocab, idf, indptr, doc_ids, term_freqs, weights, doc_len,
+                   ChunkStore.from_chunks(chunks), manifest, dense)
+
+    @classmethod
+    def load(cls, index_dir: Path) -> "BM25Index":
+        """Memory-map a saved index directory."""
+        index_dir = Path(index_dir)
+        manifest = read_manifest(index_dir)
+        if manifest.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index format: {manifest.get('format_version')}")
+
+        def table(name: str) -> np.ndarray:
+            return np.load(index_dir / f"{name}.npy", mmap_mode="r")
+
+        chunks_path = index_dir / "chunks.bin"
+        # np.memmap refuses empty files (empty KB)
+        data = np.memmap(chunks_path, dtype=np.uint8, mode="r") if chunks_path.stat().st_size else b""
+        return cls(table("vocab"), table("idf"), table("indptr"), table("doc_ids"), table("term_freqs"),
+                   table("weights"), table("doc_len"), ChunkStore(data, table("chunk_offsets")), manifest,
+                   LSAIndex.load(index_dir))
+
+    def save(self, index_dir: Path) -> None:
+        index_dir = Path(index_dir)
+        arrays = {
+            "vocab": self.vocab,
+            "idf": self.idf,
+            "indptr": self.indptr,
+            "doc_ids": self.doc_ids,
+            "term_freqs": self.term_freqs,
+            "weights": self.weights,
+            "doc_len": self.doc_len,
+            "chunk_offsets": self.chunks._offsets,
+        }
+        for name, array in arrays.items():
+            np.save(index_dir / f"{name}.npy", np.ascontiguousarray(array))
+        (index_dir / "chunks.bin").write_bytes(bytes(self.chunks._data))
+        if self.dense is not None:
+            self.dense.save(index_dir)
+        (index_dir / MANIFEST_NAME).write_text(json.dumps(self.manifest, indent=2))
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def term_ids(self, terms: List[str]) -> np.ndarray:
+        """Vocabulary position of each term, -1 for unknown terms."""
+        if not terms or not len(self.vocab):
+            return np.full(len(terms), -1, dtype=np.int64)
+        # Natural width: casting to the vocabulary dtype would truncate longer terms into false matches
+        terms = np.asarray(terms)
+        positions = np.searchsorted(self.vocab, terms)
+        found = positions < len(self.vocab)
+        found[found] = self.vocab[positions[found]] == terms[found]
+        return np.where(found, positions, -1)
+
+    def score_batch(self, queries: List[List[str]]) -> np.ndarray:
+        """
+        BM25 scores of every document for each tokenized query (queries x documents).
+
+        Sparse product of the query term counts with the terms x documents
+        weight matrix. Repeated query terms count again and contributions are
+        added in query order, exactly like ``BM25Okapi.get_scores``.
+        """
+        n_docs = len(self)
+        flat = [term for tokens in queries for term in tokens]
+        rows = np.repeat(np.arange(len(queries)), [len(tokens) for tokens in queries])
+        ids = self.term_ids(flat)
+        rows, ids = rows[ids >= 0], ids[ids >= 0]
+
+        starts = np.asarray(self.indptr[ids])
+        lengths = np.asarray(self.indptr[ids + 1]) - starts
+        # Ragged concatenation of the postings rows of every (query, term)
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(starts - offsets, lengths) + np.arange(int(lengths.sum()))
+        targets = np.repeat(rows, lengths) * n_docs + self.doc_ids[positions]
+        scores = np.bincount(targets, weights=self.weights[positions], minlength=len(queries) * n_docs)
+        return scores.reshape(len(queries), n_docs)
+
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        """BM25 score of every document for one tokenized query."""
+        return self.score_batch([query_tokens])[0]
+
+    def dense_score_batch(self, queries: List[List[str]]) -> Optional[np.ndarray]:
+        """Cosine similarity of every document to each tokenized query, or None without dense vectors."""
+        if self.dense is None:
+            return None
+        term_ids = [self.term_ids(tokens) for tokens in queries]
+        return self.dense.score_batch([ids[ids >= 0] for ids in term_ids])
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the ``k`` highest scores, best first, in O(n).
+
+    Ties are broken by the lower index, so the result equals the first ``k``
+    of a stable descending sort.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # Most documents share no term with the query and score 0, which makes
+    # argpartition crawl; when k documents score above 0 the rest can't win
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) < k:
+        candidates = np.arange(n)
+    if k < len(candidates):
+        values = scores[candidates]
+        threshold = values[np.argpartition(-values, k - 1)[k - 1]]
+        # Every document tied with the k-th score competes on its index
+        candidates = candidates[values >= threshold]
+    return candidates[np.lexsort((candidates, -scores[candidates]))[:k]]
+
+
+# ---------------------------------------------------------------------------
+# KB fingerprint / content hash
+# ---------------------------------------------------------------------------
+
+def kb_files(kb_dir: Path) -> List[Path]:
+    return sorted(Path(kb_dir).glob("*.md"))
+
+
+def kb_fingerprint(kb_dir: Path) -> str:
+    """Cheap change detector: name, size and mtime of every markdown file."""
+    digest = hashlib.sha256()
+    for path in kb_files(kb_dir):
+        stat = path.stat()
+        digest.update(f"{path.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def kb_content_hash(kb_dir: Path) -> str:
+    """SHA-256 over the names and contents of every markdown file."""
+    digest = hashlib.sha256()
+    for path in kb_files(kb_dir):
+        digest.update(path.name.encode() + b"\0")
+        digest.update(hashlib.sha256(path.read_bytes()).digest())
+    digest.update(ANALYZER.encode())
+    return digest.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Load or build
+# ---------------------------------------------------------------------------
+
+def read_manifest(index_dir: Path) -> Dict[str, Any]:
+    return json.loads((Path(index_dir) / MANIFEST_NAME).read_text())
+
+
+def current_index_dir(index_root: Path) -> Optional[Path]:
+    pointer = Path(index_root) / CURRENT_POINTER
+    if not pointer.exists():
+        return None
+    index_dir = Path(index_root) / pointer.read_text().strip()
+    return index_dir if (index_dir / MANIFEST_NAME).exists() else None
+
+
+def _write_pointer(index_root: Path, name: str) -> None:
+    staging = index_root / f".{CURRENT_POINTER}.tmp"
+    staging.write_text(name + "\n")
+    staging.replace(index_root / CURRENT_POINTER)
+
+
+def _refresh_fingerprint(index_dir: Path, manifest: Dict[str, Any], fingerprint: str) -> None:
+    """Same content, new mtimes (e.g. a fresh checkout): keep the index, update the fast check."""
+    manifest["kb_fingerprint"] = fingerprint
+    staging = index_dir / f".{MANIFEST_NAME}.tmp"
+    staging.write_text(json.dumps(manifest, indent=2))
+    staging.replace(index_dir / MANIFEST_NAME)
+
+
+def build_index(kb_dir: Path, index_root: Path, dense_dim: int = DEFAULT_DIM) -> Path:
+    """Parse the KB, build the index and activate it. Returns the index directory."""
+    from .rag_system import KnowledgeBase
+
+    kb_dir, index_root = Path(kb_dir), Path(index_root)
+    fingerprint = kb_fingerprint(kb_dir)
+    content_hash = kb_content_hash(kb_dir)
+    index = BM25Index.from_chunks(KnowledgeBase(str(kb_dir)).get_all_chunks(), dense_dim=dense_dim)
+    index.manifest.update({
+        "content_hash": content_hash,
+        "kb_fingerprint": fingerprint,
+        "kb_files": [path.name for path in kb_files(kb_dir)],
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    })
+
+    index_root.mkdir(parents=True, exist_ok=True)
+    name = content_hash[:12]
+    staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=index_root))
+    try:
+        index.save(staging)
+        index_dir = index_root / name
+        if index_dir.exists():
+            shutil.rmtree(index_dir)
+        staging.rename(index_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _write_pointer(index_root, name)
+    # Older indexes are no longer reachable; processes that still map them keep their pages
+    for stale in index_root.iterdir():
+        if stale.is_dir() and stale.name != name and not stale.name.startswith("."):
+            shutil.rmtree(stale, ignore_errors=True)
+    logger.info("Índice BM25 construido en %s (%s chunks, %s términos)",
+                index_dir, index.manifest["n_docs"], index.manifest["n_terms"])
+    return index_dir
+
+
+def load_or_build_index(kb_dir: Path, index_root: Path, force: bool = False,
+                        dense_dim: int = DEFAULT_DIM) -> BM25Index:
+    """
+    Load the active index if it matches the KB; otherwise rebuild it.
+
+    If the index directory is not writable, the index is built in memory
+    (same scores, just without persistence).
+    """
+    kb_dir, index_root = Path(kb_dir), Path(index_root)
+    index_dir = None if force else current_index_dir(index_root)
+    if index_dir is not None:
+        manifest = read_manifest(index_dir)
+        fingerprint = kb_fingerprint(kb_dir)
+        compatible = (
+            manifest.get("analyzer") == ANALYZER
+            and manifest.get("format_version") == INDEX_FORMAT_VERSION
+            and manifest.get("dense_dim") == dense_dim
+        )
+        if compatible:
+            if manifest.get("kb_fingerprint") == fingerprint:
+                return BM25Index.load(index_dir)
+            if manifest.get("content_hash") == kb_content_hash(kb_dir):
+                try:
+                    _refresh_fingerprint(index_dir, manifest, fingerprint)
+                except OSError as e:
+                    logger.debug("No se pudo actualizar la huella del índice BM25: %s", e)
+                return BM25Index.load(index_dir)
+        logger.info("La base de conocimiento cambió; reconstruyendo índice BM25")
+
+    try:
+        return BM25Index.load(build_index(kb_dir, index_root, dense_dim))
+    except OSError as e:
+        from .rag_system import KnowledgeBase
+
+        logger.warning("No se pudo guardar el índice BM25 en %s (%s); se usa un índice en memoria", index_root, e)
+        return BM25Index.from_chunks(KnowledgeBase(str(kb_dir)).get_all_chunks(), dense_dim=dense_dim)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.core.config import settings
+
+    parser = argparse.ArgumentParser(description="Build or inspect the prebuilt BM25 index of the knowledge base")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--kb-dir", type=Path, default=settings.KB_DIR)
+    parser.add_argument("--index-dir", type=Path, default=settings.KB_INDEX_DIR)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the KB did not change")
+    parser.add_argument("--dense-dim", type=int, default=settings.RAG_DENSE_DIM, help="LSA dimensions (0 = BM25 only)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.command == "build":
+        index = load_or_build_index(args.kb_dir, args.index_dir, force=args.force, dense_dim=args.dense_dim)
+        print(json.dumps(index.manifest, indent=2))
+        return 0
+
+    index_dir = current_index_dir(args.index_dir)
+    if index_dir is None:
+        print(f"No hay índice en {args.index_dir}")
+        return 1
+    manifest = read_manifest(index_dir)
+    manifest["up_to_date"] = manifest.get("content_hash") == kb_content_hash(args.kb_dir)
+    print(json.dumps(manifest, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
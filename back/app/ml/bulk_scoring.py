@@ -0,0 +1,327 @@
+"""
+Offline bulk scoring of large CSV / Parquet populations.
+
+The input is streamed in fixed-size chunks (never fully loaded), each chunk is
+scored with ``predict_risk_batch`` in a process pool and written as its own
+part file in the output directory::
+
+    scores/
+        _manifest.json
+        part-000000.parquet
+        part-000001.parquet
+        ...
+
+Part files are written atomically, so after an interruption re-running the
+same command skips the chunks that already have a part file and continues
+with the rest. The directory reads back as one table with
+``pd.read_parquet("scores/")``.
+
+Input columns may be ``predict_risk`` keywords (age, sex, bmi, ...) or the raw
+NHANES variables (RIDAGEYR, RIAGENDR, BMXBMI, ...). Rows without an age or
+without BMI / height+weight get an ``error`` instead of scores.
+
+Parquet input/output needs ``pyarrow``; CSV works with pandas alone.
+
+Usage (from back/):
+    python -m app.ml.bulk_scoring nhanes.csv scores/ --workers 4
+    python -m app.ml.bulk_scoring cohort.parquet scores/ --model cardiovascular --top-drivers 0
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.ml.nhanes import NHANES_COLUMN_MAP, scorable_mask, to_profile_frame
+from app.ml.profile import PROFILE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+MODEL_TYPES = ("diabetes", "cardiovascular")
+MANIFEST_NAME = "_manifest.json"
+
+
+def _require_pyarrow() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as exc:
+        raise RuntimeError("Parquet input/output requires pyarrow (pip install pyarrow)") from exc
+
+
+def _file_format(path: Path) -> str:
+    return "parquet" if path.suffix.lower() in (".parquet", ".pq") else "csv"
+
+
+def _wanted_column(name: str, id_column: Optional[str]) -> bool:
+    return name in PROFILE_FIELDS or name in NHANES_COLUMN_MAP or name == "RIAGENDR" or name == id_column
+
+
+def iter_input_chunks(
+    path: Path,
+    chunk_size: int,
+    id_column: Optional[str] = None,
+) -> Iterator[pd.DataFrame]:
+    """Yields the profile columns of ``path`` in chunks of ``chunk_size`` rows."""
+    if _file_format(path) == "parquet":
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        columns = [name for name in parquet_file.schema_arrow.names if _wanted_column(name, id_column)]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=lambda name: _wanted_column(name, id_column))
+
+
+def _init_worker() -> None:
+    """Pool initializer: workers only log errors (models load once per process, on first chunk)."""
+    logging.getLogger("app").setLevel(logging.ERROR)
+
+
+def _profiles(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    columns = [name for name in PROFILE_FIELDS if name in frame.columns]
+    values = frame[columns].astype(object).where(frame[columns].notna(), None)
+    return values.to_dict(orient="records")
+
+
+def _score_model(
+    model_type: str,
+    profiles: List[Dict[str, Any]],
+    explain: bool,
+) -> Tuple[List[Optional[Dict[str, Any]]], List[Optional[str]]]:
+    """Scores ``profiles``; one bad row only fails itself, not the whole chunk."""
+    from app.ml.predictor import predict_risk_batch
+
+    try:
+        return predict_risk_batch(profiles, model_type=model_type, explain=explain), [None] * len(profiles)
+    except (TypeError, ValueError):
+        pass
+
+    results: List[Optional[Dict[str, Any]]] = []
+    errors: List[Optional[str]] = []
+    for profile in profiles:
+        try:
+            results.append(predict_risk_batch([profile], model_type=model_type, explain=explain)[0])
+            errors.append(None)
+        except (TypeError, ValueError) as exc:
+            results.append(None)
+            errors.append(f"{model_type}: {exc}")
+    return results, errors
+
+
+def score_chunk(
+    frame: pd.DataFrame,
+    models: Sequence[str] = MODEL_TYPES,
+    top_drivers: int = 3,
+    id_column: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Scores one chunk of raw input rows.
+
+    Output columns: ``row`` (position in the input file, from the frame index),
+    the id column if given, ``error``, and per model ``<model>_score``,
+    ``<model>_risk_level``, ``<model>_version`` and, for ``top_drivers > 0``,
+    ``<model>_driver_<i>`` / ``<model>_driver_<i>_shap``.
+    """
+    profiles_df = to_profile_frame(frame)
+    valid = scorable_mask(profiles_df).to_numpy()
+    valid_profiles = _profiles(profiles_df[valid])
+
+    out = pd.DataFrame({"row": frame.index.to_numpy(dtype=np.int64)})
+    if id_column:
+        out[id_column] = frame[id_column].to_numpy()
+    errors = np.where(valid, None, "missing age or bmi/height/weight").astype(object)
+
+    valid_idx = np.flatnonzero(valid)
+    for model_type in models:
+        results, model_errors = _score_model(model_type, valid_profiles, explain=top_drivers > 0)
+
+        scores = np.full(len(out), np.nan)
+        levels = np.full(len(out), None, dtype=object)
+        versions = np.full(len(out), None, dtype=object)
+        drivers = [
+            (np.full(len(out), None, dtype=object), np.full(len(out), np.nan)) for _ in range(top_drivers)
+        ]
+        for position, result, error in zip(valid_idx, results, model_errors):
+            if result is None:
+                errors[position] = error if errors[position] is None else f"{errors[position]}; {error}"
+                continue
+            scores[position] = result["score"]
+            levels[position] = result["risk_level"]
+            versions[position] = result["model_version"]
+            for (features, shap_values), driver in zip(drivers, result["drivers"]):
+                features[position] = driver["feature"]
+                shap_values[position] = driver["shap_value"]
+
+        out[f"{model_type}_score"] = scores
+        out[f"{model_type}_risk_level"] = levels
+        out[f"{model_type}_version"] = versions
+        for rank, (features, shap_values) in enumerate(drivers, start=1):
+            out[f"{model_type}_driver_{rank}"] = features
+            out[f"{model_type}_driver_{rank}_shap"] = shap_values
+
+    out["error"] = errors
+    return out
+
+
+def _score_chunk_task(
+    chunk_index: int,
+    frame: pd.DataFrame,
+    models: Sequence[str],
+    top_drivers: int,
+    id_column: Optional[str],
+) -> Tuple[int, pd.DataFrame]:
+    return chunk_index, score_chunk(frame, models, top_drivers, id_column)
+
+
+def _part_path(output_dir: Path, chunk_index: int, output_format: str) -> Path:
+    return output_dir / f"part-{chunk_index:06d}.{output_format}"
+
+
+def _write_part(frame: pd.DataFrame, path: Path, output_format: str) -> None:
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    if output_format == "parquet":
+        frame.to_parquet(tmp_path, index=False)
+    else:
+        frame.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _input_fingerprint(path: Path) -> str:
+    """Cheap identity of the input (size, mtime, first MiB) to refuse resuming on a different file."""
+    stat = path.stat()
+    digest = hashlib.sha256(f"{stat.st_size}:{int(stat.st_mtime)}".encode())
+    with path.open("rb") as handle:
+        digest.update(handle.read(1 << 20))
+    return digest.hexdigest()[:16]
+
+
+def _check_manifest(output_dir: Path, manifest: Dict[str, Any]) -> None:
+    """Writes the run manifest, or checks that a resumed run uses the same settings."""
+    manifest_path = output_dir / MANIFEST_NAME
+    if manifest_path.exists():
+        previous = json.loads(manifest_path.read_text())
+        keys = ("input_fingerprint", "chunk_size", "models", "top_drivers", "id_column", "format")
+        changed = [key for key in keys if previous.get(key) != manifest.get(key)]
+        if changed:
+            raise ValueError(
+                f"{output_dir} holds a run with different {', '.join(changed)}; use a new output directory"
+            )
+        return
+    manifest_path.write_text(json.dumps(manifest, indent=2) + "\n")
+
+
+def score_file(
+    input_path: Path,
+    output_dir: Path,
+    models: Sequence[str] = MODEL_TYPES,
+    chunk_size: int = 5000,
+    workers: int = 1,
+    top_drivers: int = 3,
+    id_column: Optional[str] = None,
+    output_format: str = "parquet",
+) -> Dict[str, Any]:
+    """
+    Scores ``input_path`` into part files under ``output_dir``, resuming if possible.
+
+    At most ``2 * workers`` chunks are read ahead of the writer, so memory is
+    bounded by the chunk size, not the file size. ``workers <= 1`` scores in
+    this process.
+
+    Returns:
+        Summary with the number of chunks scored now, skipped (already
+        present) and rows written in this run.
+    """
+    input_path, output_dir = Path(input_path), Path(output_dir)
+    if output_format == "parquet" or _file_format(input_path) == "parquet":
+        _require_pyarrow()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    _check_manifest(output_dir, {
+        "input": str(input_path),
+        "input_fingerprint": _input_fingerprint(input_path),
+        "chunk_size": chunk_size,
+        "models": list(models),
+        "top_drivers": top_drivers,
+        "id_column": id_column,
+        "format": output_format,
+    })
+
+    summary = {"scored_chunks": 0, "skipped_chunks": 0, "rows": 0, "errors": 0}
+    started = time.perf_counter()
+
+    def record(chunk_index: int, scored: pd.DataFrame) -> None:
+        _write_part(scored, _part_path(output_dir, chunk_index, output_format), output_format)
+        summary["scored_chunks"] += 1
+        summary["rows"] += len(scored)
+        summary["errors"] += int(scored["error"].notna().sum())
+        logger.info("Chunk %s: %s rows (%s total)", chunk_index, len(scored), summary["rows"])
+
+    def pending_chunks() -> Iterator[Tuple[int, pd.DataFrame]]:
+        offset = 0
+        for chunk_index, frame in enumerate(iter_input_chunks(input_path, chunk_size, id_column)):
+            frame.index = pd.RangeIndex(offset, offset + len(frame))
+            offset += len(frame)
+            if _part_path(output_dir, chunk_index, output_format).exists():
+                summary["skipped_chunks"] += 1
+                continue
+            yield chunk_index, frame
+
+    if workers <= 1:
+        for chunk_index, frame in pending_chunks():
+            record(*_score_chunk_task(chunk_index, frame, models, top_drivers, id_column))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            in_flight: Deque[Future] = deque()
+            for chunk_index, frame in pending_chunks():
+                in_flight.append(pool.submit(_score_chunk_task, chunk_index, frame, models, top_drivers, id_column))
+                while len(in_flight) >= 2 * workers:
+                    record(*in_flight.popleft().result())
+            while in_flight:
+                record(*in_flight.popleft().result())
+
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Score a CSV/Parquet population file in resumable chunks")
+    parser.add_argument("input", type=Path, help="CSV or Parquet file of profiles")
+    parser.add_argument("output", type=Path, help="Output directory of part files (re-run to resume)")
+    parser.add_argument("--model", choices=MODEL_TYPES, action="append", help="Model(s) to score (default: both)")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--top-drivers", type=int, default=3, help="Drivers per model to keep (0 skips SHAP)")
+    parser.add_argument("--id-column", default=None, help="Input column copied to the output (e.g. SEQN)")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet", help="Part file format")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger("app.ml.feature_engineering").setLevel(logging.ERROR)
+
+    summary = score_file(
+        args.input,
+        args.output,
+        models=args.model or MODEL_TYPES,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        top_drivers=args.top_drivers,
+        id_column=args.id_column,
+        output_format=args.format,
+    )
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""
+Versioned, memory-mappable model bundles.
+
+Layout (one directory per model version):
+
+    models/bundles/<model_type>/CURRENT            -> name of the active version
+    models/bundles/<model_type>/<version>/manifest.json
+    models/bundles/<model_type>/<version>/*.npy    -> loaded with mmap_mode="r"
+    models/bundles/<model_type>/<version>/booster.ubj (diabetes)
+
+Diabetes bundles hold the XGBoost booster in UBJ format plus the imputer
+statistics. Cardiovascular bundles hold, per calibrated fold, the imputer
+statistics, scaler mean/scale, logistic regression coefficients and the
+sigmoid calibrator (a, b) as stacked ``.npy`` tables. The ``.npy`` files are
+memory-mapped, so every uvicorn worker on a box shares the same pages. The
+manifest records a SHA-256 checksum per file.
+
+Convert the existing pickles with:
+    python -m app.ml.bundles convert [--model diabetes|cardiovascular]
+
+Roll out / roll back a version (servers swap to it without a restart):
+    python -m app.ml.bundles activate <model_type> <version>
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+CURRENT_POINTER = "CURRENT"
+
+_CARDIO_TABLES = ("statistics", "mean", "scale", "coef", "intercept", "calibrator_a", "calibrator_b")
+
+
+class StatisticsImputer:
+    """
+    Fitted median/mean imputation reduced to its ``statistics_`` vector.
+
+    Behaves like a fitted ``SimpleImputer(missing_values=np.nan)`` for
+    ``transform`` and can be turned back into one with ``to_sklearn()``.
+    """
+
+    missing_values = np.nan
+    add_indicator = False
+
+    def __init__(self, statistics: np.ndarray, feature_names: List[str], strategy: str = "median"):
+        self.statistics_ = statistics
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.n_features_in_ = len(feature_names)
+        self.strategy = strategy
+
+    def transform(self, X: Union[np.ndarray, pd.DataFrame]) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            X = X.reindex(columns=list(self.feature_names_in_))
+        values = np.asarray(X, dtype=np.float64)
+        return np.where(np.isnan(values), self.statistics_, values)
+
+    def to_sklearn(self):
+        """Equivalent fitted ``SimpleImputer`` (the median of a single row is the row)."""
+        from sklearn.impute import SimpleImputer
+
+        frame = pd.DataFrame(np.asarray(self.statistics_).reshape(1, -1), columns=list(self.feature_names_in_))
+        return SimpleImputer(strategy=self.strategy).fit(frame)
+
+
+class CalibratedLinearModel:
+    """
+    ``CalibratedClassifierCV(method="sigmoid")`` over ``impute -> scale -> LogisticRegression``
+    folds, evaluated from stacked per-fold tables.
+
+    ``predict_proba`` reproduces the sklearn ensemble: the mean over folds of
+    ``expit(-(a * decision + b))``. SMOTE only acts at fit time, so it has no
+    inference-time state.
+    """
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self, feature_names: List[str], tables: Dict[str, np.ndarray]):
+        self.feature_names = list(feature_names)
+        self.tables = tables
+        self.n_folds = int(tables["coef"].shape[0])
+
+    def fold_parts(self) -> List[Dict[str, Any]]:
+        """Per-fold parameters in the ``explainers.linear_pipeline_parts`` format, plus a/b."""
+        return [
+            {
+                "columns": self.feature_names,
+                "statistics": self.tables["statistics"][k],
+                "mean": self.tables["mean"][k],
+                "scale": self.tables["scale"][k],
+                "coef": self.tables["coef"][k],
+                "intercept": float(self.tables["intercept"][k]),
+                "calibrator_a": float(self.tables["calibrator_a"][k]),
+                "calibrator_b": float(self.tables["calibrator_b"][k]),
+            }
+            for k in range(self.n_folds)
+        ]
+
+    def predict_proba(self, X: Union[np.ndarray, pd.DataFrame]) -> np.ndarray:
+        from scipy.special import expit
+
+        if isinstance(X, pd.DataFrame):
+            X = X.reindex(columns=self.feature_names)
+        values = np.asarray(X, dtype=np.float64)
+        missing = np.isnan(values)
+
+        positive = np.zeros(values.shape[0])
+        for part in self.fold_parts():
+            imputed = np.where(missing, part["statistics"], values)
+            decision = ((imputed - part["mean"]) / part["scale"]) @ part["coef"] + part["intercept"]
+            positive += expit(-(part["calibrator_a"] * decision + part["calibrator_b"]))
+        positive /= self.n_folds
+
+        return np.column_stack([1.0 - positive, positive])
+
+
+# ---------------------------------------------------------------------------
+# Paths / manifest
+# ---------------------------------------------------------------------------
+
+def get_bundles_dir() -> Path:
+    from .model_loader import get_models_dir
+
+    return get_models_dir() / "bundles"
+
+
+def current_bundle_dir(model_type: str, root: Optional[Path] = None) -> Optional[Path]:
+    """Directory of the active bundle version for ``model_type``, or None if there is none."""
+    model_root = (root or get_bundles_dir()) / model_type
+    pointer = model_root / CURRENT_POINTER
+    if not pointer.exists():
+        return None
+    bundle_dir = model_root / pointer.read_text().strip()
+    return bundle_dir if (bundle_dir / MANIFEST_NAME).exists() else None
+
+
+def read_manifest(bundle_dir: Path) -> Dict[str, Any]:
+    return json.loads((Path(bundle_dir) / MANIFEST_NAME).read_text())
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify_bundle(bundle_dir: Path, manifest: Optional[Dict[str, Any]] = None) -> None:
+    """Raise ValueError if any file's checksum differs from the manifest."""
+    manifest = manifest or read_manifest(bundle_dir)
+    for name, info in manifest["files"].items():
+        actual = _sha256(Path(bundle_dir) / name)
+        if actual != info["sha256"]:
+            raise ValueError(f"Checksum mismatch for {bundle_dir / name}: {actual} != {info['sha256']}")
+
+
+# ---------------------------------------------------------------------------
+# Load
+# ---------------------------------------------------------------------------
+
+def load_bundle(bundle_dir: Path, verify: bool = True) -> Tuple[Any, Optional[Any], List[str], Dict[str, Any]]:
+    """
+    Load a bundle directory.
+
+    Returns:
+        Tuple of (model, imputer_or_none, feature_names, manifest); same
+        contract as ``model_loader.load_model_bundle`` plus the manifest.
+    """
+    bundle_dir = Path(bundle_dir)
+    manifest = read_manifest(bundle_dir)
+    if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format: {manifest.get('format_version')}")
+    if verify:
+        verify_bundle(bundle_dir, manifest)
+
+    feature_names = list(manifest["feature_names"])
+
+    def table(name: str) -> np.ndarray:
+        return np.load(bundle_dir / f"{name}.npy", mmap_mode="r")
+
+    if manifest["kind"] == "xgboost":
+        from xgboost import XGBClassifier
+
+        model = XGBClassifier()
+        model.load_model(bundle_dir / "booster.ubj")
+        imputer = StatisticsImputer(table("imputer_statistics"), feature_names, manifest.get("imputer_strategy", "median"))
+        return model, imputer, feature_names, manifest
+
+    if manifest["kind"] == "calibrated_linear":
+        model = CalibratedLinearModel(feature_names, {name: table(name) for name in _CARDIO_TABLES})
+        return model, None, feature_names, manifest
+
+    raise ValueError(f"Unknown bundle kind: {manifest['kind']}")
+
+
+# ---------------------------------------------------------------------------
+# Convert
+# ---------------------------------------------------------------------------
+
+def _write_pointer(model_root: Path, version: str) -> None:
+    """Atomically replace CURRENT, so a polling server never reads a partial name."""
+    staging = model_root / f".{CURRENT_POINTER}.tmp"
+    staging.write_text(version + "\n")
+    staging.replace(model_root / CURRENT_POINTER)
+
+
+def _write_bundle(model_type: str, kind: str, feature_names: List[str], arrays: Dict[str, np.ndarray],
+                  root: Path, booster=None, sources: Optional[List[str]] = None, extra: Optional[Dict] = None) -> Path:
+    model_root = root / model_type
+    model_root.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=model_root))
+
+    try:
+        for name, array in arrays.items():
+            np.save(staging / f"{name}.npy", np.ascontiguousarray(array, dtype=np.float64))
+        if booster is not None:
+            booster.save_model(staging / "booster.ubj")
+
+        files = {
+            path.name: {"sha256": _sha256(path), "bytes": path.stat().st_size}
+            for path in sorted(staging.iterdir())
+        }
+        # The version is a hash of the contents, so re-converting identical models is a no-op
+        version = hashlib.sha256(
+            json.dumps({name: info["sha256"] for name, info in files.items()}, sort_keys=True).encode()
+        ).hexdigest()[:12]
+
+        manifest = {
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "model_type": model_type,
+            "kind": kind,
+            "version": version,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "feature_names": list(feature_names),
+            "sources": sources or [],
+            "files": files,
+            **(extra or {}),
+        }
+        (staging / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+
+        bundle_dir = model_root / version
+        if bundle_dir.exists():
+            shutil.rmtree(staging)
+        else:
+            staging.rename(bundle_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _write_pointer(model_root, version)
+    logger.info("Wrote %s bundle %s", model_type, bundle_dir)
+    return bundle_dir
+
+
+def convert_diabetes(model, imputer, feature_names: List[str], root: Path, sources: Optional[List[str]] = None) -> Path:
+    """Write a diabetes bundle (UBJ booster + imputer statistics) from fitted objects."""
+    if getattr(model, "calibrated_classifiers_", None):
+        raise ValueError("Calibrated XGBoost bundles are not supported; export the raw XGBClassifier")
+    if not hasattr(model, "get_booster"):
+        raise ValueError(f"Expected an XGBClassifier, got {type(model).__name__}")
+
+    statistics = np.asarray(imputer.statistics_, dtype=np.float64)
+    if np.isnan(statistics).any():
+        raise ValueError("Imputer statistics contain NaN (dropped columns are not supported)")
+
+    return _write_bundle(
+        "diabetes",
+        "xgboost",
+        feature_names,
+        {"imputer_statistics": statistics},
+        root,
+        booster=model,
+        sources=sources,
+        extra={"imputer_strategy": getattr(imputer, "strategy", "median")},
+    )
+
+
+def convert_cardiovascular(model, feature_names: List[str], root: Path, sources: Optional[List[str]] = None) -> Path:
+    """Write a cardiovascular bundle (stacked per-fold linear + calibrator tables)."""
+    from .explainers import calibrated_linear_fold_parts
+
+    parts = calibrated_linear_fold_parts(model)
+    if any(part["columns"] != list(feature_names) for part in parts):
+        raise ValueError("Every fold must use all features in feature_names order")
+
+    tables = {name: np.stack([np.atleast_1d(part[name]) for part in parts]) for name in _CARDIO_TABLES}
+    for name in ("intercept", "calibrator_a", "calibrator_b"):
+        tables[name] = tables[name].reshape(-1)
+
+    return _write_bundle("cardiovascular", "calibrated_linear", feature_names, tables, root, sources=sources)
+
+
+def convert_pickles(model_type: str, root: Optional[Path] = None) -> Path:
+    """Convert the legacy joblib pickles of ``model_type`` into a bundle directory."""
+    from .model_loader import _artifact_paths, load_pickled_model
+
+    model, imputer, feature_names = load_pickled_model(model_type)
+    sources = [path.name for path in _artifact_paths(model_type) if path.exists()]
+    root = root or get_bundles_dir()
+
+    if model_type == "cardiovascular":
+        return convert_cardiovascular(model, feature_names, root, sources)
+    return convert_diabetes(model, imputer, feature_names, root, sources)
+
+
+def set_current_version(model_type: str, version: str, root: Optional[Path] = None) -> Path:
+    """
+    Point CURRENT at an existing, checksum-valid version. Running servers pick
+    it up on their next registry refresh.
+    """
+    model_root = (root or get_bundles_dir()) / model_type
+    bundle_dir = model_root / version
+    if not (bundle_dir / MANIFEST_NAME).exists():
+        raise FileNotFoundError(f"No bundle version {version} for {model_type}")
+    verify_bundle(bundle_dir)
+    _write_pointer(model_root, version)
+    return bundle_dir
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert legacy model pickles into versioned bundles")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert")
+    convert_parser.add_argument("--model", choices=["diabetes", "cardiovascular"], action="append")
+    convert_parser.add_argument("--output", type=Path, default=None, help="Bundles root (default: models/bundles)")
+    activate_parser = subparsers.add_parser("activate", help="Point CURRENT at an existing version")
+    activate_parser.add_argument("model", choices=["diabetes", "cardiovascular"])
+    activate_parser.add_argument("version")
+    activate_parser.add_argument("--root", type=Path, default=None, help="Bundles root (default: models/bundles)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.command == "activate":
+        print(set_current_version(args.model, args.version, args.root))
+        return 0
+
+    for model_type in args.model or ["diabetes", "cardiovascular"]:
+        print(convert_pickles(model_type, args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,115 @@
+"""
+Dense (LSA) vectors for the KB sections, next to the BM25 postings.
+
+No embedding model ships with the backend and retrieval must work offline, so
+the dense channel is latent semantic analysis over the same tokens BM25 sees:
+sublinear TF-IDF of every section, reduced with a truncated SVD. Sections that
+share vocabulary with the query's usual neighbours score well even without the
+exact query terms, which is what BM25 misses.
+
+Stored in the BM25 index directory as float32 matrices (loaded with
+``mmap_mode="r"``):
+
+    dense_idf.npy           -> TF-IDF idf per BM25 vocabulary term
+    dense_term_vectors.npy  -> terms x dim projection (SVD components, transposed)
+    dense_doc_vectors.npy   -> sections x dim, L2-normalized
+
+Search is a brute-force cosine (one float32 mat-vec); at a few thousand
+sections and 128 dimensions that is well under a millisecond, so an
+approximate (HNSW) index would not pay for itself.
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ENCODER = "tfidf-lsa"
+DEFAULT_DIM = 128
+
+_FILES = ("dense_idf", "dense_term_vectors", "dense_doc_vectors")
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+class LSAIndex:
+    """TF-IDF -> truncated SVD section vectors, searched by cosine similarity."""
+
+    def __init__(self, idf: np.ndarray, term_vectors: np.ndarray, doc_vectors: np.ndarray):
+        self.idf = idf
+        self.term_vectors = term_vectors
+        self.doc_vectors = doc_vectors
+
+    @property
+    def dim(self) -> int:
+        return self.doc_vectors.shape[1]
+
+    @classmethod
+    def from_postings(cls, indptr: np.ndarray, doc_ids: np.ndarray, term_freqs: np.ndarray, n_docs: int,
+                      dim: int = DEFAULT_DIM, random_state: int = 0) -> Optional["LSAIndex"]:
+        """
+        Fit on term-major CSR postings (``indptr`` per term). Returns None when
+        the KB is too small for a useful decomposition (fewer than 3 sections
+        or terms).
+        """
+        from scipy import sparse
+        from sklearn.decomposition import TruncatedSVD
+
+        n_terms = len(indptr) - 1
+        dim = min(dim, n_docs - 1, n_terms - 1)
+        if dim < 2:
+            return None
+
+        # Smooth idf and sublinear tf, like TfidfVectorizer(sublinear_tf=True)
+        df = np.diff(indptr)
+        idf = np.log((1 + n_docs) / (1 + df)) + 1
+        term_ids = np.repeat(np.arange(n_terms), df)
+        values = (1 + np.log(np.asarray(term_freqs, dtype=np.float64))) * idf[term_ids]
+        norms = np.sqrt(np.bincount(doc_ids, weights=values ** 2, minlength=n_docs))
+        values /= np.where(norms > 0, norms, 1.0)[doc_ids]
+        tfidf = sparse.csr_matrix((values, (doc_ids, term_ids)), shape=(n_docs, n_terms))
+
+        svd = TruncatedSVD(n_components=dim, algorithm="randomized", random_state=random_state)
+        doc_vectors = svd.fit_transform(tfidf)
+        logger.info("LSA: %s secciones, %s términos, %s dimensiones (varianza explicada %.2f)",
+                    n_docs, n_terms, dim, float(svd.explained_variance_ratio_.sum()))
+        return cls(
+            idf.astype(np.float32),
+            np.ascontiguousarray(svd.components_.T, dtype=np.float32),
+            _normalize_rows(doc_vectors).astype(np.float32),
+        )
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["LSAIndex"]:
+        index_dir = Path(index_dir)
+        if not all((index_dir / f"{name}.npy").exists() for name in _FILES):
+            return None
+        return cls(*(np.load(index_dir / f"{name}.npy", mmap_mode="r") for name in _FILES))
+
+    def save(self, index_dir: Path) -> None:
+        for name, array in zip(_FILES, (self.idf, self.term_vectors, self.doc_vectors)):
+            np.save(Path(index_dir) / f"{name}.npy", np.ascontiguousarray(array, dtype=np.float32))
+
+    def describe(self) -> Dict[str, Any]:
+        return {"encoder": ENCODER, "dim": self.dim}
+
+    def encode(self, queries: List[np.ndarray]) -> np.ndarray:
+        """Unit vectors (queries x dim) for queries given as arrays of known term ids."""
+        vectors = np.zeros((len(queries), self.dim), dtype=np.float32)
+        for row, term_ids in enumerate(queries):
+            if not len(term_ids):
+                continue
+            terms, counts = np.unique(term_ids, return_counts=True)
+            weights = (1 + np.log(counts)) * self.idf[terms]
+            vectors[row] = (weights / np.linalg.norm(weights)) @ self.term_vectors[terms]
+        return _normalize_rows(vectors)
+
+    def score_batch(self, queries: List[np.ndarray]) -> np.ndarray:
+        """Cosine similarity of every section to each query (queries x sections)."""
+        return self.encode(queries) @ np.asarray(self.doc_vectors).T
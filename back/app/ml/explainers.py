@@ -0,0 +1,413 @@
+"""
+Model explanations: native tree contributions, precompiled linear plans and
+the nearest-neighbour reference store for approximate drivers.
+
+Rebuild the reference store of the active diabetes model with:
+    python -m app.ml.explainers [--limit N]
+"""
+
+import csv
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+from .feature_engineering import CARDIO_FEATURE_COLUMNS
+from .model_loader import ModelVersion, get_active_model, get_models_dir
+
+logger = logging.getLogger(__name__)
+
+
+def _tree_estimators(model) -> List[Any]:
+    """Fitted tree estimators behind a model: every calibrated fold, or the model itself."""
+    calibrated = getattr(model, "calibrated_classifiers_", None)
+    if calibrated:
+        return [fold.estimator for fold in calibrated]
+    return [model]
+
+
+class TreeContributionExplainer:
+    """
+    Per-feature contributions from XGBoost's native TreeSHAP (``pred_contribs``).
+
+    Contributions are in log-odds space, like ``shap.TreeExplainer`` on the
+    raw booster, and are averaged across all calibrated folds. The bias
+    column is dropped.
+    """
+
+    def __init__(self, boosters: List[Any]):
+        if not boosters:
+            raise ValueError("At least one booster is required")
+        self.boosters = boosters
+        self.feature_names = boosters[0].feature_names
+
+    @classmethod
+    def from_model(cls, model) -> Optional["TreeContributionExplainer"]:
+        """Build from an XGBoost classifier (optionally calibrated); None if not XGBoost."""
+        boosters = []
+        for estimator in _tree_estimators(model):
+            get_booster = getattr(estimator, "get_booster", None)
+            if get_booster is None:
+                return None
+            boosters.append(get_booster())
+        return cls(boosters)
+
+    def contributions(self, values: np.ndarray, feature_names: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Contribution matrix of shape (n_rows, n_features) for an imputed feature matrix.
+
+        Args:
+            values: 2D float matrix in the booster's feature order.
+            feature_names: Column names of ``values``; must match the booster's if both are set.
+        """
+        import xgboost as xgb
+
+        if feature_names is not None and self.feature_names is not None and list(feature_names) != list(self.feature_names):
+            raise ValueError("Feature names do not match the booster's feature names")
+
+        dmatrix = xgb.DMatrix(np.asarray(values, dtype=np.float32), feature_names=self.feature_names)
+
+        total = None
+        for booster in self.boosters:
+            contribs = booster.predict(dmatrix, pred_contribs=True)
+            total = contribs if total is None else total + contribs
+
+        total = total[:, :-1]
+        if len(self.boosters) > 1:
+            total = total / len(self.boosters)
+        return total.astype(np.float64, copy=False)
+
+
+def top_k_indices(contributions: np.ndarray, k: int) -> np.ndarray:
+    """
+    Column indices of the ``k`` largest absolute contributions per row, strongest first.
+
+    Uses ``argpartition`` so only the k candidates get sorted; ties are
+    ordered by feature position.
+    """
+    magnitudes = np.abs(contributions)
+    n_rows, n_features = magnitudes.shape
+    if n_features > k:
+        candidates = np.argpartition(-magnitudes, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n_features), (n_rows, n_features))
+    candidate_magnitudes = np.take_along_axis(magnitudes, candidates, axis=1)
+    order = np.lexsort((candidates, -candidate_magnitudes))
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def linear_pipeline_parts(pipeline) -> Dict[str, Any]:
+    """
+    Fitted parameters of a ``pre`` (imputer + scaler) -> ``clf`` (linear) pipeline.
+
+    Returns:
+        Dict with ``columns`` (input columns of the transformer, in output order),
+        ``statistics`` (imputer fill values), ``mean``/``scale`` (scaler),
+        ``coef`` and ``intercept`` (binary linear classifier).
+    """
+    preprocessor = pipeline.named_steps["pre"]
+    classifier = pipeline.named_steps["clf"]
+
+    transformers = [
+        (name, transformer, columns)
+        for name, transformer, columns in preprocessor.transformers_
+        if transformer != "drop" and len(columns)
+    ]
+    if len(transformers) != 1:
+        raise ValueError("Expected a single numeric transformer in the preprocessor")
+
+    _, numeric, columns = transformers[0]
+    imputer = numeric.named_steps["imputer"]
+    scaler = numeric.named_steps["scaler"]
+
+    if imputer.strategy not in ("median", "mean") or getattr(imputer, "add_indicator", False):
+        raise ValueError(f"Unsupported imputer: {imputer!r}")
+    if classifier.coef_.shape[0] != 1:
+        raise ValueError("Only binary linear classifiers are supported")
+
+    coef = classifier.coef_[0].astype(np.float64)
+    return {
+        "columns": [str(column) for column in columns],
+        "statistics": imputer.statistics_.astype(np.float64),
+        "mean": scaler.mean_ if scaler.with_mean else np.zeros_like(coef),
+        "scale": scaler.scale_ if scaler.with_std else np.ones_like(coef),
+        "coef": coef,
+        "intercept": float(classifier.intercept_[0]),
+    }
+
+
+def calibrated_linear_fold_parts(model) -> List[Dict[str, Any]]:
+    """
+    ``linear_pipeline_parts`` of every calibrated fold plus its sigmoid
+    calibrator (``calibrator_a``, ``calibrator_b``).
+
+    Works for a sklearn ``CalibratedClassifierCV`` and for bundle-loaded
+    models exposing ``fold_parts()``.
+    """
+    if hasattr(model, "fold_parts"):
+        return model.fold_parts()
+
+    calibrated = getattr(model, "calibrated_classifiers_", None)
+    if not calibrated:
+        raise ValueError("Model is not a fitted CalibratedClassifierCV")
+    if getattr(model, "method", "sigmoid") != "sigmoid":
+        raise ValueError(f"Unsupported calibration method: {model.method}")
+
+    parts = []
+    for fold in calibrated:
+        fold_parts = linear_pipeline_parts(fold.estimator)
+        calibrator = fold.calibrators[0]
+        fold_parts["calibrator_a"] = float(calibrator.a_)
+        fold_parts["calibrator_b"] = float(calibrator.b_)
+        parts.append(fold_parts)
+    return parts
+
+
+class LinearExplanationPlan:
+    """
+    Precompiled linear contributions (scaled value * coefficient) for a
+    ``pre`` -> ``clf`` pipeline.
+
+    The scaler is folded into the coefficients at build time:
+    ``(x - mean) / scale * coef == x * w - mean * w`` with ``w = coef / scale``,
+    so contributions for one row or a batch are a single numpy expression
+    on the raw feature matrix.
+    """
+
+    def __init__(self, input_names: List[str], parts: Dict[str, Any]):
+        self.input_names = list(input_names)
+        self.feature_names = parts["columns"]
+
+        index = {name: idx for idx, name in enumerate(self.input_names)}
+        missing = [name for name in self.feature_names if name not in index]
+        if missing:
+            raise ValueError(f"Pipeline columns missing from input features: {missing}")
+        self.input_index = np.array([index[name] for name in self.feature_names], dtype=np.intp)
+        self._identity = self.input_index.tolist() == list(range(len(self.input_names)))
+
+        self._statistics = parts["statistics"]
+        self._weights = parts["coef"] / parts["scale"]
+        self._offset = parts["mean"] * self._weights
+
+    @classmethod
+    def from_model(cls, model, input_names: List[str]) -> "LinearExplanationPlan":
+        """Build from the first calibrated fold (or the bare pipeline) of the cardiovascular model."""
+        if hasattr(model, "fold_parts"):
+            return cls(input_names, model.fold_parts()[0])
+
+        pipeline = None
+        if getattr(model, "calibrated_classifiers_", None):
+            pipeline = model.calibrated_classifiers_[0].estimator
+        elif hasattr(model, "estimator"):
+            pipeline = model.estimator
+        elif hasattr(model, "named_steps"):
+            pipeline = model
+
+        if pipeline is None or not hasattr(pipeline, "named_steps"):
+            raise AttributeError("Cardiovascular pipeline does not expose named_steps")
+        return cls(input_names, linear_pipeline_parts(pipeline))
+
+    def contributions(self, values: np.ndarray) -> np.ndarray:
+        """
+        Contribution matrix (n_rows, len(feature_names)) for a raw matrix in
+        ``input_names`` order (NaN = missing).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        selected = values if self._identity else values[:, self.input_index]
+        imputed = np.where(np.isnan(selected), self._statistics, selected)
+        return imputed * self._weights - self._offset
+
+
+class ReferenceDriverStore:
+    """
+    Nearest-neighbour lookup of precomputed contributions.
+
+    Holds imputed reference rows (NHANES) with their exact contributions from
+    one model version. A new row gets the mean contributions of its ``k``
+    nearest reference rows (Euclidean distance on standardized features):
+    a single matrix product per batch, microseconds per row.
+    """
+
+    def __init__(self, feature_names: List[str], rows: np.ndarray, contributions: np.ndarray, k: int = 5):
+        if rows.shape != contributions.shape:
+            raise ValueError("Reference rows and contributions must have the same shape")
+        self.feature_names = list(feature_names)
+        self.k = max(1, min(k, len(rows)))
+        self.contribution_table = np.asarray(contributions, dtype=np.float64)
+
+        rows = np.asarray(rows, dtype=np.float64)
+        self._center = rows.mean(axis=0)
+        scale = rows.std(axis=0)
+        self._scale = np.where(scale > 0, scale, 1.0)
+        self._rows = (rows - self._center) / self._scale
+        self._row_norms = np.einsum("ij,ij->i", self._rows, self._rows)
+        self._raw_rows = rows
+
+    @classmethod
+    def build(cls, explainer: "TreeContributionExplainer", rows: np.ndarray, feature_names: List[str], k: int = 5):
+        """Compute exact contributions for ``rows`` (imputed) with ``explainer``."""
+        return cls(feature_names, rows, explainer.contributions(rows, feature_names), k)
+
+    @classmethod
+    def load(cls, path: Path, k: int = 5) -> "ReferenceDriverStore":
+        with np.load(path, allow_pickle=False) as data:
+            return cls([str(name) for name in data["feature_names"]], data["rows"], data["contributions"], k)
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = path.with_name(f".{path.stem}.tmp.npz")
+        np.savez(
+            staging,
+            feature_names=np.asarray(self.feature_names),
+            rows=self._raw_rows,
+            contributions=self.contribution_table,
+        )
+        staging.replace(path)
+
+    def contributions(self, values: np.ndarray, feature_names: Optional[List[str]] = None) -> np.ndarray:
+        """Approximate contribution matrix (n_rows, n_features) for an imputed feature matrix."""
+        if feature_names is not None and list(feature_names) != self.feature_names:
+            raise ValueError("Feature names do not match the reference store's feature names")
+
+        queries = (np.asarray(values, dtype=np.float64) - self._center) / self._scale
+        # ||q - r||^2 without the ||q||^2 term, which does not change the ranking
+        distances = self._row_norms[None, :] - 2.0 * queries @ self._rows.T
+        if self.k < len(self._rows):
+            neighbours = np.argpartition(distances, self.k - 1, axis=1)[:, :self.k]
+        else:
+            neighbours = np.broadcast_to(np.arange(len(self._rows)), (len(queries), len(self._rows)))
+        return self.contribution_table[neighbours].mean(axis=1)
+
+
+def get_reference_store_path(version: ModelVersion) -> Path:
+    return get_models_dir() / "reference" / f"{version.model_type}-{version.version}.npz"
+
+
+def build_reference_store(version: ModelVersion, limit: Optional[int] = None) -> Optional[ReferenceDriverStore]:
+    """Reference store for a tree model version from the NHANES rows (None if it has no tree explainer)."""
+    from .nhanes import load_nhanes_profiles
+    from .predictor import _impute, build_profile_matrix
+
+    explainer = get_contribution_explainer(version.model_type, version)
+    if explainer is None or version.imputer is None:
+        return None
+
+    plan, X = build_profile_matrix(load_nhanes_profiles(limit=limit), version.model_type, version.feature_names)
+    return ReferenceDriverStore.build(explainer, _impute(version.imputer, X, plan.feature_names), plan.feature_names)
+
+
+def _load_reference_store(version: ModelVersion) -> Optional[ReferenceDriverStore]:
+    path = get_reference_store_path(version)
+    try:
+        if path.exists():
+            store = ReferenceDriverStore.load(path)
+        else:
+            store = build_reference_store(version, limit=settings.REFERENCE_STORE_MAX_ROWS or None)
+            if store is None:
+                return None
+            try:
+                store.save(path)
+            except OSError as e:
+                logger.warning("Could not save reference store %s: %s", path, e)
+    except Exception as e:
+        logger.warning("Failed to load reference drivers for %s: %s", version.model_type, e)
+        return None
+
+    if store.feature_names != version.feature_names:
+        logger.warning("Reference store %s does not match the %s feature names", path, version.model_type)
+        return None
+    logger.info("Reference drivers ready for %s %s (%s rows)", version.model_type, version.version, len(store.contribution_table))
+    return store
+
+
+def get_reference_store(
+    model_type: str = "diabetes", version: Optional[ModelVersion] = None, build: bool = True
+) -> Optional[ReferenceDriverStore]:
+    """
+    Approximate-driver store for a tree model version (defaults to the active one).
+
+    With ``build=False`` only a saved store is loaded: None if the version has
+    no ``.npz`` yet (building runs XGBoost, see app.core.preload).
+    """
+    version = version or get_active_model(model_type)
+    if not build and not get_reference_store_path(version).exists():
+        return None
+    return version.artifact("reference_store", lambda: _load_reference_store(version))
+
+
+@lru_cache(maxsize=1)
+def get_reference_importance() -> List[str]:
+    """Cardiovascular features ordered by mean |SHAP| (``shap_feature_importance.csv``); [] if missing."""
+    path = get_models_dir() / "shap_feature_importance.csv"
+    try:
+        with open(path, newline="") as handle:
+            rows = [(row["feature"], float(row["importance"])) for row in csv.DictReader(handle)]
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning("Could not read %s: %s", path, e)
+        return []
+    return [feature for feature, _ in sorted(rows, key=lambda row: row[1], reverse=True)]
+
+
+def _build_contribution_explainer(version: ModelVersion) -> Optional[TreeContributionExplainer]:
+    try:
+        explainer = TreeContributionExplainer.from_model(version.model)
+    except Exception as e:
+        logger.warning("Failed to initialize native explainer for %s: %s", version.model_type, e)
+        return None
+    if explainer is not None:
+        logger.info("Native XGBoost contribution explainer initialized for %s %s", version.model_type, version.version)
+    return explainer
+
+
+def _build_linear_plan(version: ModelVersion) -> Optional[LinearExplanationPlan]:
+    try:
+        plan = LinearExplanationPlan.from_model(version.model, version.feature_names or CARDIO_FEATURE_COLUMNS)
+    except Exception as e:
+        logger.warning("Failed to build linear explanation plan for %s: %s", version.model_type, e)
+        return None
+    logger.info("Linear explanation plan initialized for %s %s", version.model_type, version.version)
+    return plan
+
+
+def get_contribution_explainer(
+    model_type: str = "diabetes", version: Optional[ModelVersion] = None
+) -> Optional[TreeContributionExplainer]:
+    """Native contribution explainer for a tree model version (defaults to the active one)."""
+    version = version or get_active_model(model_type)
+    return version.artifact("contribution_explainer", lambda: _build_contribution_explainer(version))
+
+
+def get_linear_explanation_plan(
+    model_type: str = "cardiovascular", version: Optional[ModelVersion] = None
+) -> Optional[LinearExplanationPlan]:
+    """Precompiled linear explanation plan for a model version (defaults to the active one)."""
+    version = version or get_active_model(model_type)
+    return version.artifact("linear_plan", lambda: _build_linear_plan(version))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the approximate-driver reference store of the active model")
+    parser.add_argument("--model", choices=["diabetes"], default="diabetes")
+    parser.add_argument("--limit", type=int, default=None, help="NHANES rows to use (default: all)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    version = get_active_model(args.model)
+    store = build_reference_store(version, limit=args.limit)
+    if store is None:
+        print(f"{args.model} has no tree explainer")
+        return 1
+    path = get_reference_store_path(version)
+    store.save(path)
+    print(f"wrote {path} ({len(store.contribution_table)} rows)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,7 +1,10 @@
 import logging
+import math
+import threading
+from functools import lru_cache
 import numpy as np
 import pandas as pd
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +49,34 @@ FEATURE_DESCRIPTIONS = {
     'etnia_5.0': 'Etnia (categoría 5)'
 }
 
+DIABETES_FEATURE_COLUMNS = [
+    'age',
+    'age_squared',
+    'sex_male',
+    'bmi',
+    'bmi_squared',
+    'waist_height_ratio',
+    'waist_height_ratio_squared',
+    'high_waist_height_ratio',
+    'central_obesity',
+    'high_risk_profile',
+    'sleep_hours',
+    'poor_sleep',
+    'cigarettes_per_day',
+    'current_smoker',
+    'ever_smoker',
+    'total_active_days',
+    'meets_activity_guidelines',
+    'sedentary_flag',
+    'lifestyle_risk_score',
+    'bmi_age_interaction',
+    'waist_age_interaction',
+    'bmi_age_sex_interaction',
+    'obesity_sedentary_combo',
+    'age_poor_sleep',
+    'triple_risk'
+]
+
 CARDIO_FEATURE_COLUMNS = [
     'edad',
     'sexo',
@@ -68,7 +99,7 @@ CARDIO_FEATURE_COLUMNS = [
     'etnia_5.0'
 ]
 
-def build_feature_frame(
+def _diabetes_feature_row(
     age: int,
     sex: str,
     height_cm: Optional[float] = None,
@@ -80,27 +111,8 @@ def build_feature_frame(
     bmi: Optional[float] = None,
     systolic_bp: Optional[float] = None,
     total_cholesterol: Optional[float] = None,
-    feature_names: list = None
-) -> pd.DataFrame:
-    """
-    Build feature frame from user profile data.
-    Based on ml/api_main.py logic.
-    
-    Args:
-        age: User age
-        sex: User sex ('M' or 'F')
-        height_cm: Height in cm (optional if bmi provided)
-        weight_kg: Weight in kg (optional if bmi provided)
-        waist_cm: Waist circumference in cm
-        sleep_hours: Hours of sleep per night
-        smokes_cig_day: Cigarettes per day
-        days_mvpa_week: Days of moderate-vigorous physical activity per week
-        bmi: Pre-calculated BMI (if not provided, calculated from height/weight)
-        feature_names: List of expected feature names for ordering
-    
-    Returns:
-        DataFrame with engineered features
-    """
+) -> Tuple[float, ...]:
+    """Compute the engineered diabetes features for one profile, in DIABETES_FEATURE_COLUMNS order."""
     if bmi is None:
         if height_cm is None or weight_kg is None:
             raise ValueError("Either bmi or both height_cm and weight_kg must be provided")
@@ -120,7 +132,7 @@ def build_feature_frame(
     sleep_hours = float(sleep_hours) if sleep_hours is not None else np.nan
 
     cigarettes = float(smokes_cig_day) if smokes_cig_day is not None else np.nan
-    if np.isnan(cigarettes):
+    if math.isnan(cigarettes):
         cigarettes = 0.0
 
     current_smoker = float(1.0 if cigarettes > 0 else 0.0)
@@ -129,17 +141,17 @@ def build_feature_frame(
     total_active_days = float(days_mvpa_week) if days_mvpa_week is not None else np.nan
     meets_activity_guidelines = np.nan
     sedentary_flag = np.nan
-    if not np.isnan(total_active_days):
+    if not math.isnan(total_active_days):
         meets_activity_guidelines = float(1.0 if total_active_days >= 5 else 0.0)
         sedentary_flag = float(1.0 if total_active_days < 5 else 0.0)
 
     poor_sleep = np.nan
-    if not np.isnan(sleep_hours):
+    if not math.isnan(sleep_hours):
         poor_sleep = float(1.0 if (sleep_hours < 7 or sleep_hours > 9) else 0.0)
 
     central_obesity = np.nan
     high_waist_height_ratio = np.nan
-    if not np.isnan(waist_height_ratio):
+    if not math.isnan(waist_height_ratio):
         central_obesity = float(1.0 if waist_height_ratio > 0.5 else 0.0)
         high_waist_height_ratio = float(1.0 if waist_height_ratio > 0.6 else 0.0)
     elif waist_cm is not None:
@@ -161,11 +173,11 @@ def build_feature_frame(
 
     lifestyle_components = [
         comp for comp in [poor_sleep, current_smoker, sedentary_flag, bp_flag, chol_flag]
-        if not np.isnan(comp)
+        if not math.isnan(comp)
     ]
     lifestyle_risk_score = np.nan
     if lifestyle_components:
-        lifestyle_risk_score = float(min(3.0, np.sum(lifestyle_components)))
+        lifestyle_risk_score = float(min(3.0, sum(lifestyle_components)))
 
     waist_age_interaction = np.nan
     if waist_cm is not None:
@@ -175,61 +187,117 @@ def build_feature_frame(
     bmi_age_sex_interaction = float(bmi * age * sex_male) if bmi is not None else np.nan
 
     age_poor_sleep = np.nan
-    if not np.isnan(poor_sleep):
+    if not math.isnan(poor_sleep):
         age_poor_sleep = float(age * poor_sleep)
 
     obesity_sedentary_combo = np.nan
     triple_risk = np.nan
-    if not np.isnan(obesity_flag) and not np.isnan(sedentary_flag):
+    if not math.isnan(obesity_flag) and not math.isnan(sedentary_flag):
         obesity_sedentary_combo = float(1.0 if (obesity_flag == 1.0 and sedentary_flag == 1.0) else 0.0)
         triple_sum = obesity_flag + sedentary_flag + current_smoker
         triple_risk = float(1.0 if triple_sum >= 2 else 0.0)
 
-    feature_values = {
-        'age': float(age),
-        'age_squared': float(age ** 2),
-        'sex_male': float(sex_male),
-        'bmi': float(bmi),
-        'bmi_squared': float(bmi ** 2) if bmi is not None else np.nan,
-        'waist_height_ratio': waist_height_ratio,
-        'waist_height_ratio_squared': waist_height_ratio ** 2 if not np.isnan(waist_height_ratio) else np.nan,
-        'high_waist_height_ratio': high_waist_height_ratio,
-        'central_obesity': central_obesity,
-        'high_risk_profile': float(1.0 if bmi is not None and bmi >= 30 and age >= 45 else 0.0) if bmi is not None else np.nan,
-        'sleep_hours': sleep_hours,
-        'poor_sleep': poor_sleep,
-        'cigarettes_per_day': cigarettes,
-        'current_smoker': current_smoker,
-        'ever_smoker': ever_smoker,
-        'total_active_days': total_active_days,
-        'meets_activity_guidelines': meets_activity_guidelines,
-        'sedentary_flag': sedentary_flag,
-        'lifestyle_risk_score': lifestyle_risk_score,
-        'bmi_age_interaction': bmi_age_interaction,
-        'waist_age_interaction': waist_age_interaction,
-        'bmi_age_sex_interaction': bmi_age_sex_interaction,
-        'obesity_sedentary_combo': obesity_sedentary_combo,
-        'age_poor_sleep': age_poor_sleep,
-        'triple_risk': triple_risk
-    }
-
-    features_df = pd.DataFrame([feature_values])
-
-    missing_values = pd.Series(feature_values).isna()
-    if missing_values.any():
-        logger.info(
-            "Imputing missing engineered features: %s",
-            missing_values[missing_values].index.tolist()
-        )
+    bmi = float(bmi)
 
     logger.debug(
         "Engineered features summary | bmi=%.2f, lifestyle_score=%s, waist_ratio=%s, bp_flag=%s, chol_flag=%s",
-        feature_values['bmi'],
+        bmi,
         lifestyle_risk_score,
         waist_height_ratio,
         bp_flag,
         chol_flag
     )
+
+    # Same order as DIABETES_FEATURE_COLUMNS
+    return (
+        float(age),
+        float(age ** 2),
+        float(sex_male),
+        bmi,
+        float(bmi ** 2),
+        waist_height_ratio,
+        waist_height_ratio ** 2 if not math.isnan(waist_height_ratio) else np.nan,
+        high_waist_height_ratio,
+        central_obesity,
+        float(1.0 if bmi >= 30 and age >= 45 else 0.0),
+        sleep_hours,
+        poor_sleep,
+        cigarettes,
+        current_smoker,
+        ever_smoker,
+        total_active_days,
+        meets_activity_guidelines,
+        sedentary_flag,
+        lifestyle_risk_score,
+        bmi_age_interaction,
+        waist_age_interaction,
+        bmi_age_sex_interaction,
+        obesity_sedentary_combo,
+        age_poor_sleep,
+        triple_risk,
+    )
+
+
+def _diabetes_feature_values(**profile: Any) -> Dict[str, float]:
+    """Compute the engineered diabetes features for one profile, keyed by feature name."""
+    return dict(zip(DIABETES_FEATURE_COLUMNS, _diabetes_feature_row(**profile)))
+
+
+def build_feature_frame(
+    age: int,
+    sex: str,
+    height_cm: Optional[float] = None,
+    weight_kg: Optional[float] = None,
+    waist_cm: Optional[float] = None,
+    sleep_hours: Optional[float] = None,
+    smokes_cig_day: Optional[float] = None,
+    days_mvpa_week: Optional[int] = None,
+    bmi: Optional[float] = None,
+    systolic_bp: Optional[float] = None,
+    total_cholesterol: Optional[float] = None,
+    feature_names: list = None
+) -> pd.DataFrame:
+    """
+    Build feature frame from user profile data.
+    Based on ml/api_main.py logic.
+    
+    Args:
+        age: User age
+        sex: User sex ('M' or 'F')
+        height_cm: Height in cm (optional if bmi provided)
+        weight_kg: Weight in kg (optional if bmi provided)
+        waist_cm: Waist circumference in cm
+        sleep_hours: Hours of sleep per night
+        smokes_cig_day: Cigarettes per day
+        days_mvpa_week: Days of moderate-vigorous physical activity per week
+        bmi: Pre-calculated BMI (if not provided, calculated from height/weight)
+        feature_names: List of expected feature names for ordering
+    
+    Returns:
+        DataFrame with engineered features
+    """
+    feature_values = _diabetes_feature_values(
+        age=age,
+        sex=sex,
+        height_cm=height_cm,
+        weight_kg=weight_kg,
+        waist_cm=waist_cm,
+        sleep_hours=sleep_hours,
+        smokes_cig_day=smokes_cig_day,
+        days_mvpa_week=days_mvpa_week,
+        bmi=bmi,
+        systolic_bp=systolic_bp,
+        total_cholesterol=total_cholesterol,
+    )
+
+    features_df = pd.DataFrame([feature_values])
+
+    missing_values = pd.Series(feature_values).isna()
+    if missing_values.any():
+        logger.debug(
+            "Imputing missing engineered features: %s",
+            missing_values[missing_values].index.tolist()
+        )
     
     if feature_names:
         # Efficiently add missing features using reindex (avoids DataFrame fragmentation)
@@ -237,12 +305,26 @@ def build_feature_frame(
     
     return features_df
 
+
+def build_feature_matrix(
+    profiles: List[Dict[str, Any]],
+    feature_names: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Build the diabetes feature frame for many profiles at once.
+
+    Each profile is a dict with the keyword arguments of ``build_feature_frame``
+    (without ``feature_names``). All rows share a single DataFrame construction.
+    """
+    plan = get_feature_plan("diabetes", feature_names or DIABETES_FEATURE_COLUMNS)
+    return pd.DataFrame(plan.build_matrix(profiles), columns=plan.feature_names)
+
 def get_feature_description(feature_name: str) -> str:
     """Get Spanish description for a feature name."""
     return FEATURE_DESCRIPTIONS.get(feature_name, feature_name)
 
 
-def build_cardiovascular_feature_frame(
+def _cardiovascular_feature_row(
     edad: int,
     genero: Optional[str],
     imc: Optional[float] = None,
@@ -253,9 +335,8 @@ def build_cardiovascular_feature_frame(
     hdl_mgdl: Optional[float] = None,
     trigliceridos_mgdl: Optional[float] = None,
     ldl_mgdl: Optional[float] = None,
-    feature_names: Optional[List[str]] = None
-) -> pd.DataFrame:
-    """Build the feature frame expected by the cardiovascular pipeline."""
+) -> Tuple[float, ...]:
+    """Compute the cardiovascular pipeline inputs for one profile, in CARDIO_FEATURE_COLUMNS order."""
 
     sexo_value: float = np.nan
     if genero:
@@ -293,53 +374,195 @@ def build_cardiovascular_feature_frame(
         except Exception:
             trigliceridos_log = np.nan
 
-    # Log valores críticos antes de construir features
-    logger.info(f"🔍 Construyendo features cardiovasculares:")
-    logger.info(f"   edad={edad}, sexo={genero}, imc={bmi_value}")
-    logger.info(f"   cintura={circunferencia_cintura}, rel_cintura_altura={rel_cintura_altura}")
-    logger.info(f"   glucosa={glucosa_mgdl}, hdl={hdl_mgdl}, ldl={ldl_mgdl}, trig={trigliceridos_mgdl}")
-    logger.info(f"   Valores faltantes: hdl={hdl_mgdl is None}, ldl={ldl_mgdl is None}, trig={trigliceridos_mgdl is None}")
-    
-    cardio_values: Dict[str, Any] = {
-        'edad': float(edad),
-        'sexo': sexo_value,
-        'educacion': np.nan,
-        'ratio_ingreso_pobreza': np.nan,
-        'imc': float(bmi_value) if bmi_value is not None else np.nan,
-        'cintura_cm': float(circunferencia_cintura) if circunferencia_cintura is not None else np.nan,
-        'rel_cintura_altura': rel_cintura_altura,
-        'glucosa_mgdl': float(glucosa_mgdl) if glucosa_mgdl is not None else np.nan,
-        'hdl_mgdl': float(hdl_mgdl) if hdl_mgdl is not None else np.nan,
-        'trigliceridos_mgdl': float(trigliceridos_mgdl) if trigliceridos_mgdl is not None else np.nan,
-        'ldl_mgdl': float(ldl_mgdl) if ldl_mgdl is not None else np.nan,
-        'imc_cuadratico': imc_cuadratico,
-        'imc_x_edad': imc_x_edad,
-        'ratio_hdl_ldl': ratio_hdl_ldl,
-        'trigliceridos_log': trigliceridos_log,
-        'etnia_2.0': 0.0,
-        'etnia_3.0': 0.0,
-        'etnia_4.0': 0.0,
-        'etnia_5.0': 0.0
-    }
-    
     # Validar valores extremos que podrían indicar errores de entrada
     if bmi_value is not None and bmi_value > 60:
-        logger.warning(f"⚠️ IMC extremadamente alto detectado: {bmi_value:.2f}. Verificar si los datos son correctos.")
-    if rel_cintura_altura is not None and not np.isnan(rel_cintura_altura) and rel_cintura_altura > 1.0:
-        logger.warning(f"⚠️ Relación cintura-altura extremadamente alta: {rel_cintura_altura:.2f}. Verificar si los datos son correctos.")
+        logger.warning("⚠️ IMC extremadamente alto detectado: %.2f. Verificar si los datos son correctos.", bmi_value)
+    if rel_cintura_altura is not None and not math.isnan(rel_cintura_altura) and rel_cintura_altura > 1.0:
+        logger.warning("⚠️ Relación cintura-altura extremadamente alta: %.2f. Verificar si los datos son correctos.", rel_cintura_altura)
+
+    # Same order as CARDIO_FEATURE_COLUMNS
+    return (
+        float(edad),
+        sexo_value,
+        np.nan,  # educacion
+        np.nan,  # ratio_ingreso_pobreza
+        float(bmi_value) if bmi_value is not None else np.nan,
+        float(circunferencia_cintura) if circunferencia_cintura is not None else np.nan,
+        rel_cintura_altura,
+        float(glucosa_mgdl) if glucosa_mgdl is not None else np.nan,
+        float(hdl_mgdl) if hdl_mgdl is not None else np.nan,
+        float(trigliceridos_mgdl) if trigliceridos_mgdl is not None else np.nan,
+        float(ldl_mgdl) if ldl_mgdl is not None else np.nan,
+        imc_cuadratico,
+        imc_x_edad,
+        ratio_hdl_ldl,
+        trigliceridos_log,
+        0.0,  # etnia_2.0
+        0.0,  # etnia_3.0
+        0.0,  # etnia_4.0
+        0.0,  # etnia_5.0
+    )
 
-    features_df = pd.DataFrame([cardio_values])
 
+def _cardiovascular_feature_values(**profile: Any) -> Dict[str, Any]:
+    """Compute the cardiovascular pipeline inputs for one profile, keyed by column name."""
+    return dict(zip(CARDIO_FEATURE_COLUMNS, _cardiovascular_feature_row(**profile)))
+
+
+def _order_cardiovascular_columns(
+    features_df: pd.DataFrame,
+    feature_names: Optional[List[str]] = None
+) -> pd.DataFrame:
     if feature_names:
         for feat in feature_names:
             if feat not in features_df.columns:
                 features_df[feat] = np.nan
-        features_df = features_df[feature_names]
-    else:
-        missing = [col for col in CARDIO_FEATURE_COLUMNS if col not in features_df.columns]
-        for col in missing:
-            features_df[col] = np.nan
-        features_df = features_df[CARDIO_FEATURE_COLUMNS]
+        return features_df[feature_names]
 
-    return features_df
+    missing = [col for col in CARDIO_FEATURE_COLUMNS if col not in features_df.columns]
+    for col in missing:
+        features_df[col] = np.nan
+    return features_df[CARDIO_FEATURE_COLUMNS]
+
+
+def build_cardiovascular_feature_frame(
+    edad: int,
+    genero: Optional[str],
+    imc: Optional[float] = None,
+    altura_cm: Optional[float] = None,
+    peso_kg: Optional[float] = None,
+    circunferencia_cintura: Optional[float] = None,
+    glucosa_mgdl: Optional[float] = None,
+    hdl_mgdl: Optional[float] = None,
+    trigliceridos_mgdl: Optional[float] = None,
+    ldl_mgdl: Optional[float] = None,
+    feature_names: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Build the feature frame expected by the cardiovascular pipeline."""
+
+    cardio_values = _cardiovascular_feature_values(
+        edad=edad,
+        genero=genero,
+        imc=imc,
+        altura_cm=altura_cm,
+        peso_kg=peso_kg,
+        circunferencia_cintura=circunferencia_cintura,
+        glucosa_mgdl=glucosa_mgdl,
+        hdl_mgdl=hdl_mgdl,
+        trigliceridos_mgdl=trigliceridos_mgdl,
+        ldl_mgdl=ldl_mgdl,
+    )
+
+    logger.debug(
+        "Features cardiovasculares: edad=%s sexo=%s imc=%s cintura=%s rel_cintura_altura=%s glucosa=%s hdl=%s ldl=%s trig=%s",
+        edad, genero, cardio_values["imc"], circunferencia_cintura, cardio_values["rel_cintura_altura"],
+        glucosa_mgdl, hdl_mgdl, ldl_mgdl, trigliceridos_mgdl,
+    )
+
+    features_df = pd.DataFrame([cardio_values])
+    return _order_cardiovascular_columns(features_df, feature_names)
+
+
+def build_cardiovascular_feature_matrix(
+    profiles: List[Dict[str, Any]],
+    feature_names: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Build the cardiovascular feature frame for many profiles at once.
+
+    Each profile is a dict with the keyword arguments of
+    ``build_cardiovascular_feature_frame`` (without ``feature_names``).
+    """
+    plan = get_feature_plan("cardiovascular", feature_names or CARDIO_FEATURE_COLUMNS)
+    return pd.DataFrame(plan.build_matrix(profiles), columns=plan.feature_names)
+
+
+class FeaturePlan:
+    """
+    Precompiled per-model feature layout.
+
+    Maps the values computed by the row builders onto the model's
+    ``feature_names`` order once, so each request only writes floats into a
+    preallocated float64 row: no dict, DataFrame or Series on the hot path.
+    Features the builder does not produce get ``fill_value`` (0 for diabetes,
+    like the ``reindex`` in ``build_feature_frame``; NaN for cardiovascular,
+    which imputes them inside its pipeline).
+    """
+
+    __slots__ = (
+        "model_type", "feature_names", "n_features", "_row_fn",
+        "_identity", "_source_idx", "_target_idx", "_template", "_local",
+    )
 
+    def __init__(self, model_type: str, feature_names: Sequence[str]):
+        if model_type == "cardiovascular":
+            source_columns, row_fn, fill_value = CARDIO_FEATURE_COLUMNS, _cardiovascular_feature_row, np.nan
+        else:
+            source_columns, row_fn, fill_value = DIABETES_FEATURE_COLUMNS, _diabetes_feature_row, 0.0
+
+        self.model_type = model_type
+        self.feature_names = list(feature_names)
+        self.n_features = len(self.feature_names)
+        self._row_fn = row_fn
+
+        source_positions = {name: idx for idx, name in enumerate(source_columns)}
+        pairs = [
+            (source_positions[name], target)
+            for target, name in enumerate(self.feature_names)
+            if name in source_positions
+        ]
+        self._identity = self.feature_names == list(source_columns)
+        self._source_idx = np.array([src for src, _ in pairs], dtype=np.intp)
+        self._target_idx = np.array([dst for _, dst in pairs], dtype=np.intp)
+        self._template = np.full(self.n_features, fill_value, dtype=np.float64)
+        self._local = threading.local()
+
+    def row_buffer(self) -> np.ndarray:
+        """Thread-local (1, n_features) buffer reused across calls on the same thread."""
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = np.empty((1, self.n_features), dtype=np.float64)
+            self._local.buffer = buffer
+        return buffer
+
+    def fill_row(self, out: np.ndarray, **profile: Any) -> np.ndarray:
+        """Write the features of one profile into ``out`` (1-D view of length n_features)."""
+        values = self._row_fn(**profile)
+        if self._identity:
+            out[:] = values
+        else:
+            out[:] = self._template
+            out[self._target_idx] = np.take(values, self._source_idx)
+        return out
+
+    def build_row(self, out: Optional[np.ndarray] = None, **profile: Any) -> np.ndarray:
+        """
+        Features of one profile as a (1, n_features) float64 matrix.
+
+        Without ``out`` the plan's thread-local buffer is used, so the result is
+        only valid until the next call on the same thread.
+        """
+        if out is None:
+            out = self.row_buffer()
+        self.fill_row(out[0], **profile)
+        return out
+
+    def build_matrix(self, profiles: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """Features of many profiles as a freshly allocated (n, n_features) matrix."""
+        matrix = np.empty((len(profiles), self.n_features), dtype=np.float64)
+        for row_idx, profile in enumerate(profiles):
+            try:
+                self.fill_row(matrix[row_idx], **profile)
+            except (TypeError, ValueError) as exc:
+                raise ValueError(f"Row {row_idx}: {exc}") from exc
+        return matrix
+
+
+@lru_cache(maxsize=8)
+def _cached_feature_plan(model_type: str, feature_names: Tuple[str, ...]) -> FeaturePlan:
+    return FeaturePlan(model_type, feature_names)
+
+
+def get_feature_plan(model_type: str, feature_names: Sequence[str]) -> FeaturePlan:
+    """Get the (cached) feature plan for a model type and its feature_names order."""
+    return _cached_feature_plan(model_type, tuple(feature_names))
@@ -1,13 +1,18 @@
+import hashlib
 import logging
-from functools import lru_cache
+import threading
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import joblib
 
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
 _MODEL_TYPES = {"diabetes", "cardiovascular"}
+_INFERENCE_BACKENDS = {"sklearn", "onnx"}
 
 
 def get_models_dir() -> Path:
@@ -22,17 +27,35 @@ def _normalize_model_type(model_type: str) -> str:
     return model_type_normalized
 
 
-@lru_cache(maxsize=len(_MODEL_TYPES))
+def _bundle_dir(model_type: str) -> Optional[Path]:
+    """Active versioned bundle directory for a model type, if bundles are enabled and present."""
+    if not settings.MODEL_BUNDLES_ENABLED:
+        return None
+    from .bundles import current_bundle_dir
+
+    return current_bundle_dir(model_type)
+
+
 def load_model_bundle(model_type: str = "diabetes") -> Tuple[Any, Optional[Any], List[str]]:
     """
     Load the model bundle (model, optional imputer, feature_names) for the requested type.
 
+    Returns the registry's active version: the versioned, memory-mapped bundle
+    under ``models/bundles/`` when one exists, otherwise the legacy joblib pickles.
+    Callers that make several model calls for one request should hold a single
+    ``get_active_model`` result instead, so a hot swap cannot mix versions.
+
     Args:
         model_type: Either "diabetes" or "cardiovascular".
 
     Returns:
         Tuple of (model, imputer_or_none, feature_names).
     """
+    return get_active_model(model_type).bundle
+
+
+def load_pickled_model(model_type: str = "diabetes") -> Tuple[Any, Optional[Any], List[str]]:
+    """Load (model, optional imputer, feature_names) from the legacy joblib pickles."""
 
     normalized_type = _normalize_model_type(model_type)
     models_dir = get_models_dir()
@@ -69,22 +92,7 @@ def load_model_bundle(model_type: str = "diabetes") -> Tuple[Any, Optional[Any],
         cardio_model_path = models_dir / "old_model_cardiovascular.pkl"
         logger.info("Loading cardiovascular model artifact (old version)...")
         cardio_model = joblib.load(cardio_model_path)
-
-        feature_names: List[str] = []
-        try:
-            pipeline = getattr(cardio_model, "estimator", None) or getattr(cardio_model, "base_estimator", None)
-            if pipeline is not None and hasattr(pipeline, "named_steps"):
-                preprocessor = pipeline.named_steps.get("pre")
-                if preprocessor is not None:
-                    try:
-                        feature_names_out = preprocessor.get_feature_names_out()
-                        feature_names = [str(name).split("__", 1)[-1] for name in feature_names_out]
-                    except Exception:
-                        transformers = getattr(preprocessor, "transformers_", [])
-                        if transformers:
-                            feature_names = list(transformers[0][2])
-        except Exception as exc:
-            logger.warning("Could not infer cardiovascular feature names automatically: %s", exc)
+        feature_names = _pipeline_feature_names(cardio_model)
 
         logger.info("Cardiovascular model loaded with %s derived features", len(feature_names))
         return cardio_model, None, feature_names
@@ -97,6 +105,75 @@ def load_model_bundle(model_type: str = "diabetes") -> Tuple[Any, Optional[Any],
         raise
 
 
+def _pipeline_feature_names(cardio_model) -> List[str]:
+    """Input columns of a (calibrated) cardiovascular pipeline's ``pre`` step, or [] if unknown."""
+    feature_names: List[str] = []
+    try:
+        pipeline = getattr(cardio_model, "estimator", None) or getattr(cardio_model, "base_estimator", None)
+        if pipeline is not None and hasattr(pipeline, "named_steps"):
+            preprocessor = pipeline.named_steps.get("pre")
+            if preprocessor is not None:
+                try:
+                    feature_names_out = preprocessor.get_feature_names_out()
+                    feature_names = [str(name).split("__", 1)[-1] for name in feature_names_out]
+                except Exception:
+                    transformers = getattr(preprocessor, "transformers_", [])
+                    if transformers:
+                        feature_names = list(transformers[0][2])
+    except Exception as exc:
+        logger.warning("Could not infer cardiovascular feature names automatically: %s", exc)
+    return feature_names
+
+
+def load_candidate_model(model_type: str, name: str) -> "ModelVersion":
+    """
+    Load a candidate model outside the registry (e.g. for shadow scoring).
+
+    ``name`` is either a bundle version under ``bundles/<model_type>/`` or a
+    cardiovascular pickle file in the models directory (``model_cardiovascular.pkl``).
+    """
+    from .bundles import MANIFEST_NAME, get_bundles_dir
+
+    normalized_type = _normalize_model_type(model_type)
+    bundle_dir = get_bundles_dir() / normalized_type / name
+    if (bundle_dir / MANIFEST_NAME).exists():
+        return _load_version(normalized_type, bundle_dir, fallback=False)
+
+    if normalized_type != "cardiovascular":
+        raise FileNotFoundError(f"No {normalized_type} bundle version {name}")
+
+    path = get_models_dir() / name
+    model = joblib.load(path)
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+    return ModelVersion(normalized_type, digest, model, None, _pipeline_feature_names(model), "pickle", path)
+
+
+def _artifact_paths(model_type: str) -> List[Path]:
+    models_dir = get_models_dir()
+    if model_type == "cardiovascular":
+        return [models_dir / "old_model_cardiovascular.pkl"]
+    return [
+        models_dir / "old_model_xgb_calibrated.pkl",
+        models_dir / "imputer.pkl",
+        models_dir / "feature_names.pkl",
+    ]
+
+
+def _pickle_version(model_type: str) -> str:
+    """Short content hash of the legacy pickles behind a model type."""
+    digest = hashlib.sha256()
+    for path in _artifact_paths(model_type):
+        if path.exists():
+            digest.update(path.name.encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+def get_model_version(model_type: str = "diabetes") -> str:
+    """Version of the active model (bundle manifest version, or pickle content hash)."""
+    return get_active_model(model_type).version
+
+
 def get_model(model_type: str = "diabetes"):
     """Get the loaded model (loads if necessary)."""
     model, _, _ = load_model_bundle(model_type)
@@ -114,3 +191,294 @@ def get_feature_names(model_type: str = "diabetes"):
     _, _, feature_names = load_model_bundle(model_type)
     return feature_names
 
+
+def get_inference_backend(model_type: str = "diabetes") -> str:
+    """Configured inference backend ("sklearn" or "onnx") for a model type."""
+    normalized_type = _normalize_model_type(model_type)
+    backend = (
+        settings.CARDIOVASCULAR_INFERENCE_BACKEND
+        if normalized_type == "cardiovascular"
+        else settings.DIABETES_INFERENCE_BACKEND
+    ).lower()
+    if backend not in _INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend for {normalized_type}: {backend}")
+    return backend
+
+
+def get_inference_model(model_type: str = "diabetes", version: Optional["ModelVersion"] = None):
+    """
+    ONNX Runtime model for ``model_type`` when its backend is set to "onnx".
+
+    Built once per model version (``version`` defaults to the active one).
+    Returns None when the sklearn backend is configured or the ONNX backend
+    cannot be used (missing packages, export error, failed equivalence check),
+    so callers fall back to the sklearn model's ``predict_proba``.
+    """
+    normalized_type = _normalize_model_type(model_type)
+    if get_inference_backend(normalized_type) != "onnx":
+        return None
+
+    version = version or get_active_model(normalized_type)
+    return version.artifact("onnx", lambda: _build_onnx_model(version))
+
+
+def _build_onnx_model(version: "ModelVersion"):
+    from . import onnx_backend
+
+    model_type = version.model_type
+    if not onnx_backend.onnx_available():
+        logger.warning("ONNX backend requested for %s but onnxruntime/converters are not installed; using sklearn", model_type)
+        return None
+
+    try:
+        onnx_model = onnx_backend.OnnxClassifier(
+            onnx_backend.export_model(model_type, bundle=version.bundle),
+            version.feature_names,
+            intra_op_threads=settings.ONNX_INTRA_OP_THREADS,
+        )
+    except Exception as e:
+        logger.error("ONNX export failed for %s model, using sklearn: %s", model_type, e)
+        return None
+
+    if settings.ONNX_VERIFY_ON_LOAD:
+        try:
+            report = onnx_backend.check_equivalence(
+                model_type, onnx_model=onnx_model, atol=settings.ONNX_EQUIVALENCE_ATOL, bundle=version.bundle
+            )
+        except FileNotFoundError as e:
+            logger.warning("NHANES reference data not found, skipping ONNX equivalence check: %s", e)
+        else:
+            if not report["passed"]:
+                logger.error("ONNX backend for %s failed equivalence check (%s), using sklearn", model_type, report)
+                return None
+
+    logger.info("ONNX Runtime backend enabled for %s model %s", model_type, version.version)
+    return onnx_model
+
+
+# ---------------------------------------------------------------------------
+# Model registry (hot swap)
+# ---------------------------------------------------------------------------
+
+class ModelVersion:
+    """
+    One loaded model version: the (model, imputer, feature_names) bundle plus
+    the artifacts derived from it (explainers, ONNX session), built lazily.
+
+    A version is never modified once active, so a request that grabbed it keeps
+    scoring with the same model, explainer and backend even if a swap happens.
+    """
+
+    def __init__(
+        self,
+        model_type: str,
+        version: str,
+        model: Any,
+        imputer: Optional[Any],
+        feature_names: List[str],
+        source: str,
+        path: Optional[Path] = None,
+    ):
+        self.model_type = model_type
+        self.version = version
+        self.model = model
+        self.imputer = imputer
+        self.feature_names = list(feature_names)
+        self.source = source
+        self.path = path
+        self.loaded_at = time.time()
+        self._artifacts: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def bundle(self) -> Tuple[Any, Optional[Any], List[str]]:
+        return self.model, self.imputer, self.feature_names
+
+    def artifact(self, name: str, build: Callable[[], Any]) -> Any:
+        """Build the artifact ``name`` once for this version (``build`` may return None)."""
+        with self._lock:
+            if name not in self._artifacts:
+                self._artifacts[name] = build()
+            return self._artifacts[name]
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            artifacts = {name: value is not None for name, value in self._artifacts.items()}
+        return {
+            "version": self.version,
+            "source": self.source,
+            "path": str(self.path) if self.path else None,
+            "loaded_at": self.loaded_at,
+            "features": len(self.feature_names),
+            "artifacts": artifacts,
+        }
+
+
+def _load_version(model_type: str, bundle_dir: Optional[Path], fallback: bool = True) -> ModelVersion:
+    """Load a bundle directory; with ``fallback``, use the pickles when it is missing or broken."""
+    if bundle_dir is not None:
+        from .bundles import load_bundle
+
+        try:
+            model, imputer, feature_names, manifest = load_bundle(
+                bundle_dir, verify=settings.MODEL_BUNDLE_VERIFY_CHECKSUMS
+            )
+            logger.info("Loaded %s bundle %s (%s features)", model_type, manifest["version"], len(feature_names))
+            return ModelVersion(model_type, manifest["version"], model, imputer, feature_names, "bundle", bundle_dir)
+        except Exception as e:
+            if not fallback:
+                raise
+            logger.error("Could not load %s bundle %s, falling back to pickles: %s", model_type, bundle_dir, e)
+
+    model, imputer, feature_names = load_pickled_model(model_type)
+    return ModelVersion(model_type, _pickle_version(model_type), model, imputer, feature_names, "pickle")
+
+
+class ModelRegistry:
+    """
+    Active ``ModelVersion`` per model type, replaced atomically.
+
+    The first ``get`` loads the version named by ``bundles/<type>/CURRENT``
+    (or the pickles). ``activate`` / ``refresh`` (and the watcher thread) load
+    a new version next to the active one, warm it (explainers, ONNX, a
+    synthetic prediction) and only then swap the reference. Requests already
+    holding the previous version finish on it; a version that fails to load
+    or warm is never activated.
+    """
+
+    def __init__(self, max_history: int = 20):
+        self._active: Dict[str, ModelVersion] = {}
+        self._lock = threading.Lock()
+        self._failed: Dict[str, str] = {}
+        self._history: List[Dict[str, Any]] = []
+        self._max_history = max_history
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def get(self, model_type: str = "diabetes") -> ModelVersion:
+        normalized_type = _normalize_model_type(model_type)
+        active = self._active.get(normalized_type)
+        if active is not None:
+            return active
+
+        with self._lock:
+            active = self._active.get(normalized_type)
+            if active is None:
+                active = _load_version(normalized_type, _bundle_dir(normalized_type))
+                self._active[normalized_type] = active
+        return active
+
+    def available_versions(self, model_type: str) -> List[str]:
+        """Bundle versions on disk for ``model_type``, oldest first."""
+        from .bundles import MANIFEST_NAME, get_bundles_dir
+
+        model_root = get_bundles_dir() / _normalize_model_type(model_type)
+        if not model_root.is_dir():
+            return []
+        versions = [path for path in model_root.iterdir() if (path / MANIFEST_NAME).exists()]
+        return [path.name for path in sorted(versions, key=lambda path: path.stat().st_mtime)]
+
+    def activate(self, model_type: str, version: Optional[str] = None, warm: bool = True) -> ModelVersion:
+        """
+        Load ``version`` (default: the one named by CURRENT), warm it and make it active.
+
+        Raises if the bundle is missing, fails its checksums or fails to warm up;
+        the active version is left untouched in that case.
+        """
+        from .bundles import MANIFEST_NAME, get_bundles_dir
+
+        normalized_type = _normalize_model_type(model_type)
+        bundle_dir = get_bundles_dir() / normalized_type / version if version else _bundle_dir(normalized_type)
+        if bundle_dir is None or not (bundle_dir / MANIFEST_NAME).exists():
+            raise FileNotFoundError(f"No {normalized_type} bundle version {version or 'CURRENT'}")
+
+        started = time.perf_counter()
+        candidate = _load_version(normalized_type, bundle_dir, fallback=False)
+        if warm:
+            from .predictor import warm_model_version
+
+            warm_model_version(candidate)
+
+        with self._lock:
+            previous = self._active.get(normalized_type)
+            self._active[normalized_type] = candidate
+            self._failed.pop(normalized_type, None)
+            self._history.append({
+                "model_type": normalized_type,
+                "from": previous.version if previous else None,
+                "to": candidate.version,
+                "at": time.time(),
+                "load_ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+            del self._history[:-self._max_history]
+
+        logger.info(
+            "Activated %s model %s (was %s)",
+            normalized_type, candidate.version, previous.version if previous else None,
+        )
+        return candidate
+
+    def refresh(self) -> List[str]:
+        """Activate any loaded model type whose CURRENT pointer changed; returns the swapped types."""
+        swapped = []
+        for model_type in sorted(_MODEL_TYPES):
+            active = self._active.get(model_type)
+            bundle_dir = _bundle_dir(model_type)
+            if active is None or bundle_dir is None or active.path == bundle_dir:
+                continue
+            if self._failed.get(model_type) == bundle_dir.name:
+                continue
+            try:
+                self.activate(model_type, bundle_dir.name)
+                swapped.append(model_type)
+            except Exception as e:
+                self._failed[model_type] = bundle_dir.name
+                logger.error("Could not activate %s bundle %s, keeping %s: %s", model_type, bundle_dir.name, active.version, e)
+        return swapped
+
+    def start_watcher(self, interval_seconds: float) -> None:
+        """Poll the CURRENT pointers every ``interval_seconds`` in a daemon thread."""
+        if interval_seconds <= 0 or self._watcher is not None:
+            return
+
+        def watch() -> None:
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error("Model registry refresh failed: %s", e)
+
+        self._stop.clear()
+        self._watcher = threading.Thread(target=watch, name="model-registry-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active = dict(self._active)
+            history = list(self._history)
+            failed = dict(self._failed)
+        return {
+            "active": {model_type: version.describe() for model_type, version in active.items()},
+            "available": {model_type: self.available_versions(model_type) for model_type in sorted(_MODEL_TYPES)},
+            "failed": failed,
+            "swaps": history,
+            "watching": self._watcher is not None,
+        }
+
+
+_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    return _registry
+
+
+def get_active_model(model_type: str = "diabetes") -> ModelVersion:
+    """Active model version for ``model_type`` (loads it on first use)."""
+    return _registry.get(model_type)
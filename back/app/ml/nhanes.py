@@ -0,0 +1,79 @@
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# NHANES column -> predict_risk keyword
+NHANES_COLUMN_MAP = {
+    "RIDAGEYR": "age",
+    "BMXHT": "height_cm",
+    "BMXWT": "weight_kg",
+    "BMXBMI": "bmi",
+    "BMXWAIST": "waist_cm",
+    "BPXOSY1": "systolic_bp",
+    "LAB_LBXGLU": "glucosa_mgdl",
+    "LAB_LBDHDD": "hdl_mgdl",
+    "LAB_LBXTR": "trigliceridos_mgdl",
+    "LAB_LBDLDL": "ldl_mgdl",
+}
+
+_SEX_MAP = {1: "M", 2: "F"}
+
+
+def get_nhanes_csv_path() -> Path:
+    """Default location of the cleaned NHANES 2017-2020 extract (repo root /cardio)."""
+    return (
+        Path(__file__).resolve().parents[3]
+        / "cardio" / "data" / "processed" / "nhanes_2017_2020_clean.csv"
+    )
+
+
+def load_nhanes_profiles(path: Optional[Path] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Load NHANES participants as ``predict_risk`` keyword dicts.
+
+    Rows without BMI and without height/weight cannot be scored and are skipped.
+    Missing measurements come back as None so the models impute them as usual.
+
+    Args:
+        path: CSV file; defaults to ``get_nhanes_csv_path()``.
+        limit: Optional maximum number of rows to read.
+    """
+    csv_path = Path(path) if path is not None else get_nhanes_csv_path()
+    columns = ["RIAGENDR", *NHANES_COLUMN_MAP]
+    df = pd.read_csv(csv_path, usecols=columns, nrows=limit)
+
+    profiles_df = to_profile_frame(df)
+    profiles_df = profiles_df[scorable_mask(profiles_df)]
+    profiles_df = profiles_df.astype(object).where(profiles_df.notna(), None)
+
+    profiles = profiles_df.to_dict(orient="records")
+    logger.info("Loaded %s NHANES profiles from %s", len(profiles), csv_path.name)
+    return profiles
+
+
+def to_profile_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rename NHANES columns to ``predict_risk`` keywords (RIAGENDR 1/2 -> sex "M"/"F").
+
+    Columns that are not NHANES variables are kept as they are, so frames that
+    already use the keyword names pass through unchanged.
+    """
+    profiles_df = df.rename(columns=NHANES_COLUMN_MAP)
+    if "RIAGENDR" in profiles_df.columns:
+        profiles_df["sex"] = profiles_df.pop("RIAGENDR").map(_SEX_MAP)
+    return profiles_df
+
+
+def scorable_mask(profiles_df: pd.DataFrame) -> pd.Series:
+    """Rows with an age and either a BMI or both height and weight."""
+    def column(name: str) -> pd.Series:
+        if name in profiles_df.columns:
+            return profiles_df[name].notna()
+        return pd.Series(False, index=profiles_df.index)
+
+    has_size = column("bmi") | (column("height_cm") & column("weight_kg"))
+    return has_size & column("age")
@@ -0,0 +1,300 @@
+"""
+Optional ONNX Runtime inference backend.
+
+Exports the local sklearn/XGBoost models to ONNX graphs that take the raw
+(pre-imputation) feature matrix and return ``predict_proba``-shaped output:
+
+* diabetes: SimpleImputer + XGBClassifier (skl2onnx + onnxmltools)
+* cardiovascular: per fold imputer + StandardScaler + LogisticRegression
+  decision function + sigmoid calibrator, averaged like CalibratedClassifierCV
+  (SMOTE only acts during fit)
+
+onnx, onnxruntime, skl2onnx and onnxmltools are optional dependencies; the
+sklearn backend is used when they are not installed.
+
+Usage:
+    python -m app.ml.onnx_backend check [--model diabetes|cardiovascular] [--limit N]
+    python -m app.ml.onnx_backend export OUTPUT_DIR
+"""
+
+import argparse
+import copy
+import json
+import logging
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ONNX_OPSET = 17
+ONNX_ML_OPSET = 3
+DEFAULT_EQUIVALENCE_ATOL = 1e-5
+
+_TENSOR_DTYPES = {"tensor(float)": np.float32, "tensor(double)": np.float64}
+
+
+def onnx_available() -> bool:
+    """True when onnx, onnxruntime and the converters can be imported."""
+    try:
+        import onnx  # noqa: F401
+        import onnxruntime  # noqa: F401
+        import skl2onnx  # noqa: F401
+        import onnxmltools  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class OnnxClassifier:
+    """
+    Thin ``predict_proba`` wrapper around an onnxruntime CPU session.
+
+    Inputs are raw feature matrices in ``feature_names`` order (NaN for missing
+    values); DataFrames are reordered by column name.
+    """
+
+    def __init__(self, model_proto, feature_names: List[str], intra_op_threads: int = 1):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.session = ort.InferenceSession(
+            model_proto.SerializeToString(),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.feature_names = list(feature_names)
+
+        model_input = self.session.get_inputs()[0]
+        self._input_name = model_input.name
+        self._input_dtype = _TENSOR_DTYPES[model_input.type]
+
+        output_names = [output.name for output in self.session.get_outputs()]
+        self._output_name = "probabilities" if "probabilities" in output_names else output_names[-1]
+
+    def predict_proba(self, X: Union[np.ndarray, pd.DataFrame]) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            X = X.reindex(columns=self.feature_names)
+        X = np.ascontiguousarray(X, dtype=self._input_dtype)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        proba = self.session.run([self._output_name], {self._input_name: X})[0]
+        return np.asarray(proba, dtype=np.float64)
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def export_diabetes_model(model, imputer, feature_names: List[str]):
+    """Export SimpleImputer + XGBClassifier as a single float32 ONNX graph."""
+    from onnxmltools.convert.xgboost.operator_converters.XGBoost import convert_xgboost
+    from skl2onnx import convert_sklearn, update_registered_converter
+    from skl2onnx.common.data_types import FloatTensorType
+    from skl2onnx.common.shape_calculator import calculate_linear_classifier_output_shapes
+    from sklearn.pipeline import Pipeline
+    from xgboost import XGBClassifier
+
+    update_registered_converter(
+        XGBClassifier,
+        "XGBoostXGBClassifier",
+        calculate_linear_classifier_output_shapes,
+        convert_xgboost,
+        options={"nocl": [True, False], "zipmap": [True, False, "columns"]},
+    )
+
+    if hasattr(imputer, "to_sklearn"):
+        # Bundle-loaded StatisticsImputer -> equivalent fitted SimpleImputer for skl2onnx
+        imputer = imputer.to_sklearn()
+
+    classifier = model
+    if isinstance(model, XGBClassifier):
+        # onnxmltools only understands the default f0..fN booster feature names
+        classifier = copy.deepcopy(model)
+        classifier.get_booster().feature_names = None
+
+    pipeline = Pipeline([("imputer", imputer), ("clf", classifier)])
+    return convert_sklearn(
+        pipeline,
+        name="diabetes",
+        initial_types=[("input", FloatTensorType([None, len(feature_names)]))],
+        options={id(classifier): {"zipmap": False}},
+        target_opset={"": ONNX_OPSET, "ai.onnx.ml": ONNX_ML_OPSET},
+    )
+
+
+def export_cardiovascular_model(model, feature_names: List[str]):
+    """
+    Export the calibrated cardiovascular pipeline as a float64 ONNX graph.
+
+    Per fold: impute -> folded scaler/LR decision -> sigmoid calibrator
+    ``1 / (1 + exp(a * d + b))``; the fold probabilities are averaged, which
+    is exactly ``CalibratedClassifierCV.predict_proba`` for a binary target.
+    """
+    from onnx import TensorProto, helper, numpy_helper
+
+    from .explainers import calibrated_linear_fold_parts
+
+    folds = calibrated_linear_fold_parts(model)
+
+    n_features = len(feature_names)
+    nodes = []
+    initializers = []
+    fold_outputs = []
+
+    def constant(name: str, value) -> str:
+        initializers.append(numpy_helper.from_array(np.asarray(value, dtype=np.float64), name=name))
+        return name
+
+    nodes.append(helper.make_node("IsNaN", ["input"], ["is_missing"]))
+
+    for k, fold in enumerate(folds):
+        if fold["columns"] != list(feature_names):
+            raise ValueError("Cardiovascular preprocessor must be a single transformer over all features")
+
+        # Fold the StandardScaler into the logistic regression:
+        # ((x - mean) / scale) @ coef + b == x @ (coef / scale) + (b - mean/scale @ coef)
+        weights = fold["coef"] / fold["scale"]
+        bias = float(fold["intercept"] - np.dot(fold["mean"], weights))
+
+        nodes.extend([
+            helper.make_node("Where", ["is_missing", constant(f"stats_{k}", fold["statistics"]), "input"], [f"imputed_{k}"]),
+            helper.make_node("MatMul", [f"imputed_{k}", constant(f"weights_{k}", weights.reshape(-1, 1))], [f"dot_{k}"]),
+            helper.make_node("Add", [f"dot_{k}", constant(f"bias_{k}", [bias])], [f"decision_{k}"]),
+            # sklearn sigmoid calibration: expit(-(a * d + b))
+            helper.make_node("Mul", [f"decision_{k}", constant(f"neg_a_{k}", [-fold["calibrator_a"]])], [f"scaled_{k}"]),
+            helper.make_node("Add", [f"scaled_{k}", constant(f"neg_b_{k}", [-fold["calibrator_b"]])], [f"logit_{k}"]),
+            helper.make_node("Sigmoid", [f"logit_{k}"], [f"proba_{k}"]),
+        ])
+        fold_outputs.append(f"proba_{k}")
+
+    nodes.extend([
+        helper.make_node("Sum", fold_outputs, ["positive_sum"]),
+        helper.make_node("Div", ["positive_sum", constant("n_folds", [float(len(folds))])], ["positive"]),
+        helper.make_node("Sub", [constant("one", [1.0]), "positive"], ["negative"]),
+        helper.make_node("Concat", ["negative", "positive"], ["probabilities"], axis=1),
+    ])
+
+    graph = helper.make_graph(
+        nodes,
+        "cardiovascular",
+        inputs=[helper.make_tensor_value_info("input", TensorProto.DOUBLE, [None, n_features])],
+        outputs=[helper.make_tensor_value_info("probabilities", TensorProto.DOUBLE, [None, 2])],
+        initializer=initializers,
+    )
+    onnx_model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", ONNX_OPSET)])
+    onnx_model.ir_version = 8
+    return onnx_model
+
+
+def export_model(model_type: str, bundle: Optional[Tuple[Any, Any, List[str]]] = None):
+    """
+    Export a sklearn model of ``model_type`` to an ONNX ModelProto.
+
+    ``bundle`` is a (model, imputer, feature_names) tuple; defaults to the active model.
+    """
+    from .model_loader import load_model_bundle
+
+    model, imputer, feature_names = bundle or load_model_bundle(model_type)
+    if model_type == "cardiovascular":
+        return export_cardiovascular_model(model, feature_names)
+    if imputer is None:
+        raise RuntimeError("Imputer is required for diabetes model but was not loaded.")
+    return export_diabetes_model(model, imputer, feature_names)
+
+
+# ---------------------------------------------------------------------------
+# Equivalence check
+# ---------------------------------------------------------------------------
+
+def check_equivalence(
+    model_type: str,
+    onnx_model: Optional[OnnxClassifier] = None,
+    csv_path: Optional[Path] = None,
+    limit: Optional[int] = None,
+    atol: float = DEFAULT_EQUIVALENCE_ATOL,
+    bundle: Optional[Tuple[Any, Any, List[str]]] = None,
+) -> Dict[str, Any]:
+    """
+    Compare ONNX and sklearn ``predict_proba`` on the NHANES reference rows.
+
+    ``bundle`` is the (model, imputer, feature_names) reference; defaults to the active model.
+
+    Returns:
+        Report dict with ``rows``, ``max_abs_diff``, ``mean_abs_diff``, ``atol`` and ``passed``.
+    """
+    from .model_loader import load_model_bundle
+    from .nhanes import load_nhanes_profiles
+    from .predictor import _impute, build_profile_matrix
+
+    model, imputer, feature_names = bundle or load_model_bundle(model_type)
+    if onnx_model is None:
+        onnx_model = OnnxClassifier(export_model(model_type, (model, imputer, feature_names)), feature_names)
+
+    profiles = load_nhanes_profiles(csv_path, limit=limit)
+    plan, X = build_profile_matrix(profiles, model_type, feature_names)
+
+    if model_type == "cardiovascular":
+        expected = model.predict_proba(pd.DataFrame(X, columns=plan.feature_names))[:, 1]
+    else:
+        expected = model.predict_proba(_impute(imputer, X, plan.feature_names))[:, 1]
+    actual = onnx_model.predict_proba(X)[:, 1]
+
+    diff = np.abs(actual - expected)
+    max_diff = float(diff.max()) if len(diff) else 0.0
+    report = {
+        "model_type": model_type,
+        "rows": int(len(diff)),
+        "max_abs_diff": max_diff,
+        "mean_abs_diff": float(diff.mean()) if len(diff) else 0.0,
+        "atol": atol,
+        "passed": bool(len(diff)) and not math.isnan(max_diff) and max_diff <= atol,
+    }
+    logger.info(
+        "ONNX equivalence (%s): %s rows, max |diff|=%.2e -> %s",
+        model_type, report["rows"], max_diff, "OK" if report["passed"] else "FAILED",
+    )
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export / verify the ONNX inference backend")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    check_parser = subparsers.add_parser("check", help="Compare ONNX vs sklearn on NHANES rows")
+    check_parser.add_argument("--model", choices=["diabetes", "cardiovascular"], action="append")
+    check_parser.add_argument("--csv", type=Path, default=None)
+    check_parser.add_argument("--limit", type=int, default=None)
+    check_parser.add_argument("--atol", type=float, default=DEFAULT_EQUIVALENCE_ATOL)
+
+    export_parser = subparsers.add_parser("export", help="Write <model_type>.onnx files")
+    export_parser.add_argument("output_dir", type=Path)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "export":
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        for model_type in ("diabetes", "cardiovascular"):
+            path = args.output_dir / f"{model_type}.onnx"
+            path.write_bytes(export_model(model_type).SerializeToString())
+            print(f"wrote {path}")
+        return 0
+
+    reports = [
+        check_equivalence(model_type, csv_path=args.csv, limit=args.limit, atol=args.atol)
+        for model_type in (args.model or ["diabetes", "cardiovascular"])
+    ]
+    print(json.dumps(reports, indent=2))
+    return 0 if all(report["passed"] for report in reports) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,14 +1,29 @@
+import itertools
 import logging
+import math
+import random
+import threading
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Optional
-import shap
+from typing import Dict, List, Any, Optional, Sequence, Tuple
 
-from .model_loader import load_model_bundle
+from app.core.config import settings
+from app.utils.metrics import StageMetrics
+
+from .explainers import (
+    get_contribution_explainer,
+    get_linear_explanation_plan,
+    get_reference_importance,
+    get_reference_store,
+    top_k_indices,
+)
+from .model_loader import ModelVersion, get_active_model, get_inference_model
 from .feature_engineering import (
-    build_cardiovascular_feature_frame,
-    build_feature_frame,
+    CARDIO_FEATURE_COLUMNS,
+    DIABETES_FEATURE_COLUMNS,
+    FeaturePlan,
     get_feature_description,
+    get_feature_plan,
 )
 
 logger = logging.getLogger(__name__)
@@ -16,31 +31,117 @@ logger = logging.getLogger(__name__)
 REFERRAL_THRESHOLD = 0.70
 TOP_DRIVERS_COUNT = 5
 
-_explainers: Dict[str, Optional[shap.TreeExplainer]] = {}
+# Exact tree explanations allowed at once; beyond that, reference-store drivers are served
+_exact_explanation_slots = threading.BoundedSemaphore(max(1, settings.EXPLAINER_MAX_CONCURRENCY))
+
+# Synthetic profile used to warm up the models at startup and to check a new
+# model version before it is activated
+WARMUP_PROFILE = {
+    "age": 45,
+    "sex": "M",
+    "height_cm": 175,
+    "weight_kg": 80,
+    "waist_cm": 90,
+    "sleep_hours": 7,
+    "smokes_cig_day": 0,
+    "days_mvpa_week": 3,
+    "glucosa_mgdl": 95,
+    "hdl_mgdl": 50,
+    "trigliceridos_mgdl": 120,
+    "ldl_mgdl": 110,
+}
+
+
+def _build_shap_explainer(version: ModelVersion):
+    try:
+        import shap
+
+        # Extract base estimator from CalibratedClassifierCV if needed
+        base_model = version.model
+        if hasattr(base_model, 'calibrated_classifiers_') and len(base_model.calibrated_classifiers_) > 0:
+            base_model = base_model.calibrated_classifiers_[0].estimator
+            logger.info("Extracted base estimator from CalibratedClassifierCV for SHAP")
+
+        explainer = shap.TreeExplainer(base_model)
+        logger.info("SHAP explainer initialized for %s", version.model_type)
+        return explainer
+    except Exception as e:
+        logger.warning("Failed to initialize SHAP explainer for %s: %s", version.model_type, e)
+        return None
+
 
+def get_explainer(model_type: str = "diabetes", version: Optional[ModelVersion] = None):
+    """
+    Get or create SHAP explainer for a specific model type.
 
-def get_explainer(model_type: str = "diabetes"):
-    """Get or create SHAP explainer for a specific model type."""
+    Only used when the native XGBoost contributions are unavailable, so shap
+    is imported lazily here. Built once per model version.
+    """
     if model_type != "diabetes":
         return None
 
-    if model_type not in _explainers:
-        try:
-            model, _, _ = load_model_bundle(model_type)
-            
-            # Extract base estimator from CalibratedClassifierCV if needed
-            base_model = model
-            if hasattr(model, 'calibrated_classifiers_') and len(model.calibrated_classifiers_) > 0:
-                base_model = model.calibrated_classifiers_[0].estimator
-                logger.info("Extracted base estimator from CalibratedClassifierCV for SHAP")
-            
-            _explainers[model_type] = shap.TreeExplainer(base_model)
-            logger.info("SHAP explainer initialized for %s", model_type)
-        except Exception as e:
-            logger.warning("Failed to initialize SHAP explainer for %s: %s", model_type, e)
-            _explainers[model_type] = None
-
-    return _explainers[model_type]
+    version = version or get_active_model(model_type)
+    return version.artifact("shap_explainer", lambda: _build_shap_explainer(version))
+
+
+def warm_model_version(version: ModelVersion) -> None:
+    """
+    Build the explainers / inference backend of a model version and score a
+    synthetic profile with it, so its first real request pays no load cost.
+
+    Raises if the version cannot produce a prediction.
+    """
+    if version.model_type == "cardiovascular":
+        get_linear_explanation_plan(version.model_type, version)
+    else:
+        get_contribution_explainer(version.model_type, version)
+        get_reference_store(version.model_type, version)
+    get_inference_model(version.model_type, version)
+    predict_risk_batch_for_version(version, [WARMUP_PROFILE])
+
+
+# Per-stage latency histograms (features, impute, predict_proba, explain, interpret, total)
+_stage_metrics = StageMetrics()
+
+
+def prediction_stage_stats() -> Dict[str, Any]:
+    """Per-model, per-mode (single / batch / what_if) stage latency histograms of this process."""
+    return _stage_metrics.snapshot()
+
+
+def forward_prediction_stages() -> None:
+    """Keep this process's stage timings for ``take_prediction_stages`` (inference pool workers)."""
+    _stage_metrics.start_forwarding()
+
+
+def take_prediction_stages() -> List[Tuple[str, str, str, float]]:
+    """Stage timings recorded since the previous call, as (model, mode, stage, ms)."""
+    return _stage_metrics.drain_forwarded()
+
+
+def record_prediction_stages(observations: Sequence[Tuple[str, str, str, float]]) -> None:
+    """Adds stage timings measured in another process to this process's histograms."""
+    for model, mode, stage, value_ms in observations:
+        _stage_metrics.observe(model, mode, stage, value_ms)
+
+
+def _log_sampled() -> bool:
+    """True for the sampled fraction of calls that get a verbose DEBUG log line."""
+    rate = settings.PREDICT_LOG_SAMPLE_RATE
+    return rate > 0 and logger.isEnabledFor(logging.DEBUG) and (rate >= 1 or random.random() < rate)
+
+
+class _StagesRepr:
+    """Formats stage timings only if the log record is actually emitted."""
+
+    __slots__ = ("stages",)
+
+    def __init__(self, stages: Dict[str, float]):
+        self.stages = stages
+
+    def __str__(self) -> str:
+        return ", ".join(f"{stage}={value:.3f}" for stage, value in self.stages.items())
+
 
 def predict_risk(
     age: int,
@@ -58,41 +159,27 @@ def predict_risk(
     glucosa_mgdl: Optional[float] = None,
     hdl_mgdl: Optional[float] = None,
     trigliceridos_mgdl: Optional[float] = None,
-    ldl_mgdl: Optional[float] = None
+    ldl_mgdl: Optional[float] = None,
+    explain: bool = True,
 ) -> Dict[str, Any]:
-    """Predict cardiometabolic risk using the requested local model."""
+    """
+    Predict cardiometabolic risk using the requested local model.
+
+    With ``explain=False`` the driver explanation is skipped and ``drivers``
+    comes back empty (score-only callers such as bulk scoring and benchmarks).
+    """
 
     normalized_type = (model_type or "diabetes").lower()
+    timer = _stage_metrics.timer(normalized_type, "single")
 
     try:
-        logger.info("=" * 80)
-        logger.info("🔬 USING LOCAL ML MODEL (%s)", normalized_type.upper())
-        logger.info(
-            "   Input: age=%s, sex=%s, bmi=%s, height_cm=%s, weight_kg=%s, waist_cm=%s, sleep_hours=%s, cig_day=%s, mvpa_days=%s, sys_bp=%s, chol=%s",
-            age,
-            sex,
-            bmi,
-            height_cm,
-            weight_kg,
-            waist_cm,
-            sleep_hours,
-            smokes_cig_day,
-            days_mvpa_week,
-            systolic_bp,
-            total_cholesterol,
-        )
-        logger.info("=" * 80)
-
-        model, imputer, feature_names = load_model_bundle(normalized_type)
-        logger.info("✓ Model loaded: %s", type(model).__name__)
+        version = get_active_model(normalized_type)
+        model, imputer, feature_names = version.bundle
 
         if normalized_type == "cardiovascular":
-            logger.info("🔍 Construyendo features cardiovasculares:")
-            logger.info(f"   edad={age}, genero={sex}, imc={bmi}, altura={height_cm}, peso={weight_kg}")
-            logger.info(f"   cintura={waist_cm}, glucosa={glucosa_mgdl}, hdl={hdl_mgdl}, ldl={ldl_mgdl}, trig={trigliceridos_mgdl}")
-            logger.info(f"   NOTA: El modelo cardiovascular NO usa presión sistólica ni colesterol total directamente")
-            
-            features_df = build_cardiovascular_feature_frame(
+            # The cardiovascular model does not use systolic_bp / total_cholesterol
+            plan = get_feature_plan("cardiovascular", feature_names or CARDIO_FEATURE_COLUMNS)
+            X = plan.build_row(
                 edad=age,
                 genero=sex,
                 imc=bmi,
@@ -103,26 +190,33 @@ def predict_risk(
                 hdl_mgdl=hdl_mgdl,
                 trigliceridos_mgdl=trigliceridos_mgdl,
                 ldl_mgdl=ldl_mgdl,
-                feature_names=feature_names,
             )
-            
-            logger.info(f"🔍 Features construidas - IMC: {features_df['imc'].iloc[0] if 'imc' in features_df.columns else 'N/A'}, "
-                       f"rel_cintura_altura: {features_df['rel_cintura_altura'].iloc[0] if 'rel_cintura_altura' in features_df.columns else 'N/A'}")
+            # The pipeline's ColumnTransformer selects columns by name
+            features_df = pd.DataFrame(X, columns=plan.feature_names, copy=False)
+            timer.lap("features")
 
             # El modelo cardiovascular es un pipeline que maneja preprocesamiento internamente
-            risk_score = float(model.predict_proba(features_df)[0, 1])
-            
+            risk_score = float(_positive_proba(version, X, features_df)[0])
+            timer.lap("predict_proba")
+
             # Validar score extremo que podría indicar problema con los datos
             if risk_score < 0.01:
-                logger.warning(f"⚠️ Score extremadamente bajo ({risk_score:.4f}) detectado. "
-                             f"Verificar si los valores de entrada son correctos o si el modelo está fuera de rango.")
-                logger.warning(f"   Valores críticos: IMC={bmi}, edad={age}, rel_cintura_altura={features_df['rel_cintura_altura'].iloc[0] if 'rel_cintura_altura' in features_df.columns else 'N/A'}")
-            
-            drivers = _get_cardiovascular_drivers(model, features_df, feature_names)
-            
-            logger.info(f"🔍 Score predicho: {risk_score:.4f}")
+                logger.warning(
+                    "⚠️ Score extremadamente bajo (%.4f) detectado; verificar entradas: IMC=%s, edad=%s, cintura=%s, altura=%s",
+                    risk_score, bmi, age, waist_cm, height_cm,
+                )
+
+            if explain:
+                drivers, drivers_approximate = _get_cardiovascular_drivers(model, X, plan.feature_names, version)
+                timer.lap("explain")
+            else:
+                drivers, drivers_approximate = [], False
         else:
-            X = build_feature_frame(
+            if imputer is None:
+                raise RuntimeError("Imputer is required for diabetes model but was not loaded.")
+
+            plan = get_feature_plan("diabetes", feature_names or DIABETES_FEATURE_COLUMNS)
+            X = plan.build_row(
                 age=age,
                 sex=sex,
                 height_cm=height_cm,
@@ -134,36 +228,43 @@ def predict_risk(
                 bmi=bmi,
                 systolic_bp=systolic_bp,
                 total_cholesterol=total_cholesterol,
-                feature_names=feature_names,
             )
+            timer.lap("features")
 
-            if imputer is None:
-                raise RuntimeError("Imputer is required for diabetes model but was not loaded.")
+            X_imp = _impute(imputer, X, plan.feature_names)
+            valid_feature_names = _valid_feature_names(imputer, plan.feature_names)
+            timer.lap("impute")
 
-            X_imp = imputer.transform(X)
-            
-            # Get valid feature names after imputation (imputer drops features with no valid data)
-            if hasattr(imputer, 'statistics_'):
-                valid_mask = ~np.isnan(imputer.statistics_)
-                valid_feature_names = [name for name, valid in zip(feature_names, valid_mask) if valid]
+            risk_score = float(_positive_proba(version, X, X_imp)[0])
+            timer.lap("predict_proba")
+            if explain:
+                drivers, drivers_approximate = _get_diabetes_drivers(model, X_imp, valid_feature_names, version)
+                timer.lap("explain")
             else:
-                valid_feature_names = feature_names
-            
-            features_df = pd.DataFrame(X_imp, columns=valid_feature_names)
-            risk_score = float(model.predict_proba(X_imp)[0, 1])
-            drivers = _get_diabetes_drivers(model, features_df, valid_feature_names)
+                drivers, drivers_approximate = [], False
 
         risk_level, recommendation = _interpret_risk(risk_score, model_type=normalized_type)
-
-        logger.info("✓ Prediction complete: score=%.3f, level=%s", risk_score, risk_level)
-        logger.info("=" * 80)
+        timer.lap("interpret")
+        stages = timer.finish()
+
+        if _log_sampled():
+            logger.debug(
+                "predict_risk %s %s | age=%s sex=%s bmi=%s height_cm=%s weight_kg=%s waist_cm=%s sleep_hours=%s "
+                "cig_day=%s mvpa_days=%s sys_bp=%s chol=%s glucosa=%s hdl=%s ldl=%s trig=%s | "
+                "score=%.4f level=%s approximate=%s | stages_ms=%s",
+                normalized_type, version.version, age, sex, bmi, height_cm, weight_kg, waist_cm, sleep_hours,
+                smokes_cig_day, days_mvpa_week, systolic_bp, total_cholesterol, glucosa_mgdl, hdl_mgdl,
+                ldl_mgdl, trigliceridos_mgdl, risk_score, risk_level, drivers_approximate, _StagesRepr(stages),
+            )
 
         return {
             "score": risk_score,
             "risk_level": risk_level,
             "drivers": drivers,
+            "drivers_approximate": drivers_approximate,
             "recommendation": recommendation,
             "model_used": normalized_type,
+            "model_version": version.version,
         }
 
     except Exception as exc:
@@ -171,6 +272,296 @@ def predict_risk(
         raise
 
 
+_DIABETES_FIELDS = (
+    "age",
+    "sex",
+    "height_cm",
+    "weight_kg",
+    "waist_cm",
+    "sleep_hours",
+    "smokes_cig_day",
+    "days_mvpa_week",
+    "bmi",
+    "systolic_bp",
+    "total_cholesterol",
+)
+
+
+def _cardiovascular_kwargs(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Map ``predict_risk`` keyword names onto the cardiovascular feature builder."""
+    return {
+        "edad": profile.get("age"),
+        "genero": profile.get("sex"),
+        "imc": profile.get("bmi"),
+        "altura_cm": profile.get("height_cm"),
+        "peso_kg": profile.get("weight_kg"),
+        "circunferencia_cintura": profile.get("waist_cm"),
+        "glucosa_mgdl": profile.get("glucosa_mgdl"),
+        "hdl_mgdl": profile.get("hdl_mgdl"),
+        "trigliceridos_mgdl": profile.get("trigliceridos_mgdl"),
+        "ldl_mgdl": profile.get("ldl_mgdl"),
+    }
+
+
+def _valid_feature_names(imputer, feature_names: List[str]) -> List[str]:
+    """Feature names that survive imputation (imputer drops features with no valid data)."""
+    if hasattr(imputer, 'statistics_'):
+        valid_mask = ~np.isnan(imputer.statistics_)
+        return [name for name, valid in zip(feature_names, valid_mask) if valid]
+    return feature_names
+
+
+def _impute(imputer, X: np.ndarray, feature_names: List[str]) -> np.ndarray:
+    """
+    Impute a raw feature matrix.
+
+    A fitted median/mean SimpleImputer (or a bundle StatisticsImputer) is just
+    "replace NaN with statistics_", so that case is done directly in numpy;
+    anything else goes through the imputer with the column names it was fitted on.
+    """
+    statistics = getattr(imputer, "statistics_", None)
+    missing_marker = getattr(imputer, "missing_values", None)
+    if (
+        statistics is not None
+        and type(imputer).__name__ in ("SimpleImputer", "StatisticsImputer")
+        and not getattr(imputer, "add_indicator", False)
+        and isinstance(missing_marker, float) and math.isnan(missing_marker)
+        and statistics.dtype.kind == "f" and not np.isnan(statistics).any()
+    ):
+        return np.where(np.isnan(X), statistics, X)
+    return imputer.transform(pd.DataFrame(X, columns=feature_names))
+
+
+def build_profile_matrix(
+    profiles: List[Dict[str, Any]],
+    model_type: str,
+    feature_names: Optional[List[str]] = None,
+) -> Tuple[FeaturePlan, np.ndarray]:
+    """
+    Raw (pre-imputation) feature matrix for ``predict_risk``-style profile dicts.
+
+    Returns:
+        Tuple of (feature plan, float64 matrix in ``plan.feature_names`` order).
+    """
+    if model_type == "cardiovascular":
+        plan = get_feature_plan("cardiovascular", feature_names or CARDIO_FEATURE_COLUMNS)
+        return plan, plan.build_matrix([_cardiovascular_kwargs(profile) for profile in profiles])
+
+    plan = get_feature_plan("diabetes", feature_names or DIABETES_FEATURE_COLUMNS)
+    return plan, plan.build_matrix(
+        [{field: profile.get(field) for field in _DIABETES_FIELDS} for profile in profiles]
+    )
+
+
+def _positive_proba(version: ModelVersion, X_raw: np.ndarray, X_model) -> np.ndarray:
+    """
+    Positive-class probabilities of a model version from the configured inference backend.
+
+    ONNX graphs embed the imputer, so they take the raw feature matrix; the
+    sklearn models take their usual input (imputed matrix / named DataFrame).
+    """
+    onnx_model = get_inference_model(version.model_type, version)
+    if onnx_model is not None:
+        return onnx_model.predict_proba(X_raw)[:, 1]
+    return version.model.predict_proba(X_model)[:, 1]
+
+
+def predict_risk_batch(
+    profiles: List[Dict[str, Any]],
+    model_type: str = "diabetes",
+    explain: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Predict risk for many profiles with a single model pass.
+
+    Each profile is a dict using the keyword names of ``predict_risk``
+    (``age``, ``sex``, ``bmi``...). The whole batch shares one feature matrix,
+    one imputation, one ``predict_proba`` call and one explanation pass.
+
+    Returns:
+        One result dict per profile, in input order, with the same keys as
+        ``predict_risk``. ``explain=False`` skips the drivers as in ``predict_risk``.
+    """
+    normalized_type = (model_type or "diabetes").lower()
+    if not profiles:
+        return []
+
+    try:
+        version = get_active_model(normalized_type)
+        results = predict_risk_batch_for_version(version, profiles, explain=explain)
+        logger.debug("Batch prediction: %s rows with %s model %s", len(results), normalized_type, version.version)
+        return results
+
+    except Exception as exc:
+        logger.error("Error in batch prediction: %s", exc, exc_info=True)
+        raise
+
+
+def predict_risk_batch_for_version(
+    version: ModelVersion,
+    profiles: List[Dict[str, Any]],
+    explain: bool = True,
+) -> List[Dict[str, Any]]:
+    """``predict_risk_batch`` against one specific model version (active, warming or candidate)."""
+    model_type = version.model_type
+    model, imputer, feature_names = version.bundle
+    timer = _stage_metrics.timer(model_type, "batch")
+    plan, X = build_profile_matrix(profiles, model_type, feature_names)
+
+    if model_type == "cardiovascular":
+        features_df = pd.DataFrame(X, columns=plan.feature_names, copy=False)
+        timer.lap("features")
+        scores = _positive_proba(version, X, features_df)
+        timer.lap("predict_proba")
+    else:
+        if imputer is None:
+            raise RuntimeError("Imputer is required for diabetes model but was not loaded.")
+        timer.lap("features")
+
+        X_imp = _impute(imputer, X, plan.feature_names)
+        valid_feature_names = _valid_feature_names(imputer, plan.feature_names)
+        timer.lap("impute")
+
+        scores = _positive_proba(version, X, X_imp)
+        timer.lap("predict_proba")
+
+    if not explain:
+        drivers_per_row, drivers_approximate = [[] for _ in range(len(scores))], False
+    elif model_type == "cardiovascular":
+        drivers_per_row, drivers_approximate = _get_cardiovascular_drivers_batch(model, X, plan.feature_names, version)
+        timer.lap("explain")
+    else:
+        drivers_per_row, drivers_approximate = _get_diabetes_drivers_batch(model, X_imp, valid_feature_names, version)
+        timer.lap("explain")
+
+    results: List[Dict[str, Any]] = []
+    for score, drivers in zip(scores, drivers_per_row):
+        risk_score = float(score)
+        risk_level, recommendation = _interpret_risk(risk_score, model_type=model_type)
+        results.append(
+            {
+                "score": risk_score,
+                "risk_level": risk_level,
+                "drivers": drivers,
+                "drivers_approximate": drivers_approximate,
+                "recommendation": recommendation,
+                "model_used": model_type,
+                "model_version": version.version,
+            }
+        )
+    timer.lap("interpret")
+    timer.finish()
+    return results
+
+
+# Modifiable inputs that a what-if grid may vary (predict_risk keyword names)
+WHAT_IF_FIELDS = ("weight_kg", "waist_cm", "sleep_hours", "smokes_cig_day", "days_mvpa_week")
+
+
+def _with_weight(profile: Dict[str, Any], weight_kg: float, base: Dict[str, Any]) -> Dict[str, Any]:
+    """Profile with a new weight and the BMI that goes with it."""
+    variant = dict(profile, weight_kg=weight_kg)
+    height_cm = base.get("height_cm")
+    if height_cm:
+        variant["bmi"] = weight_kg / ((height_cm / 100) ** 2)
+    elif base.get("bmi") is not None and base.get("weight_kg"):
+        variant["bmi"] = base["bmi"] * weight_kg / base["weight_kg"]
+    else:
+        raise ValueError("Varying weight_kg needs height_cm, or bmi together with weight_kg")
+    return variant
+
+
+def _variant(base: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    variant = dict(base, **{field: value for field, value in changes.items() if field != "weight_kg"})
+    if "weight_kg" in changes:
+        variant = _with_weight(variant, changes["weight_kg"], base)
+    return variant
+
+
+def simulate_risk_grid(
+    profile: Dict[str, Any],
+    grid: Dict[str, Sequence[Any]],
+    model_type: str = "diabetes",
+    max_variants: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    What-if risk surface over modifiable inputs for one profile.
+
+    ``grid`` maps fields of ``WHAT_IF_FIELDS`` to the values to try. The base
+    profile, every combination of the grid (cartesian product, in ``grid``
+    order) and every one-at-a-time change are scored with a single feature
+    matrix and a single ``predict_proba`` call; no drivers are computed.
+    When the weight changes, the BMI is recomputed from the height (or scaled
+    from the base BMI).
+
+    Returns:
+        Dict with ``baseline`` (score, risk_level), ``axes``, ``scores`` and
+        ``risk_levels`` (nested lists shaped like the axes), ``marginal``
+        (per field: value -> score with the other inputs at baseline) and
+        ``best`` (lowest-risk combination).
+    """
+    normalized_type = (model_type or "diabetes").lower()
+    unknown = [field for field in grid if field not in WHAT_IF_FIELDS]
+    if unknown:
+        raise ValueError(f"Not modifiable in a what-if grid: {unknown}")
+
+    axes = {field: list(values) for field, values in grid.items() if len(values)}
+    shape = tuple(len(values) for values in axes.values())
+    n_variants = int(np.prod(shape)) if axes else 0
+    if max_variants is not None and n_variants > max_variants:
+        raise ValueError(f"{n_variants} variants exceed the maximum of {max_variants}")
+
+    combinations = [dict(zip(axes, values)) for values in itertools.product(*axes.values())] if axes else []
+    marginal_changes = [(field, value) for field, values in axes.items() for value in values]
+    profiles = (
+        [dict(profile)]
+        + [_variant(profile, changes) for changes in combinations]
+        + [_variant(profile, {field: value}) for field, value in marginal_changes]
+    )
+
+    version = get_active_model(normalized_type)
+    model, imputer, feature_names = version.bundle
+    timer = _stage_metrics.timer(normalized_type, "what_if")
+    plan, X = build_profile_matrix(profiles, normalized_type, feature_names)
+    timer.lap("features")
+    if normalized_type == "cardiovascular":
+        X_model = pd.DataFrame(X, columns=plan.feature_names, copy=False)
+    else:
+        if imputer is None:
+            raise RuntimeError("Imputer is required for diabetes model but was not loaded.")
+        X_model = _impute(imputer, X, plan.feature_names)
+        timer.lap("impute")
+    scores = _positive_proba(version, X, X_model)
+    timer.lap("predict_proba")
+
+    levels = [_interpret_risk(float(score), model_type=normalized_type)[0] for score in scores]
+    timer.lap("interpret")
+    timer.finish()
+    grid_scores = scores[1:1 + n_variants]
+    grid_levels = levels[1:1 + n_variants]
+
+    marginal: Dict[str, List[Dict[str, Any]]] = {field: [] for field in axes}
+    for (field, value), score, level in zip(marginal_changes, scores[1 + n_variants:], levels[1 + n_variants:]):
+        marginal[field].append({"value": value, "score": float(score), "risk_level": level})
+
+    best = None
+    if n_variants:
+        best_idx = int(np.argmin(grid_scores))
+        best = {"values": combinations[best_idx], "score": float(grid_scores[best_idx]), "risk_level": grid_levels[best_idx]}
+
+    return {
+        "model_used": normalized_type,
+        "model_version": version.version,
+        "baseline": {"score": float(scores[0]), "risk_level": levels[0]},
+        "axes": axes,
+        "scores": np.asarray(grid_scores, dtype=np.float64).reshape(shape).tolist() if axes else [],
+        "risk_levels": np.asarray(grid_levels, dtype=object).reshape(shape).tolist() if axes else [],
+        "marginal": marginal,
+        "best": best,
+        "variants": n_variants,
+    }
+
+
 def _interpret_risk(score: float, model_type: str = "diabetes") -> tuple[str, str]:
     """
     Returns (risk_level, recommendation) where risk_level is in English for DB storage.
@@ -198,43 +589,124 @@ def _interpret_risk(score: float, model_type: str = "diabetes") -> tuple[str, st
         return "high", recommendation
 
 
-def _get_diabetes_drivers(model, features_df: pd.DataFrame, feature_names: List[str]) -> List[Dict[str, Any]]:
-    drivers: List[Dict[str, Any]] = []
-    feature_index_map = {name: idx for idx, name in enumerate(feature_names)}
+def _build_driver(feature: str, value: Any, contribution: float, impact: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "feature": feature,
+        "description": get_feature_description(feature),
+        "value": value,
+        "shap_value": float(contribution),
+        "impact": impact or ("aumenta" if contribution > 0 else "reduce"),
+    }
+
+
+def _optional_float(value: Any) -> Optional[float]:
+    return float(value) if not pd.isna(value) else None
+
+
+def _top_driver_indices(contributions: np.ndarray) -> np.ndarray:
+    """Column indices of the largest absolute contributions per row, strongest first."""
+    return top_k_indices(contributions, TOP_DRIVERS_COUNT)
 
-    explainer = get_explainer("diabetes")
+
+def _get_diabetes_drivers(
+    model, values: np.ndarray, feature_names: List[str], version: Optional[ModelVersion] = None
+) -> Tuple[List[Dict[str, Any]], bool]:
+    drivers_per_row, approximate = _get_diabetes_drivers_batch(model, values, feature_names, version)
+    return drivers_per_row[0], approximate
+
+
+def _exact_diabetes_contributions(
+    values: np.ndarray, feature_names: List[str], version: Optional[ModelVersion] = None
+) -> Optional[np.ndarray]:
+    """
+    Exact per-feature contributions for an imputed diabetes matrix.
+
+    Uses the booster's native ``pred_contribs`` averaged over every calibrated
+    fold; falls back to shap.TreeExplainer, then to None.
+    """
+    explainer = get_contribution_explainer("diabetes", version)
     if explainer is not None:
         try:
-            shap_values = explainer.shap_values(features_df)
+            return explainer.contributions(values, feature_names)
+        except Exception as exc:
+            logger.warning("Native contribution calculation failed for diabetes model: %s", exc)
+
+    shap_explainer = get_explainer("diabetes", version)
+    if shap_explainer is not None:
+        try:
+            shap_values = shap_explainer.shap_values(values)
 
             if isinstance(shap_values, list):
                 shap_values = shap_values[1] if len(shap_values) > 1 else shap_values[0]
 
-            row_shap = shap_values[0]
-            shap_importance = [
-                (feat, abs(row_shap[idx])) for feat, idx in feature_index_map.items()
-            ]
-            shap_importance.sort(key=lambda x: x[1], reverse=True)
-
-            for feature, _ in shap_importance[:TOP_DRIVERS_COUNT]:
-                idx = feature_index_map[feature]
-                shap_val = float(row_shap[idx])
-                raw_value = float(features_df.iloc[0, idx])
-                drivers.append(
-                    {
-                        "feature": feature,
-                        "description": get_feature_description(feature),
-                        "value": raw_value,
-                        "shap_value": shap_val,
-                        "impact": "aumenta" if shap_val > 0 else "reduce",
-                    }
-                )
+            return np.asarray(shap_values)
         except Exception as exc:
             logger.warning("SHAP calculation failed for diabetes model: %s", exc)
-            drivers.clear()
 
-    if drivers:
-        return drivers
+    return None
+
+
+def _reference_contributions(
+    values: np.ndarray, feature_names: List[str], version: Optional[ModelVersion] = None
+) -> Optional[np.ndarray]:
+    store = get_reference_store("diabetes", version)
+    if store is None:
+        return None
+    try:
+        return store.contributions(values, feature_names)
+    except Exception as exc:
+        logger.warning("Reference driver lookup failed for diabetes model: %s", exc)
+        return None
+
+
+def _diabetes_contributions(
+    values: np.ndarray, feature_names: List[str], version: Optional[ModelVersion] = None
+) -> Tuple[Optional[np.ndarray], bool]:
+    """
+    Per-feature contributions for an imputed diabetes matrix, and whether they are approximate.
+
+    While ``EXPLAINER_MAX_CONCURRENCY`` exact explanations are already running,
+    or when no exact explainer works, the nearest-neighbour reference store
+    answers instead; if it is unavailable too, the call waits for a slot.
+    """
+    if not _exact_explanation_slots.acquire(blocking=False):
+        approximate = _reference_contributions(values, feature_names, version)
+        if approximate is not None:
+            return approximate, True
+        _exact_explanation_slots.acquire()
+    try:
+        exact = _exact_diabetes_contributions(values, feature_names, version)
+    finally:
+        _exact_explanation_slots.release()
+
+    if exact is not None:
+        return exact, False
+    approximate = _reference_contributions(values, feature_names, version)
+    return approximate, approximate is not None
+
+
+def _get_diabetes_drivers_batch(
+    model, values: np.ndarray, feature_names: List[str], version: Optional[ModelVersion] = None
+) -> Tuple[List[List[Dict[str, Any]]], bool]:
+    """Top drivers for every row of an imputed diabetes feature matrix, and whether they are approximate."""
+    n_rows = values.shape[0]
+    feature_index_map = {name: idx for idx, name in enumerate(feature_names)}
+
+    contributions, approximate = _diabetes_contributions(values, feature_names, version)
+    if contributions is not None:
+        top_indices = _top_driver_indices(contributions)
+
+        return [
+            [
+                _build_driver(
+                    feature_names[idx],
+                    float(values[row, idx]),
+                    float(contributions[row, idx]),
+                )
+                for idx in top_indices[row]
+            ]
+            for row in range(n_rows)
+        ], approximate
 
     if hasattr(model, "feature_importances_"):
         importances = model.feature_importances_
@@ -242,96 +714,83 @@ def _get_diabetes_drivers(model, features_df: pd.DataFrame, feature_names: List[
             (feat, importances[idx]) for feat, idx in feature_index_map.items()
         ]
         importance_tuples.sort(key=lambda x: x[1], reverse=True)
-
-        for feature, importance in importance_tuples[:TOP_DRIVERS_COUNT]:
-            idx = feature_index_map[feature]
-            value = float(features_df.iloc[0, idx])
-            drivers.append(
-                {
-                    "feature": feature,
-                    "description": get_feature_description(feature),
-                    "value": value,
-                    "shap_value": float(importance),
-                    "impact": "aumenta" if importance > 0 else "reduce",
-                }
-            )
-    else:
-        key_features = ['bmi', 'age', 'waist_height_ratio', 'lifestyle_risk_score', 'central_obesity']
-        for feature in key_features[:TOP_DRIVERS_COUNT]:
-            if feature in feature_index_map:
-                idx = feature_index_map[feature]
-                drivers.append(
-                    {
-                        "feature": feature,
-                        "description": get_feature_description(feature),
-                        "value": float(features_df.iloc[0, idx]),
-                        "shap_value": 0.0,
-                        "impact": "aumenta",
-                    }
+        top_features = importance_tuples[:TOP_DRIVERS_COUNT]
+
+        return [
+            [
+                _build_driver(
+                    feature,
+                    float(values[row, feature_index_map[feature]]),
+                    float(importance),
                 )
-
-    return drivers
+                for feature, importance in top_features
+            ]
+            for row in range(n_rows)
+        ], True
+
+    key_features = ['bmi', 'age', 'waist_height_ratio', 'lifestyle_risk_score', 'central_obesity']
+    key_features = [feature for feature in key_features[:TOP_DRIVERS_COUNT] if feature in feature_index_map]
+    return [
+        [
+            _build_driver(feature, float(values[row, feature_index_map[feature]]), 0.0, impact="aumenta")
+            for feature in key_features
+        ]
+        for row in range(n_rows)
+    ], True
 
 
-def _get_cardiovascular_drivers(model, features_df: pd.DataFrame, feature_names: List[str]) -> List[Dict[str, Any]]:
-    drivers: List[Dict[str, Any]] = []
+def _get_cardiovascular_drivers(
+    model, values: np.ndarray, feature_names: List[str], version: Optional[ModelVersion] = None
+) -> Tuple[List[Dict[str, Any]], bool]:
+    drivers_per_row, approximate = _get_cardiovascular_drivers_batch(model, values, feature_names, version)
+    return drivers_per_row[0], approximate
 
-    try:
-        pipeline = None
-        if hasattr(model, "calibrated_classifiers_") and model.calibrated_classifiers_:
-            pipeline = model.calibrated_classifiers_[0].estimator
-        elif hasattr(model, "estimator"):
-            pipeline = model.estimator
 
-        if pipeline is None or not hasattr(pipeline, "named_steps"):
-            raise AttributeError("Cardiovascular pipeline does not expose named_steps")
-
-        preprocessor = pipeline.named_steps.get("pre")
-        classifier = pipeline.named_steps.get("clf")
-        if preprocessor is None or classifier is None:
-            raise AttributeError("Cardiovascular pipeline is missing expected steps")
+def _get_cardiovascular_drivers_batch(
+    model, values: np.ndarray, feature_names: List[str], version: Optional[ModelVersion] = None
+) -> Tuple[List[List[Dict[str, Any]]], bool]:
+    """
+    Top linear contributions (scaled value * coefficient) for every row of a
+    raw cardiovascular feature matrix, via the precompiled explanation plan.
 
-        scaled = preprocessor.transform(features_df)
+    Without a plan, the globally most important features (mean |SHAP| from
+    ``shap_feature_importance.csv``) are returned and flagged as approximate.
+    """
+    n_rows = values.shape[0]
+    plan = get_linear_explanation_plan("cardiovascular", version)
 
+    if plan is not None:
         try:
-            transformed_names = [
-                str(name).split("__", 1)[-1] for name in preprocessor.get_feature_names_out()
-            ]
-        except Exception:
-            transformed_names = feature_names or list(features_df.columns)
-
-        contributions = scaled[0] * classifier.coef_[0]
-        pairs = list(zip(transformed_names, contributions))
-        pairs.sort(key=lambda x: abs(x[1]), reverse=True)
-
-        for feature, contrib in pairs[:TOP_DRIVERS_COUNT]:
-            raw_value = features_df.iloc[0].get(feature, np.nan)
-            drivers.append(
-                {
-                    "feature": feature,
-                    "description": get_feature_description(feature),
-                    "value": float(raw_value) if not pd.isna(raw_value) else None,
-                    "shap_value": float(contrib),
-                    "impact": "aumenta" if contrib > 0 else "reduce",
-                }
-            )
-
-    except Exception as exc:
-        logger.warning("Unable to compute cardiovascular drivers precisely: %s", exc)
-        ordered_features = feature_names or list(features_df.columns)
-        for feature in ordered_features[:TOP_DRIVERS_COUNT]:
-            raw_value = features_df.iloc[0].get(feature, np.nan)
-            drivers.append(
-                {
-                    "feature": feature,
-                    "description": get_feature_description(feature),
-                    "value": float(raw_value) if not pd.isna(raw_value) else None,
-                    "shap_value": 0.0,
-                    "impact": "aumenta",
-                }
+            contributions = plan.contributions(values)
+            top_indices = _top_driver_indices(contributions)
+            raw_columns = plan.input_index
+
+            return [
+                [
+                    _build_driver(
+                        plan.feature_names[idx],
+                        _optional_float(values[row, raw_columns[idx]]),
+                        float(contributions[row, idx]),
+                    )
+                    for idx in top_indices[row]
+                ]
+                for row in range(n_rows)
+            ], False
+        except Exception as exc:
+            logger.warning("Unable to compute cardiovascular drivers precisely: %s", exc)
+
+    column_index = {name: idx for idx, name in enumerate(feature_names or [])}
+    ranked = [feature for feature in get_reference_importance() if feature in column_index]
+    ordered_features = (ranked or feature_names or CARDIO_FEATURE_COLUMNS)[:TOP_DRIVERS_COUNT]
+    return [
+        [
+            _build_driver(
+                feature,
+                _optional_float(values[row, column_index[feature]]) if feature in column_index else None,
+                0.0,
+                impact="aumenta",
             )
-            if len(drivers) >= TOP_DRIVERS_COUNT:
-                break
-
-    return drivers
-
+            for feature in ordered_features
+        ]
+        for row in range(n_rows)
+    ], True
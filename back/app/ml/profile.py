@@ -0,0 +1,57 @@
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional
+
+
+@dataclass(slots=True)
+class RiskProfile:
+    """
+    Already-validated model input, with the keyword names of ``predict_risk``.
+
+    Built once from a validated request (see ``ml_service.construir_perfil``)
+    and passed as is through caching, shadow scoring and the feature builders,
+    so internal hops neither re-validate nor copy the data into new dicts.
+    ``get`` gives the same read access as the profile dicts used elsewhere,
+    so ``build_profile_matrix`` and ``predict_risk_batch`` accept either.
+    """
+
+    age: Optional[float] = None
+    sex: Optional[str] = None
+    height_cm: Optional[float] = None
+    weight_kg: Optional[float] = None
+    waist_cm: Optional[float] = None
+    sleep_hours: Optional[float] = None
+    smokes_cig_day: Optional[float] = None
+    days_mvpa_week: Optional[float] = None
+    bmi: Optional[float] = None
+    systolic_bp: Optional[float] = None
+    total_cholesterol: Optional[float] = None
+    glucosa_mgdl: Optional[float] = None
+    hdl_mgdl: Optional[float] = None
+    trigliceridos_mgdl: Optional[float] = None
+    ldl_mgdl: Optional[float] = None
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return getattr(self, name, default)
+
+    def as_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments for ``predict_risk``."""
+        return {
+            "age": self.age,
+            "sex": self.sex,
+            "height_cm": self.height_cm,
+            "weight_kg": self.weight_kg,
+            "waist_cm": self.waist_cm,
+            "sleep_hours": self.sleep_hours,
+            "smokes_cig_day": self.smokes_cig_day,
+            "days_mvpa_week": self.days_mvpa_week,
+            "bmi": self.bmi,
+            "systolic_bp": self.systolic_bp,
+            "total_cholesterol": self.total_cholesterol,
+            "glucosa_mgdl": self.glucosa_mgdl,
+            "hdl_mgdl": self.hdl_mgdl,
+            "trigliceridos_mgdl": self.trigliceridos_mgdl,
+            "ldl_mgdl": self.ldl_mgdl,
+        }
+
+
+PROFILE_FIELDS = tuple(field.name for field in fields(RiskProfile))
@@ -3,16 +3,8 @@ import json
 from pathlib import Path
 from typing import List, Dict, Optional
 from dataclasses import dataclass
-import re
 import logging
 
-try:
-    from rank_bm25 import BM25Okapi
-except ImportError:
-    import subprocess
-    subprocess.check_call(['pip', 'install', 'rank-bm25'])
-    from rank_bm25 import BM25Okapi
-
 try:
     from openai import OpenAI
 except ImportError:
@@ -20,6 +12,10 @@ except ImportError:
     subprocess.check_call(['pip', 'install', 'openai'])
     from openai import OpenAI
 
+from app.utils.cache import TTLCache
+
+from .bm25_index import BM25Index, load_or_build_index, tokenize, top_k as top_k_indices
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -45,7 +41,7 @@ class KnowledgeBase:
             self.kb_dir.mkdir(parents=True, exist_ok=True)
             return
         
-        md_files = list(self.kb_dir.glob('*.md'))
+        md_files = sorted(self.kb_dir.glob('*.md'))
         if not md_files:
             logger.warning(f"No se encontraron archivos .md en {self.kb_dir}")
             return
@@ -96,51 +92,111 @@ class KnowledgeBase:
         return self.chunks
 
 class RAGRetriever:
-    """Recuperador de documentos usando BM25."""
+    """
+    Recuperador de documentos: BM25 y, si el índice trae vectores densos (LSA),
+    búsqueda híbrida fusionando ambos rankings con reciprocal rank fusion.
+    """
     
-    def __init__(self, knowledge_base: KnowledgeBase):
+    def __init__(
+        self,
+        knowledge_base: Optional[KnowledgeBase] = None,
+        index: Optional[BM25Index] = None,
+        cache_size: int = 256,
+        rrf_k: int = 60,
+        rrf_candidates: int = 50
+    ):
         self.kb = knowledge_base
-        self.chunks = self.kb.get_all_chunks()
+        if index is None:
+            index = BM25Index.from_chunks(knowledge_base.get_all_chunks() if knowledge_base else [])
+        self.index = index
+        self.chunks = index.chunks
+        self.rrf_k = rrf_k
+        self.rrf_candidates = rrf_candidates
+        # LRU sobre queries normalizadas (tokens ordenados); el índice no cambia, así que no expira
+        self._cache = TTLCache(maxsize=cache_size, ttl_seconds=float('inf'))
         
         if not self.chunks:
             logger.warning("No hay chunks disponibles para indexar")
-            self.bm25 = None
             return
         
-        tokenized_corpus = [
-            self._tokenize(chunk['full_text']) 
-            for chunk in self.chunks
-        ]
-        self.bm25 = BM25Okapi(tokenized_corpus)
-        logger.info(f"Índice BM25 creado con {len(self.chunks)} chunks")
+        logger.info(f"Índice BM25 listo con {len(self.chunks)} chunks (híbrido: {index.dense is not None})")
     
     def _tokenize(self, text: str) -> List[str]:
-        """Tokenización simple para BM25."""
-        text = text.lower()
-        tokens = re.findall(r'\w+', text)
-        return tokens
+        """Términos del analizador en español (acentos, stopwords, stemming ligero)."""
+        return tokenize(text)
     
     def retrieve(self, query: str, top_k: int = 3) -> List[Dict[str, str]]:
         """Recupera los top_k chunks más relevantes para la query."""
-        if not self.bm25:
-            return []
+        return self.retrieve_batch([query], top_k)[0]
+    
+    def retrieve_batch(self, queries: List[str], top_k: int = 3) -> List[List[Dict[str, str]]]:
+        """
+        Recupera los top_k chunks de cada query (p. ej. una por driver).
+        
+        Las queries que no están en caché se puntúan juntas con un solo
+        producto disperso (queries x términos) @ (términos x chunks) y, en modo
+        híbrido, un producto denso contra los vectores LSA.
+        """
+        if not self.chunks:
+            return [[] for _ in queries]
         
-        tokenized_query = self._tokenize(query)
-        scores = self.bm25.get_scores(tokenized_query)
+        tokenized = [self._tokenize(query) for query in queries]
+        keys = [(tuple(sorted(tokens)), top_k) for tokens in tokenized]
+        results = [self._cache.get(key) for key in keys]
         
-        top_indices = sorted(
-            range(len(scores)), 
-            key=lambda i: scores[i], 
-            reverse=True
-        )[:top_k]
+        missing = [i for i, hits in enumerate(results) if hits is None]
+        if missing:
+            missing_tokens = [tokenized[i] for i in missing]
+            bm25_scores = self.index.score_batch(missing_tokens)
+            dense_scores = self.index.dense_score_batch(missing_tokens)
+            for row, i in enumerate(missing):
+                if dense_scores is None:
+                    hits = self._hits_bm25(bm25_scores[row], top_k)
+                else:
+                    hits = self._hits_rrf(bm25_scores[row], dense_scores[row], top_k)
+                self._cache.set(keys[i], hits)
+                results[i] = hits
         
-        results = []
-        for idx in top_indices:
-            chunk = self.chunks[idx].copy()
+        return [[dict(chunk) for chunk in hits] for hits in results]
+    
+    def _hits_bm25(self, scores, top_k: int) -> List[Dict[str, str]]:
+        hits = []
+        for idx in top_k_indices(scores, top_k):
+            chunk = self.chunks[idx]
             chunk['score'] = float(scores[idx])
-            results.append(chunk)
+            hits.append(chunk)
+        return hits
+    
+    def _hits_rrf(self, bm25_scores, dense_scores, top_k: int) -> List[Dict[str, str]]:
+        """
+        Reciprocal rank fusion: cada canal aporta 1 / (rrf_k + rango) a los
+        chunks de su top ``rrf_candidates`` con puntaje positivo. Si entre los
+        dos no alcanzan top_k, se completa con el orden BM25 como antes.
+        """
+        n_candidates = max(top_k, self.rrf_candidates)
+        fused: Dict[int, float] = {}
+        for scores in (bm25_scores, dense_scores):
+            ranked = top_k_indices(scores, n_candidates)
+            for rank, idx in enumerate(ranked[scores[ranked] > 0].tolist(), 1):
+                fused[idx] = fused.get(idx, 0.0) + 1.0 / (self.rrf_k + rank)
         
-        return results
+        selected = sorted(fused, key=lambda idx: (-fused[idx], idx))[:top_k]
+        if len(selected) < top_k:
+            rest = [idx for idx in top_k_indices(bm25_scores, top_k + len(selected)).tolist() if idx not in fused]
+            selected += rest[:top_k - len(selected)]
+        
+        hits = []
+        for idx in selected:
+            chunk = self.chunks[idx]
+            chunk['score'] = fused.get(idx, 0.0)
+            chunk['bm25_score'] = float(bm25_scores[idx])
+            chunk['dense_score'] = float(dense_scores[idx])
+            hits.append(chunk)
+        return hits
+    
+    def cache_stats(self) -> Dict:
+        """Contadores de la caché de queries."""
+        return self._cache.stats()
 
 class CoachGenerator:
     """Generador de planes personalizados usando OpenAI + RAG."""
@@ -310,10 +366,31 @@ Genera el plan ahora:"""
 class RAGCoachSystem:
     """Sistema completo RAG + Coach."""
     
-    def __init__(self, kb_dir: str, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        kb_dir: str,
+        api_key: Optional[str] = None,
+        index_dir: Optional[str] = None,
+        query_cache_size: int = 256,
+        retriever=None
+    ):
+        """
+        Con ``index_dir`` se usa (o reconstruye, si la KB cambió) el índice
+        BM25 persistido y mapeado en memoria; sin él se indexa la KB en memoria.
+        ``retriever`` (cualquier objeto con ``retrieve``, p. ej. la KB en
+        memoria de ``rag_service``) reemplaza ambos.
+        """
         logger.info("Inicializando sistema RAG Coach...")
-        self.kb = KnowledgeBase(kb_dir)
-        self.retriever = RAGRetriever(self.kb)
+        if retriever is not None:
+            self.kb = None
+            self.retriever = retriever
+        elif index_dir:
+            self.kb = None
+            index = load_or_build_index(Path(kb_dir), Path(index_dir))
+            self.retriever = RAGRetriever(index=index, cache_size=query_cache_size)
+        else:
+            self.kb = KnowledgeBase(kb_dir)
+            self.retriever = RAGRetriever(self.kb, cache_size=query_cache_size)
         self.coach = CoachGenerator(self.retriever, api_key)
         logger.info("Sistema RAG Coach listo")
     
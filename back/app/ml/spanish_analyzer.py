@@ -0,0 +1,80 @@
+"""
+Spanish analyzer for the KB search: the same pipeline runs at index and query time.
+
+    text -> lowercase words -> drop stopwords -> fold accents -> light stem
+
+Folding makes "sueño"/"sueno" and "física"/"fisica" one term. The light
+stemmer (Savoy's, as in Lucene's SpanishLightStemmer) only strips gender and
+number endings, so "caminatas"/"caminata" and "sueños"/"sueño" share postings
+without the aggressive conflations of a full Snowball stemmer. Stopwords are
+matched before folding, so "sí" (yes) is kept while "si" (if) is dropped.
+
+Each distinct word is analyzed once (memoized term dictionary); queries only
+pay a dictionary lookup per word after warm-up.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List, Optional
+
+# Bump when the pipeline changes so persisted indexes are rebuilt
+ANALYZER_NAME = "es-fold-stop-light-v1"
+
+_WORD_RE = re.compile(r"\w+")
+
+# Function words only (articles, pronouns, prepositions, conjunctions and
+# auxiliary forms); negations and quantifiers like "no", "sin", "más" are kept
+SPANISH_STOPWORDS = frozenset("""
+a al algo algunas algunos ante antes como con contra cual cuales cuando de del desde donde durante
+e el ella ellas ellos en entre era eran es esa esas ese eso esos esta estaba estado estamos estan
+está están estar estas este esto estos fue fueron ha habia había han has hasta hay la las le les lo
+los me mi mis muy nos nosotros o os otra otras otro otros para pero por porque que qué se sea sean
+ser si sido sobre son su sus también te tiene tienen tu tus un una uno unos usted ustedes vosotros
+y ya yo él éste ésta
+""".split())
+
+_ACCENTS = str.maketrans("áàäâéèëêíìïîóòöôúùüûñç", "aaaaeeeeiiiioooouuuunc")
+
+
+def fold(word: str) -> str:
+    """Strip accents and diacritics (ñ -> n); non-Latin letters fall back to NFKD."""
+    folded = word.translate(_ACCENTS)
+    if folded.isascii():
+        return folded
+    return "".join(c for c in unicodedata.normalize("NFKD", folded) if not unicodedata.combining(c))
+
+
+def light_stem(word: str) -> str:
+    """Savoy's light Spanish stemmer on a folded word (words under 5 letters are kept)."""
+    if len(word) < 5:
+        return word
+    last = word[-1]
+    if last in "oae":
+        return word[:-1]
+    if last == "s":
+        if word.endswith("eses"):
+            return word[:-2]
+        if word.endswith("ces"):
+            return word[:-3] + "z"
+        if word[-2] in "oae":
+            return word[:-2]
+    return word
+
+
+@lru_cache(maxsize=65536)
+def analyze_word(word: str) -> Optional[str]:
+    """Index term for a lowercase word, or None for a stopword."""
+    if word in SPANISH_STOPWORDS:
+        return None
+    return light_stem(fold(word))
+
+
+def analyze(text: str) -> List[str]:
+    """Index terms of ``text``, in order (repeated terms are kept for term frequencies)."""
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        term = analyze_word(word)
+        if term is not None:
+            terms.append(term)
+    return terms
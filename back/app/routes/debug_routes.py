@@ -1,7 +1,16 @@
 # app/routes/debug_routes.py
 
+import os
+
 from fastapi import APIRouter
+from app.agents.rag_service import get_kb_store
 from app.core.database import get_supabase
+from app.core.preload import reporte_memoria
+from app.ml.model_loader import get_model_registry
+from app.ml.predictor import prediction_stage_stats
+from app.services.inference_executor import get_inference_executor
+from app.services.ml_service import estadisticas_cache_predicciones, estadisticas_micro_batcher
+from app.services.shadow_scoring import get_shadow_scorer
 
 router = APIRouter()
 
@@ -23,3 +32,71 @@ def debug_supabase():
             "status": "error",
             "detail": str(e)
         }
+
+
+@router.get("/prediction-cache")
+def debug_prediction_cache():
+    """
+    Contadores de la caché de predicciones (hits, misses, evictions, expiraciones)
+    para ajustar su tamaño y TTL.
+    """
+    return estadisticas_cache_predicciones()
+
+
+@router.get("/micro-batcher")
+def debug_micro_batcher():
+    """Histogramas de tamaño de lote, espera en cola y duración de lote del micro-batcher de /predict."""
+    return estadisticas_micro_batcher()
+
+
+@router.get("/inference-pool")
+def debug_inference_pool():
+    """Profundidad de cola, utilización por worker y latencias del pool de inferencia."""
+    executor = get_inference_executor()
+    if executor is None:
+        return {"enabled": False}
+    return {"enabled": True, **executor.stats()}
+
+
+@router.get("/models")
+def debug_models():
+    """Versión activa por modelo, versiones disponibles en disco e historial de cambios de versión."""
+    return get_model_registry().stats()
+
+
+@router.get("/shadow")
+def debug_shadow():
+    """
+    Estadísticas móviles del modelo candidato en modo sombra: delta de score,
+    acuerdo de categoría de riesgo y latencia por fila de cada modelo.
+    """
+    shadow = get_shadow_scorer()
+    if shadow is None:
+        return {"enabled": False}
+    return {"enabled": True, **shadow.stats()}
+
+
+@router.get("/metrics")
+def debug_metrics():
+    """
+    Histogramas de latencia por etapa de predicción (features, impute,
+    predict_proba, explain, interpret, total) por modelo y modo. Con el pool
+    de inferencia activo incluyen las etapas medidas en sus workers; con
+    varios workers de gunicorn cada uno responde con las suyas (ver ``pid``).
+    """
+    return {"pid": os.getpid(), "prediction_stages": prediction_stage_stats()}
+
+
+@router.get("/memory")
+def debug_memory():
+    """
+    Memoria única vs compartida (copy-on-write) del maestro y de cada worker
+    cuando el servidor corre en modo precarga; si no, del proceso actual.
+    """
+    return reporte_memoria()
+
+
+@router.get("/kb")
+def debug_kb():
+    """Entradas de la KB en memoria con sus tokens, recargas del vigilante y caché de queries."""
+    return get_kb_store().stats()
@@ -4,14 +4,23 @@ from datetime import date
 from app.schemas.analisis_schema import (
     AnalisisEntrada, 
     PrediccionResultado, 
+    AnalisisLoteEntrada,
+    PrediccionLoteResultado,
     CoachEntrada, 
     CoachResultado,
-    AnalisisRegistro
+    AnalisisRegistro,
+    SimulacionEntrada,
+    SimulacionResultado
+)
+from app.services.ml_service import (
+    obtener_prediccion_async,
+    obtener_predicciones_lote_async,
+    simular_escenarios_async
 )
-from app.services.ml_service import obtener_prediccion
 from app.core.security import verify_supabase_token
 from app.core.database import guardar_analisis, obtener_historial_analisis
 from app.core.config import settings
+from app.agents.rag_service import get_kb_store
 from app.ml.rag_system import RAGCoachSystem
 import logging
 
@@ -26,7 +35,8 @@ def get_rag_system():
     global _rag_system
     if _rag_system is None:
         kb_dir = str(settings.KB_DIR)
-        _rag_system = RAGCoachSystem(kb_dir=kb_dir, api_key=settings.OPENAI_API_KEY)
+        # Mismo índice (y recarga) que la KB en memoria del chat
+        _rag_system = RAGCoachSystem(kb_dir=kb_dir, api_key=settings.OPENAI_API_KEY, retriever=get_kb_store())
     return _rag_system
 
 # ENDPOINT 1: /predict (Requisito A4, C1)
@@ -35,8 +45,10 @@ def _build_prediction_response(pred: dict) -> PrediccionResultado:
     return PrediccionResultado(
         score=pred["score"],
         drivers=pred["drivers"],
+        drivers_approximate=pred.get("drivers_approximate", False),
         categoria_riesgo=pred["categoria_riesgo"],
-        model_used=pred.get("model_used", "diabetes")
+        model_used=pred.get("model_used", "diabetes"),
+        model_version=pred.get("model_version")
     )
 
 
@@ -52,7 +64,7 @@ async def predecir_riesgo(
 ):
     """Endpoint legacy que utiliza el modelo por defecto (diabetes)."""
 
-    pred = obtener_prediccion(data, model_type=data.modelo or "diabetes")
+    pred = await obtener_prediccion_async(data, model_type=data.modelo or "diabetes")
 
     if "error" in pred:
         raise HTTPException(
@@ -63,6 +75,80 @@ async def predecir_riesgo(
     return _build_prediction_response(pred)
 
 
+# ENDPOINT 1c: /predict/batch
+# Tamizaje masivo: una sola matriz de features y una pasada del modelo para todo el lote.
+# Debe declararse antes de /predict/{model_type} para que "batch" no se tome como modelo.
+@router.post(
+    "/predict/batch",
+    response_model=PrediccionLoteResultado,
+    summary="1c. Obtener Riesgo y Drivers para un lote de registros",
+    tags=["Health (ML & Coach)"]
+)
+async def predecir_riesgo_lote(
+    data: AnalisisLoteEntrada,
+    usuario=Depends(verify_supabase_token)
+):
+    """Evalúa cientos de registros con un único predict_proba y una única pasada de explicabilidad."""
+
+    model_key = (data.modelo or "diabetes").lower()
+    if model_key not in {"diabetes", "cardiovascular"}:
+        raise HTTPException(status_code=400, detail="Modelo no soportado")
+
+    if len(data.registros) > settings.PREDICT_BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"El lote supera el máximo de {settings.PREDICT_BATCH_MAX_ROWS} registros"
+        )
+
+    pred = await obtener_predicciones_lote_async(data.registros, model_type=model_key)
+
+    if "error" in pred:
+        raise HTTPException(
+            status_code=pred.get("status_code", status.HTTP_503_SERVICE_UNAVAILABLE),
+            detail=pred["error"]
+        )
+
+    resultados = [_build_prediction_response(item) for item in pred["resultados"]]
+    return PrediccionLoteResultado(
+        model_used=pred["model_used"],
+        total=len(resultados),
+        resultados=resultados
+    )
+
+
+# ENDPOINT 1d: /simulate
+# "Qué pasaría si": superficie de riesgo sobre peso, cintura, sueño, tabaquismo y actividad.
+@router.post(
+    "/simulate",
+    response_model=SimulacionResultado,
+    summary="1d. Simular riesgo al cambiar factores modificables",
+    tags=["Health (ML & Coach)"]
+)
+async def simular_riesgo(
+    data: SimulacionEntrada,
+    usuario=Depends(verify_supabase_token)
+):
+    """
+    Evalúa todas las combinaciones de los factores pedidos (p.ej. peso 80-95 kg
+    x actividad) en una sola pasada del modelo. ``efectos`` da el riesgo al
+    cambiar un solo factor ("bajar 5 kg reduce tu riesgo de X a Y").
+    """
+
+    model_key = (data.modelo or data.perfil.modelo or "diabetes").lower()
+    if model_key not in {"diabetes", "cardiovascular"}:
+        raise HTTPException(status_code=400, detail="Modelo no soportado")
+
+    result = await simular_escenarios_async(data)
+
+    if "error" in result:
+        raise HTTPException(
+            status_code=result.get("status_code", status.HTTP_503_SERVICE_UNAVAILABLE),
+            detail=result["error"]
+        )
+
+    return SimulacionResultado(**result)
+
+
 @router.post(
     "/predict/{model_type}",
     response_model=PrediccionResultado,
@@ -80,7 +166,7 @@ async def predecir_riesgo_por_modelo(
     if model_key not in {"diabetes", "cardiovascular"}:
         raise HTTPException(status_code=400, detail="Modelo no soportado")
 
-    pred = obtener_prediccion(data, model_type=model_key)
+    pred = await obtener_prediccion_async(data, model_type=model_key)
 
     if "error" in pred:
         raise HTTPException(
@@ -1,8 +1,12 @@
 # app/routes/users_routes.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from app.core.security import verify_supabase_token
-from app.core.database import obtener_perfil, actualizar_perfil, obtener_historial_analisis
+from app.core.database import obtener_perfil, actualizar_perfil, obtener_analisis
+from app.schemas.analisis_schema import HistorialPagina, TrayectoriaRiesgo
 from app.schemas.usuario_schema import UsuarioCreate, UsuarioResponse
+from app.services.historial_service import HISTORIAL_LIMITE_MAXIMO, obtener_historial, obtener_trayectoria
 
 router = APIRouter()
 
@@ -37,22 +41,49 @@ async def actualizar_datos_usuario(
 
     return {"message": "Perfil actualizado correctamente ✅"}
 
-#Endpoint: Historial de análisis del usuario
-@router.get("/history")
-async def obtener_historial_usuario(usuario=Depends(verify_supabase_token)):
+#Endpoint: Historial de análisis del usuario (paginado)
+@router.get("/history", response_model=HistorialPagina)
+def obtener_historial_usuario(
+    limite: int = Query(20, ge=1, le=HISTORIAL_LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    usuario=Depends(verify_supabase_token),
+):
     """
-    Devuelve el historial de análisis del usuario autenticado,
-    ordenado por fecha descendente.
+    Devuelve una página del historial de análisis del usuario autenticado,
+    ordenado por fecha descendente, con columnas resumidas (sin el plan).
+    La página siguiente se pide con ``cursor=siguiente_cursor``; el detalle
+    completo de un análisis está en /history/{analisis_id}.
     """
-    historial = obtener_historial_analisis(usuario["id"])
-    if not historial:
-        return {"message": "No se encontraron análisis previos para este usuario."}
+    resultado = obtener_historial(usuario["id"], limite=limite, cursor=cursor)
+    if "error" in resultado:
+        raise HTTPException(status_code=resultado.get("status_code", 500), detail=resultado["error"])
+    return resultado
 
-    return {
-        "usuario_id": usuario["id"],
-        "cantidad": len(historial),
-        "historial": historial
-    }
+#Endpoint: Detalle de un análisis (plan, drivers y citas)
+@router.get("/history/{analisis_id}")
+def obtener_detalle_analisis(analisis_id: int, usuario=Depends(verify_supabase_token)):
+    analisis = obtener_analisis(usuario["id"], analisis_id)
+    if not analisis:
+        raise HTTPException(status_code=404, detail="Análisis no encontrado.")
+    return analisis
+
+#Endpoint: Trayectoria de riesgo para gráficos
+@router.get("/trajectory", response_model=TrayectoriaRiesgo)
+def obtener_trayectoria_usuario(
+    agrupacion: str = Query("dia", description="dia, semana o mes"),
+    modelo: Optional[str] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    usuario=Depends(verify_supabase_token),
+):
+    """
+    Series de score y nivel de riesgo por modelo, agregadas en el servidor
+    por día, semana o mes (promedio, mínimo, máximo, último y conteo por nivel).
+    """
+    resultado = obtener_trayectoria(usuario["id"], agrupacion=agrupacion, modelo=modelo, desde=desde, hasta=hasta)
+    if "error" in resultado:
+        raise HTTPException(status_code=resultado.get("status_code", 500), detail=resultado["error"])
+    return resultado
 
 #Endpoint: Eliminar perfil de usuario
 @router.delete("/delete")
@@ -1,6 +1,6 @@
 # back/app/schemas/analisis_schema.py
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Any, Dict, Optional, List, Union
 from datetime import date, datetime
 
 # ---------------------------------------------------------------------------
@@ -60,12 +60,92 @@ class PrediccionResultado(BaseModel):
     """
     score: float # El riesgo predicho (0.0 a 1.0)
     drivers: List[DriverExplicacion] # Lista de los factores con explicabilidad completa
+    drivers_approximate: bool = False # True si los drivers vienen del índice de referencia (explicador saturado)
     categoria_riesgo: str # "Bajo", "Moderado", "Alto"
     model_used: Optional[str] = "diabetes"
+    model_version: Optional[str] = None # Versión del modelo (manifest del bundle o hash de los pickles)
 
     class Config:
         from_attributes = True
 
+# ---------------------------------------------------------------------------
+# Predicción por lotes (/predict/batch): tamizajes masivos de una clínica
+# ---------------------------------------------------------------------------
+class AnalisisLoteEntrada(BaseModel):
+    """
+    Lote de registros a evaluar con un mismo modelo en una sola pasada.
+    """
+    registros: List[AnalisisEntrada]
+    modelo: Optional[str] = "diabetes"
+
+
+class PrediccionLoteResultado(BaseModel):
+    """
+    Respuesta de /predict/batch: un resultado por registro, en el mismo orden.
+    """
+    model_used: str
+    total: int
+    resultados: List[PrediccionResultado]
+
+    class Config:
+        from_attributes = True
+
+# ---------------------------------------------------------------------------
+# Simulación "qué pasaría si" (/simulate): superficie de riesgo sobre factores modificables
+# ---------------------------------------------------------------------------
+class RangoNumerico(BaseModel):
+    """Rango inclusivo [min, max] recorrido con el paso indicado."""
+    min: float
+    max: float
+    paso: float
+
+
+class SimulacionEntrada(BaseModel):
+    """
+    Perfil base más los valores a probar para cada factor modificable.
+    Los factores numéricos aceptan una lista de valores o un RangoNumerico.
+    """
+    perfil: AnalisisEntrada
+    peso_kg: Optional[Union[RangoNumerico, List[float]]] = None
+    circunferencia_cintura: Optional[Union[RangoNumerico, List[float]]] = None
+    horas_sueno: Optional[Union[RangoNumerico, List[float]]] = None
+    tabaquismo: Optional[List[bool]] = None
+    actividad_fisica: Optional[List[str]] = None # Ej: ["sedentario", "moderado", "activo"]
+    modelo: Optional[str] = None # Por defecto el de perfil.modelo
+
+
+class EscenarioRiesgo(BaseModel):
+    score: float
+    categoria_riesgo: str
+
+
+class EfectoFactor(BaseModel):
+    """Riesgo al cambiar un solo factor, con el resto en el valor del perfil base."""
+    valor: Any
+    score: float
+    categoria_riesgo: str
+
+
+class MejorEscenario(EscenarioRiesgo):
+    valores: Dict[str, Any]
+
+
+class SimulacionResultado(BaseModel):
+    """
+    Superficie de riesgo: ``scores`` y ``categorias`` son listas anidadas con
+    una dimensión por factor de ``ejes`` (en el mismo orden).
+    """
+    model_used: str
+    model_version: Optional[str] = None
+    base: EscenarioRiesgo
+    ejes: Dict[str, List[Any]]
+    scores: List[Any]
+    categorias: List[Any]
+    efectos: Dict[str, List[EfectoFactor]]
+    mejor: Optional[MejorEscenario] = None
+    total_variantes: int
+
+
 # ---------------------------------------------------------------------------
 # REQUISITO B2: Entrada para el endpoint /coach
 # (Este schema es NUEVO y CRÍTICO)
@@ -139,4 +219,41 @@ class AnalisisRegistro(BaseModel):
     model_used: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# ---------------------------------------------------------------------------
+# Historial paginado (/api/users/history) y trayectoria de riesgo (/api/users/trajectory)
+# ---------------------------------------------------------------------------
+class HistorialPagina(BaseModel):
+    """
+    Una página del historial con columnas resumidas (sin plan ni drivers).
+    Con ``siguiente_cursor`` se pide la página siguiente.
+    """
+    usuario_id: str
+    cantidad: int
+    historial: List[Dict[str, Any]]
+    siguiente_cursor: Optional[str] = None
+
+
+class PuntoTrayectoria(BaseModel):
+    periodo: date # Inicio del día, semana (lunes) o mes
+    n: int
+    score_promedio: float
+    score_min: float
+    score_max: float
+    score_ultimo: float
+    niveles: Dict[str, int] # Conteo por nivel normalizado: low, moderate, high
+
+
+class SerieTrayectoria(BaseModel):
+    modelo: str
+    puntos: List[PuntoTrayectoria]
+    tendencia: Optional[float] = None # Promedio del último periodo menos el del primero
+
+
+class TrayectoriaRiesgo(BaseModel):
+    """Series de riesgo por modelo, agregadas en el servidor para los gráficos."""
+    usuario_id: str
+    agrupacion: str
+    total_analisis: int
+    series: List[SerieTrayectoria]
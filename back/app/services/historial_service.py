@@ -0,0 +1,160 @@
+import base64
+import json
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.database import obtener_historial_pagina, obtener_serie_riesgo
+
+logger = logging.getLogger(__name__)
+
+HISTORIAL_LIMITE_MAXIMO = 100
+
+# Categorías guardadas en español (formulario) o inglés (chat) -> nivel normalizado
+NIVELES_RIESGO = {
+    "bajo": "low",
+    "moderado": "moderate",
+    "alto": "high",
+    "low": "low",
+    "moderate": "moderate",
+    "high": "high",
+}
+
+AGRUPACIONES = ("dia", "semana", "mes")
+
+
+def codificar_cursor(fila: dict) -> str:
+    """Cursor opaco con la (fecha, id) de la última fila de una página."""
+    payload = json.dumps([fila.get("fecha"), fila["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Tuple[Optional[str], int]:
+    """(fecha, id) de un cursor; ValueError si no es un cursor válido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        fecha, analisis_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if fecha is not None:
+            fecha = date.fromisoformat(fecha).isoformat()
+        return fecha, int(analisis_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Cursor inválido: {cursor!r}") from e
+
+
+def obtener_historial(usuario_id: str, limite: int = 20, cursor: Optional[str] = None) -> dict:
+    """
+    Página del historial con columnas resumidas y cursor a la siguiente página.
+
+    Retorna {"error": ..., "status_code"?} si el cursor es inválido o falla la BD.
+    """
+    try:
+        despues_de = decodificar_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return {"error": str(e), "status_code": 400}
+
+    limite = max(1, min(limite, HISTORIAL_LIMITE_MAXIMO))
+    pagina = obtener_historial_pagina(usuario_id, limite=limite, despues_de=despues_de)
+    if "error" in pagina:
+        return pagina
+
+    filas = pagina["filas"]
+    return {
+        "usuario_id": usuario_id,
+        "cantidad": len(filas),
+        "historial": filas,
+        "siguiente_cursor": codificar_cursor(filas[-1]) if pagina["hay_mas"] else None,
+    }
+
+
+def _fecha_fila(fila: dict) -> Optional[date]:
+    valor = fila.get("fecha") or (fila.get("created_at") or "")[:10]
+    try:
+        return date.fromisoformat(valor) if valor else None
+    except ValueError:
+        return None
+
+
+def _inicio_periodo(dia: date, agrupacion: str) -> date:
+    if agrupacion == "semana":
+        return dia - timedelta(days=dia.weekday())
+    if agrupacion == "mes":
+        return dia.replace(day=1)
+    return dia
+
+
+def agregar_trayectoria(filas: List[dict], agrupacion: str = "dia") -> List[Dict[str, Any]]:
+    """
+    Series de score y nivel de riesgo por modelo, agregadas por día, semana o mes.
+
+    ``filas`` viene en orden cronológico, así ``score_ultimo`` es el último
+    análisis de cada periodo. ``tendencia`` es la diferencia entre el promedio
+    del último y del primer periodo de la serie.
+    """
+    if agrupacion not in AGRUPACIONES:
+        raise ValueError(f"Agrupación no soportada: {agrupacion} (usar {', '.join(AGRUPACIONES)})")
+
+    periodos: Dict[str, Dict[date, Dict[str, Any]]] = {}
+    for fila in filas:
+        score = fila.get("riesgo_predicho")
+        dia = _fecha_fila(fila)
+        if score is None or dia is None:
+            continue
+        modelo = fila.get("modelo") or "diabetes"
+        punto = periodos.setdefault(modelo, {}).setdefault(
+            _inicio_periodo(dia, agrupacion),
+            {"n": 0, "suma": 0.0, "min": score, "max": score, "niveles": {"low": 0, "moderate": 0, "high": 0}},
+        )
+        punto["n"] += 1
+        punto["suma"] += score
+        punto["min"] = min(punto["min"], score)
+        punto["max"] = max(punto["max"], score)
+        punto["ultimo"] = score
+        nivel = NIVELES_RIESGO.get(str(fila.get("categoria_riesgo") or "").lower())
+        if nivel is not None:
+            punto["niveles"][nivel] += 1
+
+    series = []
+    for modelo, por_periodo in sorted(periodos.items()):
+        puntos = [
+            {
+                "periodo": periodo,
+                "n": punto["n"],
+                "score_promedio": round(punto["suma"] / punto["n"], 4),
+                "score_min": round(punto["min"], 4),
+                "score_max": round(punto["max"], 4),
+                "score_ultimo": round(punto["ultimo"], 4),
+                "niveles": punto["niveles"],
+            }
+            for periodo, punto in sorted(por_periodo.items())
+        ]
+        tendencia = round(puntos[-1]["score_promedio"] - puntos[0]["score_promedio"], 4) if len(puntos) > 1 else None
+        series.append({"modelo": modelo, "puntos": puntos, "tendencia": tendencia})
+    return series
+
+
+def obtener_trayectoria(
+    usuario_id: str,
+    agrupacion: str = "dia",
+    modelo: Optional[str] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+) -> dict:
+    """Trayectoria de riesgo agregada en el servidor (solo se leen 6 columnas por análisis)."""
+    if agrupacion not in AGRUPACIONES:
+        return {"error": f"Agrupación no soportada: {agrupacion} (usar {', '.join(AGRUPACIONES)})", "status_code": 400}
+
+    filas = obtener_serie_riesgo(
+        usuario_id,
+        modelo=modelo.lower() if modelo else None,
+        desde=desde.isoformat() if desde else None,
+        hasta=hasta.isoformat() if hasta else None,
+    )
+    if isinstance(filas, dict):
+        return filas
+
+    return {
+        "usuario_id": usuario_id,
+        "agrupacion": agrupacion,
+        "total_analisis": len(filas),
+        "series": agregar_trayectoria(filas, agrupacion),
+    }
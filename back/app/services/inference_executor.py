@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from app.utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFull(RuntimeError):
+    """La cola del pool de inferencia está llena (el llamador debe responder 503)."""
+
+
+# Barrera de arranque heredada por cada worker (ver wait_until_ready)
+_start_barrier = None
+
+
+def _init_worker(model_types: Sequence[str], ready_queue, start_barrier) -> None:
+    """Inicializador de cada proceso: carga modelos y explicadores una sola vez."""
+    global _start_barrier
+    _start_barrier = start_barrier
+    from app.ml.explainers import get_contribution_explainer
+    from app.core.config import settings
+    from app.ml.model_loader import get_inference_model, get_model_registry, load_model_bundle
+    from app.ml.predictor import WARMUP_PROFILE, forward_prediction_stages, predict_risk_batch
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    for model_type in model_types:
+        load_model_bundle(model_type)
+        get_inference_model(model_type)
+        if model_type == "diabetes":
+            get_contribution_explainer(model_type)
+        predict_risk_batch([WARMUP_PROFILE], model_type=model_type)
+
+    # Cada worker tiene su propio registro: también cambia de versión por su cuenta
+    get_model_registry().start_watcher(settings.MODEL_REGISTRY_POLL_SECONDS)
+    # Los tiempos por etapa viajan con cada resultado (ver _run_task)
+    forward_prediction_stages()
+    ready_queue.put(os.getpid())
+
+
+def _wait_for_all_workers(timeout: float) -> int:
+    """Bloquea el worker hasta que todos estén arriba: así el pool no puede reutilizar uno ocioso."""
+    _start_barrier.wait(timeout)
+    return os.getpid()
+
+
+def _run_task(fn: Callable[..., Any], args: tuple) -> tuple:
+    """
+    Ejecuta ``fn`` en el worker y retorna (pid, inicio, fin, resultado, etapas)
+    para las métricas; las etapas se registran en el proceso de la API.
+    """
+    from app.ml.predictor import take_prediction_stages
+
+    started = time.time()
+    result = fn(*args)
+    return os.getpid(), started, time.time(), result, take_prediction_stages()
+
+
+class InferenceExecutor:
+    """
+    Pool acotado de procesos para inferencia CPU-bound (XGBoost, SHAP, sklearn).
+
+    Cada worker precarga los modelos al iniciar. Como máximo
+    ``workers + max_queue`` tareas pueden estar pendientes; más allá de eso
+    ``submit`` lanza InferenceQueueFull en lugar de encolar sin límite.
+
+    Si un worker muere (OOM, segfault en XGBoost/ONNX) ProcessPoolExecutor
+    queda roto para siempre: las tareas en curso fallan y el pool se
+    reconstruye con workers nuevos para las siguientes.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int = 64,
+        model_types: Sequence[str] = ("diabetes", "cardiovascular"),
+        start_method: str = "spawn",
+    ):
+        self.workers = workers
+        self.capacity = workers + max(0, max_queue)
+        self.model_types = tuple(model_types)
+        self._context = multiprocessing.get_context(start_method)
+        self._ready_queue = self._context.Queue()
+        self._pool = self._crear_pool()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._started_at = time.time()
+        self._busy_seconds: Dict[int, float] = {}
+        self._tasks_per_worker: Dict[int, int] = {}
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.rebuilds = 0
+
+        self.latency_ms_histogram = Histogram()
+        self.queue_wait_ms_histogram = Histogram()
+        self.run_ms_histogram = Histogram()
+
+    def _crear_pool(self) -> ProcessPoolExecutor:
+        # Barrera nueva por pool: la anterior puede haber quedado rota
+        self._start_barrier = self._context.Barrier(self.workers)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=(self.model_types, self._ready_queue, self._start_barrier),
+        )
+
+    def _reconstruir_pool(self, roto: ProcessPoolExecutor) -> None:
+        """Reemplaza ``roto`` por un pool nuevo (una sola vez aunque fallen varias tareas)."""
+        with self._lock:
+            if self._pool is not roto:
+                return
+            self._pool = self._crear_pool()
+            self.rebuilds += 1
+        roto.shutdown(wait=False, cancel_futures=True)
+        logger.error("Un worker de inferencia murió; pool reconstruido (%s reconstrucciones)", self.rebuilds)
+        threading.Thread(target=self.wait_until_ready, name="inference-pool-warmup", daemon=True).start()
+
+    def wait_until_ready(self, timeout: float = 120.0) -> int:
+        """
+        Arranca los procesos y bloquea hasta que todos terminen de precargar.
+
+        Retorna la cantidad de workers listos.
+        """
+        # ProcessPoolExecutor lanza procesos a demanda y reutiliza los ociosos:
+        # una tarea bloqueante por worker obliga a lanzarlos todos
+        deadline = time.monotonic() + timeout
+        for _ in range(self.workers):
+            self._pool.submit(_wait_for_all_workers, timeout)
+        ready = set()
+        while len(ready) < self.workers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                ready.add(self._ready_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        logger.info("Pool de inferencia listo: %s/%s workers precargados", len(ready), self.workers)
+        return len(ready)
+
+    async def submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Ejecuta ``fn(*args)`` en un worker; ``fn`` debe ser una función de módulo (picklable)."""
+        result, _ = await self.submit_timed(fn, *args)
+        return result
+
+    async def submit_timed(self, fn: Callable[..., Any], *args: Any) -> Tuple[Any, float]:
+        """Como ``submit``, pero retorna (resultado, ms de ejecución en el worker sin la espera en cola)."""
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self.rejected += 1
+                raise InferenceQueueFull(
+                    f"Cola de inferencia llena ({self._in_flight}/{self.capacity} tareas pendientes)"
+                )
+            self._in_flight += 1
+
+        submitted = time.time()
+        pool = self._pool
+        try:
+            future = pool.submit(_run_task, fn, args)
+            pid, started, finished, result, stages = await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            with self._lock:
+                self.failed += 1
+            self._reconstruir_pool(pool)
+            raise
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+        with self._lock:
+            self.completed += 1
+            self._busy_seconds[pid] = self._busy_seconds.get(pid, 0.0) + (finished - started)
+            self._tasks_per_worker[pid] = self._tasks_per_worker.get(pid, 0) + 1
+        self.queue_wait_ms_histogram.observe(max(0.0, started - submitted) * 1000)
+        self.run_ms_histogram.observe((finished - started) * 1000)
+        self.latency_ms_histogram.observe((time.time() - submitted) * 1000)
+        if stages:
+            from app.ml.predictor import record_prediction_stages
+
+            record_prediction_stages(stages)
+        return result, (finished - started) * 1000
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            uptime = max(time.time() - self._started_at, 1e-9)
+            in_flight = self._in_flight
+            workers = {
+                str(pid): {
+                    "tasks": self._tasks_per_worker[pid],
+                    "busy_seconds": round(busy, 3),
+                    "utilization": round(busy / uptime, 4),
+                }
+                for pid, busy in self._busy_seconds.items()
+            }
+            counters = {
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "rebuilds": self.rebuilds,
+            }
+
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": in_flight,
+            "queue_depth": max(0, in_flight - self.workers),
+            **counters,
+            "per_worker": workers,
+            "latency_ms": self.latency_ms_histogram.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms_histogram.snapshot(),
+            "run_ms": self.run_ms_histogram.snapshot(),
+        }
+
+
+_executor: Optional[InferenceExecutor] = None
+
+
+def get_inference_executor() -> Optional[InferenceExecutor]:
+    """Pool de inferencia activo, o None si está desactivado (se usan hilos)."""
+    return _executor
+
+
+def start_inference_executor(workers: int, max_queue: int, start_method: str = "spawn") -> Optional[InferenceExecutor]:
+    """Crea el pool global (workers <= 0 lo desactiva)."""
+    global _executor
+    if workers <= 0:
+        return None
+    if _executor is None:
+        _executor = InferenceExecutor(workers=workers, max_queue=max_queue, start_method=start_method)
+    return _executor
+
+
+def stop_inference_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.ml.predictor import predict_risk, predict_risk_batch
+from app.utils.metrics import BATCH_SIZE_BUCKETS, Histogram
+
+if TYPE_CHECKING:
+    from app.services.inference_executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+_PendingItem = Tuple[Dict[str, Any], "asyncio.Future[Tuple[Dict[str, Any], float]]", float]
+
+
+def score_profiles(
+    model_type: str,
+    profiles: List[Dict[str, Any]],
+    score_batch: Callable[..., List[Dict[str, Any]]] = predict_risk_batch,
+    score_one: Callable[..., Dict[str, Any]] = predict_risk,
+) -> Tuple[List[Any], bool]:
+    """
+    Evalúa un lote completo; si un perfil es inválido, aísla el error evaluando uno a uno.
+
+    Retorna (resultados o excepciones por perfil, si hubo que evaluar uno a uno).
+    Es una función de módulo para poder ejecutarse en el pool de procesos.
+    """
+    try:
+        return score_batch(profiles, model_type=model_type), False
+    except ValueError as exc:
+        logger.warning("Lote con perfil inválido (%s); evaluando %s perfiles individualmente", exc, len(profiles))
+
+    results: List[Any] = []
+    for params in profiles:
+        try:
+            results.append(score_one(model_type=model_type, **params))
+        except Exception as exc:
+            results.append(exc)
+    return results, True
+
+
+class MicroBatcher:
+    """
+    Agrupa predicciones concurrentes en lotes por modelo.
+
+    Si no hay un lote en curso para el modelo, la solicitud se evalúa de
+    inmediato (sin latencia extra con baja concurrencia). Mientras un lote
+    está en curso, las nuevas solicitudes esperan como máximo ``max_wait_ms``
+    (o hasta juntar ``max_batch_size``); cada lote se evalúa con un solo
+    ``predict_risk_batch`` en un hilo, sin bloquear el event loop, y cada
+    llamador recibe su resultado en su propio future.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 3.0,
+        score_batch: Callable[..., List[Dict[str, Any]]] = predict_risk_batch,
+        score_one: Callable[..., Dict[str, Any]] = predict_risk,
+        executor: Optional["InferenceExecutor"] = None,
+    ):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self._score_batch = score_batch
+        self._score_one = score_one
+        self._executor = executor
+        self._pending: Dict[str, List[_PendingItem]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._in_flight: Dict[str, int] = {}
+
+        self.batch_size_histogram = Histogram(BATCH_SIZE_BUCKETS)
+        self.wait_ms_histogram = Histogram()
+        self.batch_ms_histogram = Histogram()
+        self.fallbacks = 0
+
+    def attach_executor(self, executor: Optional["InferenceExecutor"]) -> None:
+        """Evalúa los lotes en ``executor`` (pool de procesos); None vuelve a usar hilos."""
+        self._executor = executor
+
+    async def submit(self, model_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Encola un perfil (kwargs de predict_risk) y espera el resultado de su lote."""
+        result, _ = await self.submit_timed(model_type, params)
+        return result
+
+    async def submit_timed(self, model_type: str, params: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+        """
+        Como ``submit``, pero retorna (resultado, ms de cómputo por fila): la
+        evaluación del lote dividida por su tamaño, sin la espera ni la cola.
+        """
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[Tuple[Dict[str, Any], float]]" = loop.create_future()
+
+        pending = self._pending.setdefault(model_type, [])
+        pending.append((params, future, time.perf_counter()))
+
+        if len(pending) >= self.max_batch_size or not self._in_flight.get(model_type):
+            self._flush(model_type)
+        elif len(pending) == 1:
+            self._timers[model_type] = loop.call_later(self.max_wait_ms / 1000, self._flush, model_type)
+
+        return await future
+
+    def _flush(self, model_type: str) -> None:
+        timer = self._timers.pop(model_type, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(model_type, None)
+        if not batch:
+            return
+
+        self._in_flight[model_type] = self._in_flight.get(model_type, 0) + 1
+        task = asyncio.get_running_loop().create_task(self._run(model_type, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, model_type: str, batch: List[_PendingItem]) -> None:
+        started = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            self.wait_ms_histogram.observe((started - enqueued_at) * 1000)
+        self.batch_size_histogram.observe(len(batch))
+
+        try:
+            results, run_ms = await self._dispatch(model_type, [params for params, _, _ in batch])
+        except Exception as exc:
+            logger.error("Error evaluando lote de %s predicciones (%s): %s", len(batch), model_type, exc, exc_info=True)
+            results, run_ms = [exc] * len(batch), 0.0
+
+        self.batch_ms_histogram.observe((time.perf_counter() - started) * 1000)
+        self._in_flight[model_type] -= 1
+        if self._pending.get(model_type):
+            # Lo que se acumuló mientras corría este lote sale sin esperar el timer
+            self._flush(model_type)
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():  # el llamador se desconectó / canceló
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result((result, run_ms / len(batch)))
+
+    def _score(self, model_type: str, profiles: List[Dict[str, Any]]) -> Tuple[List[Any], float]:
+        started = time.perf_counter()
+        results, fell_back = score_profiles(model_type, profiles, self._score_batch, self._score_one)
+        run_ms = (time.perf_counter() - started) * 1000
+        if fell_back:
+            self.fallbacks += 1
+        return results, run_ms
+
+    async def _dispatch(self, model_type: str, profiles: List[Dict[str, Any]]) -> Tuple[List[Any], float]:
+        """Evalúa el lote en el pool de procesos si está activo, o en un hilo; retorna (resultados, ms)."""
+        if self._executor is not None:
+            (results, fell_back), run_ms = await self._executor.submit_timed(score_profiles, model_type, profiles)
+            if fell_back:
+                self.fallbacks += 1
+            return results, run_ms
+        return await asyncio.to_thread(self._score, model_type, profiles)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "pending": sum(len(items) for items in self._pending.values()),
+            "fallbacks": self.fallbacks,
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "wait_ms": self.wait_ms_histogram.snapshot(),
+            "batch_ms": self.batch_ms_histogram.snapshot(),
+        }
@@ -1,88 +1,428 @@
+import asyncio
+import copy
 import logging
-from app.schemas.analisis_schema import AnalisisEntrada
-from app.ml.predictor import predict_risk
+import math
+import time
+from typing import Hashable, List
+from app.core.config import settings
+from app.schemas.analisis_schema import AnalisisEntrada, RangoNumerico, SimulacionEntrada
+from app.ml.model_loader import get_active_model
+from app.ml.profile import PROFILE_FIELDS, RiskProfile
+from app.ml.predictor import predict_risk, predict_risk_batch, simulate_risk_grid
+from app.services.inference_executor import InferenceExecutor, InferenceQueueFull, get_inference_executor
+from app.services.micro_batcher import MicroBatcher, score_profiles
+from app.services.shadow_scoring import get_shadow_scorer
+from app.utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Decimales usados para canonicalizar los campos numéricos en la clave de caché
+CACHE_FEATURE_DECIMALS = 4
+
+_prediction_cache = TTLCache(
+    maxsize=settings.PREDICTION_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PREDICTION_CACHE_TTL_SECONDS,
+)
+
+_micro_batcher = MicroBatcher(
+    max_batch_size=settings.PREDICT_MICROBATCH_MAX_SIZE,
+    max_wait_ms=settings.PREDICT_MICROBATCH_WAIT_MS,
+)
+
+ACTIVITY_DAYS_MAP = {
+    "sedentario": 0,
+    "ligero": 2,
+    "moderado": 4,
+    "activo": 6,
+    "muy_activo": 7
+}
+
+
+def construir_perfil(data: AnalisisEntrada) -> RiskProfile:
+    """
+    Traduce datos ya validados a un RiskProfile con los argumentos de
+    predict_risk (IMC derivado, cigarrillos/día y días de actividad física).
+
+    Solo lee atributos, así que acepta un AnalisisEntrada o cualquier objeto
+    validado con los mismos campos (p.ej. PredictionData del chat).
+    """
+    height_cm = data.altura_cm
+    weight_kg = data.peso_kg
+
+    if data.imc is not None:
+        bmi = data.imc
+    elif height_cm is not None and weight_kg is not None:
+        try:
+            bmi = weight_kg / ((height_cm / 100) ** 2)
+        except ZeroDivisionError:
+            bmi = None
+    else:
+        bmi = None
+
+    smokes_cig_day = None
+    if data.tabaquismo is not None:
+        smokes_cig_day = 10 if data.tabaquismo else 0
+
+    days_mvpa_week = None
+    if data.actividad_fisica is not None:
+        days_mvpa_week = ACTIVITY_DAYS_MAP.get(data.actividad_fisica.lower(), 0)
+
+    return RiskProfile(
+        age=data.edad,
+        sex=data.genero,
+        height_cm=height_cm,
+        weight_kg=weight_kg,
+        waist_cm=data.circunferencia_cintura,
+        sleep_hours=data.horas_sueno,
+        smokes_cig_day=smokes_cig_day,
+        days_mvpa_week=days_mvpa_week,
+        bmi=bmi,
+        systolic_bp=data.presion_sistolica,
+        total_cholesterol=data.colesterol_total,
+        glucosa_mgdl=data.glucosa_mgdl,
+        hdl_mgdl=data.hdl_mgdl,
+        trigliceridos_mgdl=data.trigliceridos_mgdl,
+        ldl_mgdl=data.ldl_mgdl,
+    )
+
+
+def _construir_parametros_modelo(data: AnalisisEntrada) -> dict:
+    """Argumentos de predict_risk como dict (lotes, micro-batcher y simulación)."""
+    return construir_perfil(data).as_kwargs()
+
+
+def _formatear_resultado(result: dict, selected_model: str) -> dict:
+    # Preserve full driver objects with descriptions, values, and impact
+    return {
+        "score": result["score"],
+        "drivers": result["drivers"],
+        "drivers_approximate": result.get("drivers_approximate", False),
+        "categoria_riesgo": result["risk_level"],
+        "model_used": result.get("model_used", selected_model),
+        "model_version": result.get("model_version"),
+    }
+
+
+def _valor_clave(value):
+    if isinstance(value, float):
+        return None if math.isnan(value) else round(value, CACHE_FEATURE_DECIMALS)
+    return value
+
+
+def _clave_cache(model_type: str, params: dict | RiskProfile) -> Hashable:
+    """
+    Clave (modelo, versión, campos del perfil redondeados).
+
+    Es Python puro sobre los campos de entrada: se calcula en el event loop
+    sin construir la matriz de features ni tocar el modelo.
+    """
+    version = get_active_model(model_type).version
+    return (model_type, version, tuple(_valor_clave(params.get(name)) for name in PROFILE_FIELDS))
+
+
+def estadisticas_cache_predicciones() -> dict:
+    """Contadores de hits/misses/evictions de la caché de predicciones."""
+    return _prediction_cache.stats()
+
+
+def estadisticas_micro_batcher() -> dict:
+    """Histogramas de tamaño de lote y tiempo de espera del micro-batcher de /predict."""
+    return _micro_batcher.stats()
+
+
+def usar_executor_inferencia(executor: InferenceExecutor | None) -> None:
+    """Hace que el micro-batcher evalúe los lotes en el pool de procesos (None: hilos)."""
+    _micro_batcher.attach_executor(executor)
+
+
+def _error_cola_llena(e: InferenceQueueFull) -> dict:
+    logger.warning(f"Pool de inferencia saturado: {e}")
+    return {"error": f"Servicio de ML saturado, reintente en unos segundos: {e}", "status_code": 503}
+
+
+def _evaluar_en_sombra(model_type: str, params: List[dict], results: List[dict], primary_ms: float) -> None:
+    """
+    Ofrece perfiles ya respondidos al modelo candidato (no bloquea; ver ShadowScorer).
+
+    ``primary_ms`` es el tiempo de cómputo del modelo activo para ``params``,
+    sin esperas de micro-batch ni de cola, comparable al del candidato.
+    """
+    shadow = get_shadow_scorer()
+    if shadow is None:
+        return
+    try:
+        shadow.offer(model_type, params, results, primary_ms)
+    except Exception as e:
+        logger.warning(f"No se pudo encolar la evaluación en sombra: {e}")
+
+
+def _preparar_prediccion(data: AnalisisEntrada, model_type: str | None) -> tuple:
+    """Modelo seleccionado, parámetros de predict_risk y clave de caché (None si está desactivada)."""
+    selected_model = (model_type or data.modelo or "diabetes").lower()
+    params = _construir_parametros_modelo(data)
+    cache_key = _clave_cache(selected_model, params) if _prediction_cache.enabled else None
+    return selected_model, params, cache_key
+
+
+def obtener_prediccion_perfil(perfil: RiskProfile, model_type: str) -> dict:
+    """
+    Predicción para un RiskProfile ya construido (ruta rápida del chat).
+
+    El perfil llega validado desde el borde: se usa tal cual para la clave de
+    caché, predict_risk y el modo sombra, sin volver a validar ni copiar los datos.
+    """
+    try:
+        selected_model = model_type.lower()
+        cache_key = _clave_cache(selected_model, perfil) if _prediction_cache.enabled else None
+        cached = _buscar_en_cache(cache_key)
+        if cached is not None:
+            return cached
+
+        started = time.perf_counter()
+        result = predict_risk(model_type=selected_model, **perfil.as_kwargs())
+        _evaluar_en_sombra(selected_model, [perfil], [result], (time.perf_counter() - started) * 1000)
+
+        return _guardar_en_cache(cache_key, result, selected_model)
+
+    except Exception as e:
+        logger.error(f"Error procesando predicción: {e}", exc_info=True)
+        return {"error": f"Error inesperado en el servicio de ML: {e}"}
+
+
+def _buscar_en_cache(cache_key: Hashable | None) -> dict | None:
+    if cache_key is None:
+        return None
+    cached = _prediction_cache.get(cache_key)
+    if cached is not None:
+        logger.debug("📊 Resultado desde caché: score=%s, risk_level=%s", cached["score"], cached["categoria_riesgo"])
+        return copy.deepcopy(cached)
+    return None
+
+
+def _guardar_en_cache(cache_key: Hashable | None, result: dict, selected_model: str) -> dict:
+    formatted = _formatear_resultado(result, selected_model)
+    # Si hubo un cambio de versión durante la predicción, la clave ya no corresponde;
+    # los drivers aproximados (explicador saturado) tampoco se guardan
+    if (
+        cache_key is not None
+        and formatted["model_version"] in (None, cache_key[1])
+        and not formatted["drivers_approximate"]
+    ):
+        _prediction_cache.set(cache_key, copy.deepcopy(formatted))
+    return formatted
+
+
 def obtener_prediccion(data: AnalisisEntrada, model_type: str | None = None) -> dict:
     """
     Obtiene predicción de riesgo usando el modelo ML local.
     Cumple con el requisito A4 (Explicabilidad).
     """
-    
+
     try:
-        height_cm = data.altura_cm
-        weight_kg = data.peso_kg
-        
         selected_model = (model_type or data.modelo or "diabetes").lower()
+        perfil = construir_perfil(data)
+    except Exception as e:
+        logger.error(f"Error procesando predicción: {e}", exc_info=True)
+        return {"error": f"Error inesperado en el servicio de ML: {e}"}
+
+    # El detalle de entradas y tiempos por etapa lo registra predict_risk (muestreado)
+    return obtener_prediccion_perfil(perfil, selected_model)
+
+
+async def obtener_prediccion_async(data: AnalisisEntrada, model_type: str | None = None) -> dict:
+    """
+    Versión para endpoints async de obtener_prediccion.
+
+    Las solicitudes concurrentes se agrupan en el micro-batcher (un solo
+    predict_proba y una sola pasada de drivers por lote y modelo) y se evalúan
+    fuera del event loop.
+    """
+    executor = get_inference_executor()
+    if not settings.PREDICT_MICROBATCH_ENABLED and executor is None:
+        return await asyncio.to_thread(obtener_prediccion, data, model_type)
 
-        if data.imc is not None:
-            bmi = data.imc
-        elif height_cm is not None and weight_kg is not None:
-            try:
-                bmi = weight_kg / ((height_cm / 100) ** 2)
-            except ZeroDivisionError:
-                bmi = None
+    try:
+        selected_model, params, cache_key = _preparar_prediccion(data, model_type)
+
+        cached = _buscar_en_cache(cache_key)
+        if cached is not None:
+            return cached
+
+        if settings.PREDICT_MICROBATCH_ENABLED:
+            result, run_ms = await _micro_batcher.submit_timed(selected_model, params)
         else:
-            bmi = None
-        
-        waist_cm = data.circunferencia_cintura
-        
-        sleep_hours = data.horas_sueno
-        
-        smokes_cig_day = None
-        if data.tabaquismo is not None:
-            smokes_cig_day = 10 if data.tabaquismo else 0
-        
-        days_mvpa_week = None
-        if data.actividad_fisica is not None:
-            activity_map = {
-                "sedentario": 0,
-                "ligero": 2,
-                "moderado": 4,
-                "activo": 6,
-                "muy_activo": 7
-            }
-            days_mvpa_week = activity_map.get(data.actividad_fisica.lower(), 0)
-        
-        logger.info(f"📊 Llamando predict_risk con modelo '{selected_model}':")
-        logger.info(f"   edad={data.edad}, sexo={data.genero}, altura={height_cm}, peso={weight_kg}")
-        logger.info(f"   IMC={bmi}, cintura={waist_cm}, sueño={sleep_hours}")
-        logger.info(f"   tabaquismo={data.tabaquismo} (→ {smokes_cig_day} cig/día), actividad={data.actividad_fisica} (→ {days_mvpa_week} días)")
-        logger.info(f"   presión_sistólica={data.presion_sistolica}, colesterol_total={data.colesterol_total}")
-        logger.info(f"   glucosa={data.glucosa_mgdl}, hdl={data.hdl_mgdl}, ldl={data.ldl_mgdl}, trig={data.trigliceridos_mgdl}")
-        
-        result = predict_risk(
-            age=data.edad,
-            sex=data.genero,
-            height_cm=height_cm,
-            weight_kg=weight_kg,
-            waist_cm=waist_cm,
-            sleep_hours=sleep_hours,
-            smokes_cig_day=smokes_cig_day,
-            days_mvpa_week=days_mvpa_week,
-            bmi=bmi,
-            systolic_bp=data.presion_sistolica,
-            total_cholesterol=data.colesterol_total,
-            model_type=selected_model,
-            glucosa_mgdl=data.glucosa_mgdl,
-            hdl_mgdl=data.hdl_mgdl,
-            trigliceridos_mgdl=data.trigliceridos_mgdl,
-            ldl_mgdl=data.ldl_mgdl
-        )
-        
-        logger.info(f"📊 Resultado: score={result.get('score')}, risk_level={result.get('risk_level')}")
-        
-        # Preserve full driver objects with descriptions, values, and impact
-        drivers_full = result['drivers']
-        
+            (results, _), run_ms = await executor.submit_timed(score_profiles, selected_model, [params])
+            result = results[0]
+            if isinstance(result, Exception):
+                raise result
+        _evaluar_en_sombra(selected_model, [params], [result], run_ms)
+        return _guardar_en_cache(cache_key, result, selected_model)
+
+    except InferenceQueueFull as e:
+        return _error_cola_llena(e)
+    except Exception as e:
+        logger.error(f"Error procesando predicción: {e}", exc_info=True)
+        return {"error": f"Error inesperado en el servicio de ML: {e}"}
+
+
+def obtener_predicciones_lote(registros: List[AnalisisEntrada], model_type: str | None = None) -> dict:
+    """
+    Obtiene predicciones para muchos registros con una sola pasada del modelo
+    (una matriz de features, una imputación, un predict_proba y una explicación).
+    """
+    selected_model = (model_type or "diabetes").lower()
+
+    try:
+        params = [_construir_parametros_modelo(registro) for registro in registros]
+        logger.debug("📊 Llamando predict_risk_batch con modelo '%s' para %s registros", selected_model, len(params))
+
+        started = time.perf_counter()
+        results = predict_risk_batch(params, model_type=selected_model)
+        _evaluar_en_sombra(selected_model, params, results, (time.perf_counter() - started) * 1000)
+
         return {
-            "score": result["score"],
-            "drivers": drivers_full,
-            "categoria_riesgo": result["risk_level"],
-            "model_used": result.get("model_used", selected_model)
+            "model_used": selected_model,
+            "resultados": [_formatear_resultado(result, selected_model) for result in results]
         }
-    
+
+    except ValueError as e:
+        # Entradas inválidas (p.ej. sin IMC ni altura/peso): error del cliente
+        logger.warning(f"Lote de predicción inválido: {e}")
+        return {"error": f"Datos de entrada inválidos: {e}", "status_code": 400}
     except Exception as e:
-        logger.error(f"Error procesando predicción: {e}", exc_info=True)
-        return {"error": f"Error inesperado en el servicio de ML: {e}"}
\ No newline at end of file
+        logger.error(f"Error procesando lote de predicciones: {e}", exc_info=True)
+        return {"error": f"Error inesperado en el servicio de ML: {e}"}
+
+
+async def obtener_predicciones_lote_async(registros: List[AnalisisEntrada], model_type: str | None = None) -> dict:
+    """
+    Versión async de obtener_predicciones_lote: el lote se evalúa en el pool
+    de procesos si está activo, o en un hilo, sin bloquear el event loop.
+    """
+    executor = get_inference_executor()
+    if executor is None:
+        return await asyncio.to_thread(obtener_predicciones_lote, registros, model_type)
+
+    selected_model = (model_type or "diabetes").lower()
+    try:
+        params = [_construir_parametros_modelo(registro) for registro in registros]
+        logger.debug("📊 Enviando lote de %s registros al pool de inferencia ('%s')", len(params), selected_model)
+
+        results, run_ms = await executor.submit_timed(predict_risk_batch, params, selected_model)
+        _evaluar_en_sombra(selected_model, params, results, run_ms)
+
+        return {
+            "model_used": selected_model,
+            "resultados": [_formatear_resultado(result, selected_model) for result in results]
+        }
+
+    except InferenceQueueFull as e:
+        return _error_cola_llena(e)
+    except ValueError as e:
+        logger.warning(f"Lote de predicción inválido: {e}")
+        return {"error": f"Datos de entrada inválidos: {e}", "status_code": 400}
+    except Exception as e:
+        logger.error(f"Error procesando lote de predicciones: {e}", exc_info=True)
+        return {"error": f"Error inesperado en el servicio de ML: {e}"}
+
+
+# Factor modificable de SimulacionEntrada -> (argumento de predict_risk, traducción del valor)
+_FACTORES_SIMULACION = {
+    "peso_kg": ("weight_kg", float),
+    "circunferencia_cintura": ("waist_cm", float),
+    "horas_sueno": ("sleep_hours", float),
+    "tabaquismo": ("smokes_cig_day", lambda fuma: 10 if fuma else 0),
+    "actividad_fisica": ("days_mvpa_week", lambda nivel: ACTIVITY_DAYS_MAP[nivel.lower()]),
+}
+
+
+def _valores_factor(valores) -> list:
+    """Lista de valores a probar (expande un RangoNumerico, extremos incluidos)."""
+    if not isinstance(valores, RangoNumerico):
+        return list(valores)
+    if valores.paso <= 0 or valores.max < valores.min:
+        raise ValueError(f"Rango inválido: {valores}")
+    pasos = int(math.floor((valores.max - valores.min) / valores.paso + 1e-9))
+    return [round(valores.min + i * valores.paso, 4) for i in range(pasos + 1)]
+
+
+def _preparar_simulacion(entrada: SimulacionEntrada) -> tuple:
+    """Modelo, perfil base, grilla (en argumentos de predict_risk) y ejes con los valores originales."""
+    selected_model = (entrada.modelo or entrada.perfil.modelo or "diabetes").lower()
+    perfil = _construir_parametros_modelo(entrada.perfil)
+
+    grid, ejes = {}, {}
+    for factor, (campo, traducir) in _FACTORES_SIMULACION.items():
+        valores = getattr(entrada, factor)
+        if not valores:
+            continue
+        ejes[factor] = _valores_factor(valores)
+        try:
+            grid[campo] = [traducir(valor) for valor in ejes[factor]]
+        except KeyError as e:
+            raise ValueError(f"Valor no soportado para {factor}: {e}") from e
+    return selected_model, perfil, grid, ejes
+
+
+def _formatear_simulacion(result: dict, ejes: dict) -> dict:
+    """Traduce la superficie de simulate_risk_grid a los nombres y valores de la entrada."""
+    factor_por_campo = {campo: factor for factor, (campo, _) in _FACTORES_SIMULACION.items()}
+    indice_por_campo = {
+        campo: {valor: i for i, valor in enumerate(valores)} for campo, valores in result["axes"].items()
+    }
+
+    mejor = None
+    if result["best"] is not None:
+        mejor = {
+            "valores": {
+                factor_por_campo[campo]: ejes[factor_por_campo[campo]][indice_por_campo[campo][valor]]
+                for campo, valor in result["best"]["values"].items()
+            },
+            "score": result["best"]["score"],
+            "categoria_riesgo": result["best"]["risk_level"],
+        }
+
+    return {
+        "model_used": result["model_used"],
+        "model_version": result["model_version"],
+        "base": {"score": result["baseline"]["score"], "categoria_riesgo": result["baseline"]["risk_level"]},
+        "ejes": ejes,
+        "scores": result["scores"],
+        "categorias": result["risk_levels"],
+        "efectos": {
+            factor_por_campo[campo]: [
+                {"valor": valor, "score": punto["score"], "categoria_riesgo": punto["risk_level"]}
+                for valor, punto in zip(ejes[factor_por_campo[campo]], puntos)
+            ]
+            for campo, puntos in result["marginal"].items()
+        },
+        "mejor": mejor,
+        "total_variantes": result["variants"],
+    }
+
+
+async def simular_escenarios_async(entrada: SimulacionEntrada) -> dict:
+    """
+    Superficie de riesgo "qué pasaría si" para un perfil: todas las combinaciones
+    de factores modificables se evalúan con una sola matriz de features y un solo
+    predict_proba (en el pool de procesos si está activo, o en un hilo).
+    """
+    try:
+        selected_model, perfil, grid, ejes = _preparar_simulacion(entrada)
+        args = (perfil, grid, selected_model, settings.WHAT_IF_MAX_VARIANTS)
+
+        executor = get_inference_executor()
+        if executor is not None:
+            result = await executor.submit(simulate_risk_grid, *args)
+        else:
+            result = await asyncio.to_thread(simulate_risk_grid, *args)
+        return _formatear_simulacion(result, ejes)
+
+    except InferenceQueueFull as e:
+        return _error_cola_llena(e)
+    except ValueError as e:
+        logger.warning(f"Simulación inválida: {e}")
+        return {"error": f"Datos de simulación inválidos: {e}", "status_code": 400}
+    except Exception as e:
+        logger.error(f"Error en la simulación de escenarios: {e}", exc_info=True)
+        return {"error": f"Error inesperado en el servicio de ML: {e}"}
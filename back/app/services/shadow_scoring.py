@@ -0,0 +1,181 @@
+import logging
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.ml.model_loader import ModelVersion, load_candidate_model
+from app.ml.predictor import predict_risk_batch_for_version
+
+logger = logging.getLogger(__name__)
+
+
+def _percentil(values: List[float], q: float) -> Optional[float]:
+    return round(float(np.percentile(values, q)), 6) if values else None
+
+
+class ShadowScorer:
+    """
+    Evalúa un modelo candidato en modo sombra sobre una fracción del tráfico real.
+
+    ``offer`` se llama después de tener la respuesta del modelo activo: decide
+    por muestreo si el perfil se evalúa con el candidato y, si es así, lo
+    encola en un hilo propio sin esperar el resultado. Con más de
+    ``max_pending`` evaluaciones pendientes la muestra se descarta, así la
+    sombra nunca acumula trabajo ni agrega latencia a la respuesta.
+
+    Las últimas ``window`` comparaciones (delta de score, acuerdo de categoría
+    de riesgo y latencia de cada modelo) alimentan las estadísticas móviles.
+    """
+
+    def __init__(
+        self,
+        candidate: ModelVersion,
+        sample_rate: float = 0.1,
+        max_pending: int = 32,
+        window: int = 1000,
+    ):
+        self.candidate = candidate
+        self.model_type = candidate.model_type
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.max_pending = max(1, max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._records: deque = deque(maxlen=max(1, window))
+        self.offered = 0
+        self.sampled = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def offer(self, model_type: str, profiles: List[Dict[str, Any]], results: List[Dict[str, Any]], primary_ms: float) -> bool:
+        """
+        Ofrece perfiles ya evaluados por el modelo activo (kwargs de predict_risk
+        o RiskProfile, y sus resultados); retorna True si se encolaron para la sombra.
+        """
+        if model_type != self.model_type or not profiles:
+            return False
+
+        with self._lock:
+            self.offered += len(profiles)
+            if random.random() >= self.sample_rate:
+                return False
+            if self._pending >= self.max_pending:
+                self.dropped += len(profiles)
+                return False
+            self._pending += 1
+            self.sampled += len(profiles)
+
+        per_row_ms = primary_ms / len(profiles)
+        self._pool.submit(self._score, list(profiles), list(results), per_row_ms)
+        return True
+
+    def _score(self, profiles: List[Dict[str, Any]], results: List[Dict[str, Any]], primary_ms: float) -> None:
+        try:
+            started = time.perf_counter()
+            shadow_results = predict_risk_batch_for_version(self.candidate, profiles)
+            shadow_ms = (time.perf_counter() - started) * 1000 / len(profiles)
+        except Exception as e:
+            logger.warning("Evaluación en sombra de %s falló: %s", self.candidate.version, e)
+            with self._lock:
+                self.failed += len(profiles)
+                self._pending -= 1
+            return
+
+        with self._lock:
+            self._pending -= 1
+            for primary, shadow in zip(results, shadow_results):
+                self._records.append((
+                    shadow["score"] - primary["score"],
+                    primary["risk_level"],
+                    shadow["risk_level"],
+                    primary_ms,
+                    shadow_ms,
+                ))
+
+    def wait_idle(self, timeout: float = 5.0) -> bool:
+        """Espera a que no queden evaluaciones pendientes (útil en pruebas)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if self._pending == 0:
+                    return True
+            time.sleep(0.005)
+        return False
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            records = list(self._records)
+            counters = {
+                "offered": self.offered,
+                "sampled": self.sampled,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "pending": self._pending,
+            }
+
+        deltas = [record[0] for record in records]
+        abs_deltas = [abs(delta) for delta in deltas]
+        transitions = Counter(f"{primary}->{shadow}" for _, primary, shadow, _, _ in records)
+        agreements = sum(1 for _, primary, shadow, _, _ in records if primary == shadow)
+
+        return {
+            "model_type": self.model_type,
+            "candidate_version": self.candidate.version,
+            "candidate_source": str(self.candidate.path or self.candidate.source),
+            "sample_rate": self.sample_rate,
+            **counters,
+            "window": len(records),
+            "score_delta": {
+                "mean": round(float(np.mean(deltas)), 6) if deltas else None,
+                "mean_abs": round(float(np.mean(abs_deltas)), 6) if deltas else None,
+                "p95_abs": _percentil(abs_deltas, 95),
+                "max_abs": round(max(abs_deltas), 6) if deltas else None,
+            },
+            "category_agreement": round(agreements / len(records), 4) if records else None,
+            "category_transitions": dict(transitions),
+            "latency_ms_per_row": {
+                "primary": {"p50": _percentil([r[3] for r in records], 50), "p95": _percentil([r[3] for r in records], 95)},
+                "candidate": {"p50": _percentil([r[4] for r in records], 50), "p95": _percentil([r[4] for r in records], 95)},
+            },
+        }
+
+
+_shadow: Optional[ShadowScorer] = None
+
+
+def get_shadow_scorer() -> Optional[ShadowScorer]:
+    """Evaluador en sombra activo, o None si no hay modelo candidato configurado."""
+    return _shadow
+
+
+def start_shadow_scorer(
+    model_type: str,
+    candidate: str,
+    sample_rate: float,
+    max_pending: int = 32,
+    window: int = 1000,
+) -> Optional[ShadowScorer]:
+    """Carga el candidato y crea el evaluador global (candidato vacío o tasa 0 lo desactivan)."""
+    global _shadow
+    if not candidate or sample_rate <= 0:
+        return None
+    if _shadow is None:
+        version = load_candidate_model(model_type, candidate)
+        _shadow = ShadowScorer(version, sample_rate=sample_rate, max_pending=max_pending, window=window)
+        logger.info("Modo sombra activo: %s %s sobre %.0f%% del tráfico", model_type, version.version, _shadow.sample_rate * 100)
+    return _shadow
+
+
+def stop_shadow_scorer() -> None:
+    global _shadow
+    if _shadow is not None:
+        _shadow.shutdown()
+        _shadow = None
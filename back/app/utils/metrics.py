@@ -0,0 +1,157 @@
+import bisect
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Default bucket upper bounds (milliseconds) for latency histograms
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Default bucket upper bounds for batch-size histograms
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Histogram:
+    """
+    Thread-safe fixed-bucket histogram (cumulative counts like Prometheus).
+
+    ``snapshot()`` returns count/sum/min/max/mean, bucket counts and quantile
+    estimates (upper bound of the bucket holding the quantile).
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._lock = threading.Lock()
+        self._count = 0
+        self._sum = 0.0
+        self._min: Optional[float] = None
+        self._max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._count += 1
+            self._sum += value
+            self._min = value if self._min is None else min(self._min, value)
+            self._max = value if self._max is None else max(self._max, value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._count = 0
+            self._sum = 0.0
+            self._min = None
+            self._max = None
+
+    def _quantile(self, q: float) -> Optional[float]:
+        if not self._count:
+            return None
+        rank = q * self._count
+        cumulative = 0
+        for idx, count in enumerate(self._counts):
+            cumulative += count
+            if cumulative >= rank:
+                return self.buckets[idx] if idx < len(self.buckets) else self._max
+        return self._max
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(self.buckets, self._counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = self._count
+
+            return {
+                "count": self._count,
+                "sum": round(self._sum, 4),
+                "min": self._min,
+                "max": self._max,
+                "mean": round(self._sum / self._count, 4) if self._count else None,
+                "p50": self._quantile(0.50),
+                "p95": self._quantile(0.95),
+                "p99": self._quantile(0.99),
+                "buckets": buckets,
+            }
+
+
+class StageMetrics:
+    """
+    Latency histograms per (model, mode, stage), e.g. ("diabetes", "single", "explain").
+
+    Call sites time consecutive stages with a ``StageTimer`` from ``timer()``.
+    With ``start_forwarding()`` raw observations are also kept until
+    ``drain_forwarded()``, so another process can record them (pool workers).
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        self._lock = threading.Lock()
+        self._forwarded: Optional[List[Tuple[str, str, str, float]]] = None
+
+    def observe(self, model: str, mode: str, stage: str, value_ms: float) -> None:
+        key = (model, mode, stage)
+        forwarded = self._forwarded
+        if forwarded is not None:
+            forwarded.append((model, mode, stage, value_ms))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(value_ms)
+
+    def timer(self, model: str, mode: str) -> "StageTimer":
+        return StageTimer(self, model, mode)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+    def start_forwarding(self) -> None:
+        with self._lock:
+            if self._forwarded is None:
+                self._forwarded = []
+
+    def drain_forwarded(self) -> List[Tuple[str, str, str, float]]:
+        """Observations since the previous drain (empty unless forwarding)."""
+        with self._lock:
+            if self._forwarded is None:
+                return []
+            drained, self._forwarded = self._forwarded, []
+        return drained
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Nested {model: {mode: {stage: histogram snapshot}}}."""
+        with self._lock:
+            items = list(self._histograms.items())
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (model, mode, stage), histogram in sorted(items):
+            result.setdefault(model, {}).setdefault(mode, {})[stage] = histogram.snapshot()
+        return result
+
+
+class StageTimer:
+    """Times consecutive stages of one call; ``finish()`` records them plus the total."""
+
+    __slots__ = ("_metrics", "_model", "_mode", "_started", "_last", "laps")
+
+    def __init__(self, metrics: StageMetrics, model: str, mode: str):
+        self._metrics = metrics
+        self._model = model
+        self._mode = mode
+        self._started = self._last = time.perf_counter()
+        self.laps: Dict[str, float] = {}
+
+    def lap(self, stage: str) -> None:
+        """Close ``stage``: time since the previous lap (or the start)."""
+        now = time.perf_counter()
+        self.laps[stage] = self.laps.get(stage, 0.0) + (now - self._last) * 1000
+        self._last = now
+
+    def finish(self) -> Dict[str, float]:
+        self.laps["total"] = (time.perf_counter() - self._started) * 1000
+        for stage, value_ms in self.laps.items():
+            self._metrics.observe(self._model, self._mode, stage, value_ms)
+        return self.laps
@@ -0,0 +1,340 @@
+"""
+Inference benchmark for the diabetes and cardiovascular risk models.
+
+Profiles are sampled from the NHANES 2017-2020 extract so feature engineering,
+imputation and the explainers see realistic (and realistically incomplete)
+inputs. For each model it measures:
+
+- cold: a fresh interpreter importing the predictor and scoring one profile
+  (model load, explainer build and first call), in a subprocess;
+- single: warm ``predict_risk`` calls, one profile at a time;
+- batch: warm ``predict_risk_batch`` calls for each batch size;
+
+each with SHAP drivers on and off, reporting p50/p95/p99 latency, throughput
+and peak RSS as JSON. The peak RSS of a warm scenario is its own: it is reset
+before the scenario through /proc/self/clear_refs (Linux; elsewhere only cold
+scenarios report it). ``--compare`` checks the run against a stored baseline
+and exits with 1 when a scenario regressed beyond ``--tolerance``.
+
+Usage (from back/):
+    python -m benchmarks.predict_bench --output bench.json
+    python -m benchmarks.predict_bench --save-baseline benchmarks/baseline.json
+    python -m benchmarks.predict_bench --compare benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+MODEL_TYPES = ("diabetes", "cardiovascular")
+DEFAULT_BATCH_SIZES = (1, 8, 64, 256, 1024)
+
+# Metrics checked by --compare: (path in the result, True if higher is better)
+COMPARED_METRICS = (
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("throughput_rows_s",), True),
+    (("peak_rss_mb",), False),
+)
+
+
+def _peak_rss_mb() -> float:
+    # VmHWM is the peak since the last _reset_peak_rss; ru_maxrss (KiB on
+    # Linux, bytes on macOS) is the peak of the whole process
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _reset_peak_rss() -> bool:
+    """Resets VmHWM to the current RSS so the next scenario reports its own peak (Linux only)."""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        return False
+    return True
+
+
+def _summary(latencies_ms: Sequence[float], rows_per_call: int, peak_rss_mb: Optional[float]) -> Dict[str, Any]:
+    values = np.asarray(latencies_ms, dtype=float)
+    total_s = values.sum() / 1000
+    return {
+        "repeats": int(values.size),
+        "latency_ms": {
+            "p50": round(float(np.percentile(values, 50)), 4),
+            "p95": round(float(np.percentile(values, 95)), 4),
+            "p99": round(float(np.percentile(values, 99)), 4),
+            "mean": round(float(values.mean()), 4),
+        },
+        "throughput_rows_s": round(values.size * rows_per_call / total_s, 1) if total_s > 0 else None,
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+
+def result_key(result: Dict[str, Any]) -> str:
+    """Stable identifier of a scenario, used to match runs against a baseline."""
+    return "{model}/{scenario}/b{batch_size}/{shap}".format(
+        shap="shap" if result["explain"] else "noshap", **result
+    )
+
+
+def load_profiles(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """``count`` NHANES profiles sampled (with replacement if needed) in a reproducible order."""
+    from app.ml.nhanes import load_nhanes_profiles
+
+    profiles = load_nhanes_profiles()
+    rng = random.Random(seed)
+    if count <= len(profiles):
+        return rng.sample(profiles, count)
+    return [rng.choice(profiles) for _ in range(count)]
+
+
+def _cold_probe(model_type: str, explain: bool) -> Dict[str, Any]:
+    """Runs inside a fresh interpreter: import + first prediction."""
+    started = time.perf_counter()
+    from app.ml.predictor import predict_risk
+
+    imported = time.perf_counter()
+    profile = load_profiles(1)[0]
+    loaded = time.perf_counter()
+    predict_risk(model_type=model_type, explain=explain, **profile)
+    finished = time.perf_counter()
+    return {
+        "import_ms": round((imported - started) * 1000, 2),
+        "first_predict_ms": round((finished - loaded) * 1000, 2),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def measure_cold(model_type: str, explain: bool, runs: int = 3) -> Dict[str, Any]:
+    """Cold start in ``runs`` fresh subprocesses; latency is the first ``predict_risk`` call."""
+    probes = []
+    for _ in range(runs):
+        command = [sys.executable, "-m", "benchmarks.predict_bench", "--cold-probe", model_type]
+        if not explain:
+            command.append("--no-shap")
+        output = subprocess.run(
+            command, cwd=Path(__file__).resolve().parents[1], capture_output=True, text=True, check=True
+        ).stdout
+        probes.append(json.loads(output.strip().splitlines()[-1]))
+
+    result = _summary(
+        [probe["first_predict_ms"] for probe in probes],
+        rows_per_call=1,
+        peak_rss_mb=max(probe["peak_rss_mb"] for probe in probes),
+    )
+    result["import_ms"] = round(float(np.median([probe["import_ms"] for probe in probes])), 2)
+    return result
+
+
+def measure_single(model_type: str, profiles: List[Dict[str, Any]], explain: bool, repeats: int) -> Dict[str, Any]:
+    from app.ml.predictor import predict_risk
+
+    tracked = _reset_peak_rss()
+    latencies = []
+    for i in range(repeats):
+        profile = profiles[i % len(profiles)]
+        started = time.perf_counter()
+        predict_risk(model_type=model_type, explain=explain, **profile)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return _summary(latencies, rows_per_call=1, peak_rss_mb=_peak_rss_mb() if tracked else None)
+
+
+def measure_batch(
+    model_type: str,
+    profiles: List[Dict[str, Any]],
+    batch_size: int,
+    explain: bool,
+    repeats: int,
+) -> Dict[str, Any]:
+    from app.ml.predictor import predict_risk_batch
+
+    tracked = _reset_peak_rss()
+    latencies = []
+    for i in range(repeats):
+        start = (i * batch_size) % max(1, len(profiles) - batch_size + 1)
+        batch = profiles[start:start + batch_size]
+        started = time.perf_counter()
+        predict_risk_batch(batch, model_type=model_type, explain=explain)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return _summary(latencies, rows_per_call=batch_size, peak_rss_mb=_peak_rss_mb() if tracked else None)
+
+
+def run_benchmark(
+    models: Sequence[str] = MODEL_TYPES,
+    batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES,
+    repeats: int = 200,
+    rows_budget: int = 20000,
+    cold_runs: int = 3,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Runs every scenario and returns ``{"meta": ..., "results": [...]}``.
+
+    Single calls are repeated ``repeats`` times; a batch size ``b`` is repeated
+    ``rows_budget // b`` times (at least 5, at most ``repeats``). ``cold_runs=0``
+    skips the cold-start subprocesses.
+    """
+    from app.ml.model_loader import get_active_model
+    from app.ml.predictor import predict_risk_batch
+
+    profiles = load_profiles(max(max(batch_sizes, default=1), repeats), seed=seed)
+    results: List[Dict[str, Any]] = []
+
+    for model_type in models:
+        for explain in (True, False):
+            if cold_runs > 0:
+                results.append({
+                    "model": model_type, "scenario": "cold", "batch_size": 1, "explain": explain,
+                    **measure_cold(model_type, explain, runs=cold_runs),
+                })
+
+            # Warm-up: model, explainer and feature plan built before timing
+            predict_risk_batch(profiles[:8], model_type=model_type, explain=explain)
+
+            results.append({
+                "model": model_type, "scenario": "single", "batch_size": 1, "explain": explain,
+                **measure_single(model_type, profiles, explain, repeats),
+            })
+            for batch_size in batch_sizes:
+                batch_repeats = min(repeats, max(5, rows_budget // batch_size))
+                results.append({
+                    "model": model_type, "scenario": "batch", "batch_size": batch_size, "explain": explain,
+                    **measure_batch(model_type, profiles, batch_size, explain, batch_repeats),
+                })
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "model_versions": {model_type: get_active_model(model_type).version for model_type in models},
+            "repeats": repeats,
+            "rows_budget": rows_budget,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def _metric(result: Dict[str, Any], path: Sequence[str]) -> Optional[float]:
+    value: Any = result
+    for part in path:
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.15) -> List[Dict[str, Any]]:
+    """
+    Scenarios of ``current`` that are worse than ``baseline`` by more than ``tolerance``.
+
+    Latencies regress when they grow by more than the tolerance, throughput
+    when it drops by more than it. Scenarios missing from either run are ignored.
+    """
+    baseline_by_key = {result_key(result): result for result in baseline.get("results", [])}
+    regressions = []
+    for result in current.get("results", []):
+        reference = baseline_by_key.get(result_key(result))
+        if reference is None:
+            continue
+        for path, higher_is_better in COMPARED_METRICS:
+            new, old = _metric(result, path), _metric(reference, path)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append({
+                    "scenario": result_key(result),
+                    "metric": ".".join(path),
+                    "baseline": old,
+                    "current": new,
+                    "change": round(change, 4),
+                })
+    return regressions
+
+
+def _print_table(report: Dict[str, Any]) -> None:
+    print(f"{'scenario':<40} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'rows/s':>12} {'rss MB':>8}", file=sys.stderr)
+    for result in report["results"]:
+        latency = result["latency_ms"]
+        print(
+            f"{result_key(result):<40} {latency['p50']:>10.3f} {latency['p95']:>10.3f} {latency['p99']:>10.3f} "
+            f"{result['throughput_rows_s'] or 0:>12.1f} {result['peak_rss_mb'] or 0:>8.1f}",
+            file=sys.stderr,
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark predict_risk for the risk models")
+    parser.add_argument("--model", choices=MODEL_TYPES, action="append", help="Model(s) to benchmark (default: both)")
+    parser.add_argument("--batch-sizes", type=lambda v: [int(x) for x in v.split(",")], default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--rows-budget", type=int, default=20000, help="Rows scored per batch size")
+    parser.add_argument("--cold-runs", type=int, default=3, help="Fresh processes per cold scenario (0 skips them)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--save-baseline", type=Path, default=None, help="Also store the report as a baseline")
+    parser.add_argument("--compare", type=Path, default=None, help="Baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative slowdown (default: 0.15)")
+    parser.add_argument("--cold-probe", choices=MODEL_TYPES, help=argparse.SUPPRESS)
+    parser.add_argument("--no-shap", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    # Input-validation warnings (e.g. extreme BMI in NHANES) would flood stderr
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.cold_probe:
+        print(json.dumps(_cold_probe(args.cold_probe, explain=not args.no_shap)))
+        return 0
+
+    report = run_benchmark(
+        models=args.model or MODEL_TYPES,
+        batch_sizes=args.batch_sizes,
+        repeats=args.repeats,
+        rows_budget=args.rows_budget,
+        cold_runs=args.cold_runs,
+        seed=args.seed,
+    )
+    _print_table(report)
+
+    exit_code = 0
+    if args.compare:
+        regressions = compare(report, json.loads(args.compare.read_text()), tolerance=args.tolerance)
+        report["comparison"] = {"baseline": str(args.compare), "tolerance": args.tolerance, "regressions": regressions}
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['scenario']} {regression['metric']}: "
+                f"{regression['baseline']} -> {regression['current']} ({regression['change']:+.1%})",
+                file=sys.stderr,
+            )
+        exit_code = 1 if regressions else 0
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(payload + "\n")
+    else:
+        print(payload)
+    if args.save_baseline:
+        args.save_baseline.write_text(payload + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
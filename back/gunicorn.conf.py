@@ -0,0 +1,20 @@
+# back/gunicorn.conf.py
+# Modo precarga: python main.py --preload  (o ./start_server.sh --preload)
+#
+# El maestro importa la app y precarga modelos, explicadores e índice de la KB
+# antes del fork; los workers comparten esa memoria copy-on-write.
+# Reporte de memoria por worker: GET /api/debug/memory
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '7860')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def when_ready(server):
+    # Corre en el maestro después de importar la app y antes de crear los workers
+    from app.core.preload import precargar_para_fork
+
+    precargar_para_fork()
@@ -1,14 +1,41 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from app.agents.rag_service import get_kb_store
+from app.core.config import settings
+from app.core.readiness import readiness_report, warm_up
+from app.ml.model_loader import get_model_registry
+from app.services.inference_executor import stop_inference_executor
+from app.services.shadow_scoring import stop_shadow_scorer
 from app.routes import ml_routes, users_routes, debug_routes, chat_routes
 import os
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El warm-up corre en segundo plano: el servidor acepta conexiones de
+    # inmediato y /health responde 503 hasta que los componentes estén listos.
+    warmup_task = None
+    if settings.WARMUP_ON_STARTUP:
+        warmup_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    stop_inference_executor()
+    get_model_registry().stop_watcher()
+    get_kb_store().stop_watcher()
+    stop_shadow_scorer()
+
+
 app = FastAPI(
     title="Health AI Backend (Hackathon NHANES)",
     version="2.0 - Conversational",
     description="FastAPI backend for health risk prediction and conversational AI coaching",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # CORS Configuration
@@ -71,10 +98,28 @@ def root():
 
 @app.get("/health")
 def health_check():
-    """Health check endpoint for monitoring."""
-    return {"status": "healthy", "service": "HealthAI Backend"}
+    """
+    Readiness check for the load balancer.
+
+    Returns 503 until the startup warm-up has loaded every required component,
+    with per-component status and load timings.
+    """
+    report = readiness_report()
+    return JSONResponse(
+        status_code=200 if report["ready"] else 503,
+        content={"service": "HealthAI Backend", **report},
+    )
 
 if __name__ == "__main__":
+    import sys
+
+    if "--preload" in sys.argv:
+        # Varios workers con modelos compartidos copy-on-write (ver gunicorn.conf.py)
+        from gunicorn.app.wsgiapp import run
+
+        sys.argv = ["gunicorn", "-c", os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py"), "main:app"]
+        sys.exit(run())
+
     import uvicorn
     port = int(os.getenv("PORT", 7860))
     uvicorn.run(
@@ -18,6 +18,12 @@ if [ ! -f ".env" ]; then
     echo "Asegúrate de tener configuradas las variables de entorno necesarias"
 fi
 
+# Modo producción: maestro con modelos precargados + workers (WEB_CONCURRENCY, por defecto 4)
+if [ "$1" == "--preload" ]; then
+    echo "Iniciando servidor con precarga de modelos (${WEB_CONCURRENCY:-4} workers) en el puerto ${PORT:-7860}"
+    exec gunicorn -c gunicorn.conf.py main:app
+fi
+
 # Iniciar el servidor con reload para desarrollo
 echo "Iniciando servidor backend en http://localhost:8000"
 echo "Presiona CTRL+C para detener"
@@ -1,4 +1,5 @@
 from fastapi.testclient import TestClient
+from app.core.readiness import wait_for_warmup
 from main import app
 
 client = TestClient(app)
@@ -7,3 +8,16 @@ def test_root():
     response = client.get("/")
     assert response.status_code == 200
     assert "Backend HealthAI" in response.text
+
+
+def test_health_reports_components_after_warmup():
+    with TestClient(app) as warm_client:
+        assert wait_for_warmup(timeout=120)
+        response = warm_client.get("/health")
+
+    body = response.json()
+    assert response.status_code == 200
+    assert body["ready"] is True
+    for component in ("model_diabetes", "model_cardiovascular", "prediction_diabetes"):
+        assert body["components"][component]["status"] == "ready"
+        assert body["components"][component]["load_ms"] is not None
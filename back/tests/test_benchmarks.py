@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from benchmarks.predict_bench import _peak_rss_mb, _reset_peak_rss, compare, result_key, run_benchmark
+
+
+def _result(p50, throughput, explain=True):
+    return {"model": "diabetes", "scenario": "batch", "batch_size": 64, "explain": explain,
+            "latency_ms": {"p50": p50, "p95": p50 * 2}, "throughput_rows_s": throughput}
+
+
+def test_compare_flags_only_regressions_beyond_tolerance():
+    baseline = {"results": [_result(10.0, 1000.0), _result(5.0, 2000.0, explain=False)]}
+    current = {"results": [_result(12.0, 800.0), _result(5.2, 1950.0, explain=False)]}
+
+    regressions = compare(current, baseline, tolerance=0.15)
+
+    assert {r["scenario"] for r in regressions} == {"diabetes/batch/b64/shap"}
+    assert {r["metric"] for r in regressions} == {"latency_ms.p50", "latency_ms.p95", "throughput_rows_s"}
+    assert compare(current, baseline, tolerance=0.5) == []
+
+
+def test_run_benchmark_reports_each_scenario():
+    report = run_benchmark(models=["cardiovascular"], batch_sizes=[4], repeats=3, cold_runs=0)
+
+    keys = [result_key(result) for result in report["results"]]
+    assert keys == [
+        "cardiovascular/single/b1/shap", "cardiovascular/batch/b4/shap",
+        "cardiovascular/single/b1/noshap", "cardiovascular/batch/b4/noshap",
+    ]
+    for result in report["results"]:
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"]
+        assert result["throughput_rows_s"] > 0
+        assert result["peak_rss_mb"] > 0
+    assert compare(report, report) == []
+
+
+def test_peak_rss_is_reset_between_scenarios():
+    block = np.ones(25_000_000)  # ~200 MB
+    peak_with_block = _peak_rss_mb()
+    del block
+    if not _reset_peak_rss():
+        pytest.skip("peak RSS cannot be reset on this platform")
+
+    # Earlier scenarios' allocations no longer count towards the next peak
+    assert _peak_rss_mb() < peak_with_block - 100
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+
+from app.ml import bm25_index
+from app.ml.bm25_index import BM25Index, load_or_build_index, tokenize, top_k
+from app.ml.rag_system import KnowledgeBase, RAGCoachSystem, RAGRetriever
+
+QUERIES = ["actividad física caminar", "sueño horas dormir", "tabaco dejar de fumar fumar", "xyz"]
+
+
+@pytest.fixture
+def kb_dir(tmp_path):
+    kb = tmp_path / "kb"
+    kb.mkdir()
+    (kb / "actividad.md").write_text(
+        "Caminar ayuda.\n## Actividad física\nCaminar 150 minutos de actividad física moderada por semana.\n"
+        "## Fuerza\nEjercicios de fuerza dos días por semana.\n", encoding="utf-8")
+    (kb / "sueno.md").write_text(
+        "## Sueño\nDormir entre 7 y 9 horas por noche.\n## Higiene del sueño\nHorarios regulares, sin pantallas.\n",
+        encoding="utf-8")
+    (kb / "tabaco.md").write_text("## Tabaco\nDejar de fumar reduce el riesgo cardiovascular.\n", encoding="utf-8")
+    return kb
+
+
+def test_scores_match_bm25okapi(kb_dir):
+    chunks = KnowledgeBase(str(kb_dir)).get_all_chunks()
+    reference = BM25Okapi([tokenize(chunk["full_text"]) for chunk in chunks])
+    index = BM25Index.from_chunks(chunks)
+
+    for query in QUERIES:
+        tokens = tokenize(query)
+        np.testing.assert_allclose(index.get_scores(tokens), reference.get_scores(tokens), rtol=1e-12, atol=0)
+
+    batch = index.score_batch([tokenize(query) for query in QUERIES])
+    for row, query in zip(batch, QUERIES):
+        np.testing.assert_array_equal(row, index.get_scores(tokenize(query)))
+
+
+@pytest.mark.parametrize("k", [1, 3, 7, 50])
+def test_top_k_matches_stable_sort(k):
+    rng = np.random.default_rng(k)
+    for scores in (np.zeros(40), rng.choice([-0.5, 0.0, 0.0, 1.25, 2.0], size=40), rng.normal(size=40)):
+        expected = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+        assert top_k(scores, k).tolist() == expected
+
+
+def test_persisted_index_is_reused_until_kb_content_changes(kb_dir, tmp_path, monkeypatch):
+    index_root = tmp_path / "index"
+    built = load_or_build_index(kb_dir, index_root)
+    first_dir = bm25_index.current_index_dir(index_root)
+    assert isinstance(built.weights, np.memmap)
+
+    def no_rebuild(*args, **kwargs):
+        raise AssertionError("index rebuilt without a content change")
+
+    monkeypatch.setattr(bm25_index, "build_index", no_rebuild)
+    loaded = load_or_build_index(kb_dir, index_root)
+    assert loaded.chunks[2] == built.chunks[2]
+    # New mtime, same content (e.g. fresh checkout): still reused
+    os.utime(kb_dir / "sueno.md", ns=(1, 1))
+    load_or_build_index(kb_dir, index_root)
+
+    monkeypatch.undo()
+    (kb_dir / "sueno.md").write_text("## Sueño\nDormir 8 horas.\n", encoding="utf-8")
+    rebuilt = load_or_build_index(kb_dir, index_root)
+    assert bm25_index.current_index_dir(index_root) != first_dir
+    assert not first_dir.exists()
+    assert rebuilt.manifest["n_docs"] == len(KnowledgeBase(str(kb_dir)).get_all_chunks())
+
+
+def test_retriever_over_persisted_index_matches_in_memory(kb_dir, tmp_path):
+    in_memory = RAGRetriever(KnowledgeBase(str(kb_dir)))
+    persisted = RAGCoachSystem(str(kb_dir), api_key=None, index_dir=str(tmp_path / "index")).retriever
+
+    for query in QUERIES:
+        assert persisted.retrieve(query, top_k=3) == in_memory.retrieve(query, top_k=3)
+    assert RAGRetriever(KnowledgeBase(str(tmp_path / "empty"))).retrieve("caminar") == []
+
+
+def test_retrieve_batch_and_query_cache(kb_dir):
+    retriever = RAGRetriever(KnowledgeBase(str(kb_dir)))
+
+    batch = retriever.retrieve_batch(QUERIES, top_k=2)
+    assert batch == [retriever.retrieve(query, top_k=2) for query in QUERIES]
+    assert retriever.cache_stats()["hits"] == len(QUERIES)
+
+    # Same normalized tokens, different case/punctuation/order: served from the cache
+    hit = retriever.retrieve("Caminar, FÍSICA actividad!", top_k=2)
+    assert hit == batch[0]
+    hit[0]["score"] = -1.0
+    assert retriever.retrieve("actividad física caminar", top_k=2) == batch[0]
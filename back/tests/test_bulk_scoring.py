@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+
+from app.ml.bulk_scoring import score_file
+from app.ml.predictor import predict_risk
+
+ROWS = [
+    {"SEQN": 1, "RIDAGEYR": 52, "RIAGENDR": 1, "BMXHT": 178, "BMXWT": 88, "BMXBMI": 27.8, "BMXWAIST": 98,
+     "LAB_LBXGLU": 110, "LAB_LBDHDD": 42, "LAB_LBXTR": 180, "LAB_LBDLDL": 140},
+    {"SEQN": 2, "RIDAGEYR": 28, "RIAGENDR": 2, "BMXHT": 165, "BMXWT": 58, "BMXBMI": None, "BMXWAIST": None,
+     "LAB_LBXGLU": 85, "LAB_LBDHDD": 65, "LAB_LBXTR": 90, "LAB_LBDLDL": 100},
+    {"SEQN": 3, "RIDAGEYR": 40, "RIAGENDR": 2, "BMXHT": None, "BMXWT": None, "BMXBMI": None, "BMXWAIST": 80,
+     "LAB_LBXGLU": 90, "LAB_LBDHDD": 50, "LAB_LBXTR": 100, "LAB_LBDLDL": 110},
+    {"SEQN": 4, "RIDAGEYR": 68, "RIAGENDR": 1, "BMXHT": None, "BMXWT": None, "BMXBMI": 34.5, "BMXWAIST": None,
+     "LAB_LBXGLU": 145, "LAB_LBDHDD": None, "LAB_LBXTR": 250, "LAB_LBDLDL": None},
+    {"SEQN": 5, "RIDAGEYR": 35, "RIAGENDR": 1, "BMXHT": 180, "BMXWT": 75, "BMXBMI": 23.1, "BMXWAIST": 85,
+     "LAB_LBXGLU": 92, "LAB_LBDHDD": 55, "LAB_LBXTR": 110, "LAB_LBDLDL": 105},
+]
+
+
+def _read_parts(output_dir, suffix="csv"):
+    read = pd.read_parquet if suffix == "parquet" else pd.read_csv
+    return pd.concat(
+        [read(path) for path in sorted(output_dir.glob(f"part-*.{suffix}"))], ignore_index=True
+    )
+
+
+def test_bulk_scoring_matches_predict_risk_and_resumes(tmp_path):
+    input_path = tmp_path / "cohort.csv"
+    pd.DataFrame(ROWS).to_csv(input_path, index=False)
+    output_dir = tmp_path / "scores"
+    options = dict(chunk_size=2, top_drivers=2, id_column="SEQN", output_format="csv")
+
+    summary = score_file(input_path, output_dir, **options)
+    assert summary["scored_chunks"] == 3 and summary["rows"] == 5 and summary["errors"] == 1
+
+    scored = _read_parts(output_dir)
+    assert scored["row"].tolist() == [0, 1, 2, 3, 4]
+    assert scored["SEQN"].tolist() == [1, 2, 3, 4, 5]
+    assert scored["error"].notna().tolist() == [False, False, True, False, False]
+    assert scored.loc[2, ["diabetes_score", "cardiovascular_score"]].isna().all()
+
+    expected = predict_risk(
+        age=52, sex="M", height_cm=178, weight_kg=88, bmi=27.8, waist_cm=98, glucosa_mgdl=110,
+        hdl_mgdl=42, trigliceridos_mgdl=180, ldl_mgdl=140, model_type="cardiovascular",
+    )
+    assert scored.loc[0, "cardiovascular_score"] == pytest.approx(expected["score"])
+    assert scored.loc[0, "cardiovascular_risk_level"] == expected["risk_level"]
+    assert scored.loc[0, "cardiovascular_driver_1"] == expected["drivers"][0]["feature"]
+
+    # Interrupted run: only the missing chunk is scored again
+    (output_dir / "part-000001.csv").unlink()
+    resumed = score_file(input_path, output_dir, **options)
+    assert resumed["scored_chunks"] == 1 and resumed["skipped_chunks"] == 2
+    pd.testing.assert_frame_equal(_read_parts(output_dir), scored)
+
+    with pytest.raises(ValueError, match="chunk_size"):
+        score_file(input_path, output_dir, **dict(options, chunk_size=3))
+
+
+def test_bulk_scoring_parquet_round_trip_and_resume(tmp_path):
+    input_path = tmp_path / "cohort.parquet"
+    pd.DataFrame(ROWS).to_parquet(input_path, index=False)
+    output_dir = tmp_path / "scores"
+    options = dict(chunk_size=2, top_drivers=1, id_column="SEQN")
+
+    summary = score_file(input_path, output_dir, **options)
+    assert summary["scored_chunks"] == 3 and summary["rows"] == 5 and summary["errors"] == 1
+    assert not list(output_dir.glob("part-*.csv"))
+
+    scored = _read_parts(output_dir, "parquet")
+    assert scored["SEQN"].tolist() == [1, 2, 3, 4, 5]
+    assert scored["error"].notna().tolist() == [False, False, True, False, False]
+
+    csv_input = tmp_path / "cohort.csv"
+    pd.DataFrame(ROWS).to_csv(csv_input, index=False)
+    score_file(csv_input, tmp_path / "from_csv", **options)
+    pd.testing.assert_frame_equal(_read_parts(tmp_path / "from_csv", "parquet"), scored, check_dtype=False)
+
+    # Interrupted run: only the missing chunk is scored again
+    (output_dir / "part-000002.parquet").unlink()
+    resumed = score_file(input_path, output_dir, **options)
+    assert resumed["scored_chunks"] == 1 and resumed["skipped_chunks"] == 2
+    pd.testing.assert_frame_equal(_read_parts(output_dir, "parquet"), scored)
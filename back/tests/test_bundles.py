@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from app.ml.bundles import convert_pickles, current_bundle_dir, load_bundle
+from app.ml.model_loader import load_pickled_model
+from app.ml.nhanes import load_nhanes_profiles
+from app.ml.predictor import _impute, build_profile_matrix
+
+
+@pytest.fixture(scope="module")
+def profiles():
+    return load_nhanes_profiles(limit=300)
+
+
+@pytest.mark.parametrize("model_type", ["diabetes", "cardiovascular"])
+def test_bundle_matches_pickled_model(model_type, profiles, tmp_path):
+    bundle_dir = convert_pickles(model_type, root=tmp_path)
+    assert current_bundle_dir(model_type, root=tmp_path) == bundle_dir
+
+    model, imputer, feature_names, manifest = load_bundle(bundle_dir)
+    pickled_model, pickled_imputer, pickled_names = load_pickled_model(model_type)
+    assert feature_names == list(pickled_names)
+    assert manifest["version"] == bundle_dir.name
+
+    _, X = build_profile_matrix(profiles, model_type, feature_names)
+    if model_type == "diabetes":
+        assert isinstance(imputer.statistics_, np.memmap)
+        np.testing.assert_array_equal(_impute(imputer, X, feature_names), _impute(pickled_imputer, X, feature_names))
+        X = _impute(imputer, X, feature_names)
+        expected = pickled_model.predict_proba(X)
+    else:
+        import pandas as pd
+        expected = pickled_model.predict_proba(pd.DataFrame(X, columns=feature_names))
+
+    np.testing.assert_allclose(model.predict_proba(X), expected, rtol=0, atol=1e-12)
+
+
+def test_checksum_mismatch_is_rejected(tmp_path):
+    bundle_dir = convert_pickles("cardiovascular", root=tmp_path)
+    coef = np.load(bundle_dir / "coef.npy")
+    np.save(bundle_dir / "coef.npy", coef * 2)
+
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        load_bundle(bundle_dir)
+
+
+def test_reconverting_identical_model_keeps_version(tmp_path):
+    first = convert_pickles("diabetes", root=tmp_path)
+    second = convert_pickles("diabetes", root=tmp_path)
+    assert first == second
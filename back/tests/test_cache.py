@@ -0,0 +1,35 @@
+from app.utils import cache as cache_module
+from app.utils.cache import TTLCache
+
+
+def test_lru_eviction_and_counters():
+    cache = TTLCache(maxsize=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" becomes least recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (2, 1, 1, 2)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl_seconds=5)
+    cache.set("a", 1)
+
+    now[0] += 4
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_zero_maxsize_disables_cache():
+    cache = TTLCache(maxsize=0)
+    cache.set("a", 1)
+    assert not cache.enabled
+    assert cache.get("a") is None
@@ -0,0 +1,46 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.agents import conversational_agent
+from app.schemas.analisis_schema import AnalisisEntrada
+from app.services import ml_service
+
+TOOL_ARGS = {
+    "edad": 55, "genero": "M", "altura_cm": 172, "peso_kg": 90, "circunferencia_cintura": 104,
+    "glucosa_mgdl": 110, "hdl_mgdl": 38, "ldl_mgdl": 150, "trigliceridos_mgdl": 190,
+    "modelo_a_usar": "cardiovascular",
+}
+
+
+class _FakeCompletions:
+    def create(self, **kwargs):
+        call = SimpleNamespace(function=SimpleNamespace(arguments=json.dumps(TOOL_ARGS)))
+        message = SimpleNamespace(tool_calls=[call], content=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_tool_call_prediction_matches_validated_request(monkeypatch):
+    monkeypatch.setattr(conversational_agent, "client", SimpleNamespace(chat=SimpleNamespace(completions=_FakeCompletions())))
+    plan_calls = []
+
+    def fake_plan(prediccion, datos):
+        plan_calls.append((prediccion, datos))
+        return "plan", ["cita"]
+
+    monkeypatch.setattr(conversational_agent, "generar_plan_con_rag", fake_plan)
+
+    text, assessment, made = conversational_agent.process_chat_message([{"role": "user", "content": "listo"}])
+
+    assert made
+    expected = ml_service.obtener_prediccion(AnalisisEntrada(**TOOL_ARGS), model_type="cardiovascular")
+    assert assessment["risk_score"] == pytest.approx(expected["score"])
+    assert [d.feature for d in assessment["drivers"]] == [d["feature"] for d in expected["drivers"]]
+
+    prediccion, datos = plan_calls[0]
+    assert prediccion.categoria_riesgo == expected["categoria_riesgo"]
+    assert datos.imc == pytest.approx(90 / 1.72 ** 2)
+    # The frontend payload keeps the tool arguments as the LLM sent them
+    assert assessment["assessment_data"]["imc"] is None
+    assert assessment["assessment_data"]["model_used"] == "cardiovascular"
@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from xgboost import XGBClassifier
+
+from app.ml.explainers import LinearExplanationPlan, ReferenceDriverStore, TreeContributionExplainer, top_k_indices
+from app.ml.model_loader import load_pickled_model
+from app.ml.predictor import build_profile_matrix
+
+FEATURES = ["f_a", "f_b", "f_c"]
+
+CARDIO_PROFILES = [
+    dict(age=52, sex="M", height_cm=178, weight_kg=88, waist_cm=98,
+         glucosa_mgdl=110, hdl_mgdl=42, trigliceridos_mgdl=180, ldl_mgdl=140),
+    dict(age=68, sex="F", bmi=34.5, glucosa_mgdl=145, trigliceridos_mgdl=250),
+]
+
+
+def _fit(seed):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, len(FEATURES)))
+    y = (X[:, 0] + 0.5 * X[:, 1] + rng.normal(scale=0.5, size=200) > 0).astype(int)
+    return XGBClassifier(n_estimators=20, max_depth=3, random_state=seed).fit(
+        np.asarray(X, dtype=np.float32), y
+    ), X
+
+
+def test_contributions_average_calibrated_folds():
+    (fold_a, X), (fold_b, _) = _fit(0), _fit(1)
+    calibrated = SimpleNamespace(
+        calibrated_classifiers_=[SimpleNamespace(estimator=fold_a), SimpleNamespace(estimator=fold_b)]
+    )
+
+    averaged = TreeContributionExplainer.from_model(calibrated).contributions(X)
+    expected = (
+        TreeContributionExplainer.from_model(fold_a).contributions(X)
+        + TreeContributionExplainer.from_model(fold_b).contributions(X)
+    ) / 2
+
+    assert averaged.shape == (len(X), len(FEATURES))
+    np.testing.assert_allclose(averaged, expected, rtol=1e-6)
+
+
+def test_contributions_match_shap_tree_explainer():
+    shap = pytest.importorskip("shap")
+    model, X = _fit(0)
+
+    native = TreeContributionExplainer.from_model(model).contributions(X)
+    reference = np.asarray(shap.TreeExplainer(model).shap_values(X))
+
+    np.testing.assert_allclose(native, reference, rtol=1e-5, atol=1e-6)
+
+
+def test_non_tree_model_has_no_native_explainer():
+    assert TreeContributionExplainer.from_model(object()) is None
+
+
+def test_linear_plan_matches_pipeline_transform():
+    model, _, feature_names = load_pickled_model("cardiovascular")
+    _, X = build_profile_matrix(CARDIO_PROFILES, "cardiovascular", feature_names)
+    pipeline = model.calibrated_classifiers_[0].estimator
+
+    plan = LinearExplanationPlan.from_model(model, feature_names)
+    expected = pipeline.named_steps["pre"].transform(
+        pd.DataFrame(X, columns=feature_names)
+    ) * pipeline.named_steps["clf"].coef_[0]
+
+    np.testing.assert_allclose(plan.contributions(X), expected, rtol=1e-9, atol=1e-12)
+    # Reordered input columns are mapped back through input_index
+    reordered = LinearExplanationPlan.from_model(model, feature_names[::-1])
+    np.testing.assert_allclose(reordered.contributions(X[:, ::-1]), expected, rtol=1e-9, atol=1e-12)
+
+
+def test_top_k_indices_matches_full_stable_sort():
+    contributions = np.random.default_rng(0).normal(size=(50, 19))
+    expected = np.argsort(-np.abs(contributions), axis=1, kind="stable")[:, :5]
+
+    np.testing.assert_array_equal(top_k_indices(contributions, 5), expected)
+    # Fewer features than k: every column, strongest first
+    small = contributions[:, :3]
+    np.testing.assert_array_equal(
+        top_k_indices(small, 5), np.argsort(-np.abs(small), axis=1, kind="stable")
+    )
+
+
+def test_reference_store_recovers_exact_top_drivers():
+    rng = np.random.default_rng(0)
+    rows = rng.normal(size=(2100, 4))
+    contributions = rows * np.array([3.0, -2.0, 1.0, 0.3])
+    store = ReferenceDriverStore([f"f{i}" for i in range(4)], rows[:2000], contributions[:2000], k=3)
+
+    approximate = store.contributions(rows[2000:])
+
+    top_exact = top_k_indices(contributions[2000:], 2)
+    top_approximate = top_k_indices(approximate, 2)
+    assert np.mean(top_exact[:, 0] == top_approximate[:, 0]) > 0.8
+
+
+def test_saturated_explainer_serves_flagged_approximate_drivers(monkeypatch):
+    import threading
+
+    from app.ml import predictor
+
+    profile = {"age": 52, "sex": "F", "height_cm": 160, "weight_kg": 85, "waist_cm": 101}
+    exact = predictor.predict_risk(model_type="diabetes", **profile)
+
+    busy = threading.BoundedSemaphore(1)
+    busy.acquire()
+    monkeypatch.setattr(predictor, "_exact_explanation_slots", busy)
+    approximate = predictor.predict_risk(model_type="diabetes", **profile)
+
+    assert exact["drivers_approximate"] is False
+    assert approximate["drivers_approximate"] is True
+    assert approximate["score"] == exact["score"]
+    assert len(approximate["drivers"]) == len(exact["drivers"])
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from app.ml.feature_engineering import (
+    CARDIO_FEATURE_COLUMNS,
+    DIABETES_FEATURE_COLUMNS,
+    build_cardiovascular_feature_frame,
+    build_feature_frame,
+    get_feature_plan,
+)
+
+DIABETES_PROFILES = [
+    dict(age=52, sex="M", height_cm=178, weight_kg=88, waist_cm=98, sleep_hours=6,
+         smokes_cig_day=10, days_mvpa_week=2, systolic_bp=135, total_cholesterol=250),
+    dict(age=28, sex="F", height_cm=165, weight_kg=58, waist_cm=68, sleep_hours=8,
+         smokes_cig_day=0, days_mvpa_week=6),
+    dict(age=61, sex="F", bmi=31.2, waist_cm=95),
+    dict(age=45, sex=None, height_cm=170, weight_kg=70),
+]
+
+CARDIO_PROFILES = [
+    dict(edad=52, genero="M", altura_cm=178, peso_kg=88, circunferencia_cintura=98,
+         glucosa_mgdl=110, hdl_mgdl=42, trigliceridos_mgdl=180, ldl_mgdl=140),
+    dict(edad=28, genero="F", imc=21.3, circunferencia_cintura=68, glucosa_mgdl=85,
+         hdl_mgdl=65, trigliceridos_mgdl=90, ldl_mgdl=100),
+    dict(edad=70, genero="X", altura_cm=160, peso_kg=75, hdl_mgdl=0, ldl_mgdl=120),
+]
+
+
+@pytest.mark.parametrize("profile", DIABETES_PROFILES)
+@pytest.mark.parametrize("feature_names", [
+    DIABETES_FEATURE_COLUMNS,
+    list(reversed(DIABETES_FEATURE_COLUMNS)) + ["unknown_feature"],
+])
+def test_diabetes_plan_matches_pandas_path(profile, feature_names):
+    expected = build_feature_frame(**profile, feature_names=feature_names).to_numpy(dtype=float)
+    row = get_feature_plan("diabetes", feature_names).build_row(**profile)
+
+    assert row.dtype == np.float64
+    np.testing.assert_array_equal(row, expected)
+
+
+@pytest.mark.parametrize("profile", CARDIO_PROFILES)
+@pytest.mark.parametrize("feature_names", [
+    CARDIO_FEATURE_COLUMNS,
+    CARDIO_FEATURE_COLUMNS[::-1] + ["unknown_feature"],
+])
+def test_cardiovascular_plan_matches_pandas_path(profile, feature_names):
+    expected = build_cardiovascular_feature_frame(**profile, feature_names=feature_names).to_numpy(dtype=float)
+    row = get_feature_plan("cardiovascular", feature_names).build_row(**profile)
+
+    np.testing.assert_array_equal(row, expected)
+
+
+def test_plan_writes_into_given_buffer():
+    plan = get_feature_plan("diabetes", DIABETES_FEATURE_COLUMNS)
+    out = np.zeros((1, plan.n_features))
+
+    result = plan.build_row(out=out, **DIABETES_PROFILES[0])
+
+    assert result is out
+    assert out[0, DIABETES_FEATURE_COLUMNS.index("age")] == 52.0
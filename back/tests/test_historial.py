@@ -0,0 +1,141 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from app.core import database
+from app.services import historial_service
+
+
+def _split_top_level(filters):
+    parts, depth, current = [], 0, ""
+    for char in filters:
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += char == "("
+        depth -= char == ")"
+        current += char
+    return parts + [current]
+
+
+def _matches(row, condition):
+    if condition.startswith("and("):
+        return all(_matches(row, part) for part in _split_top_level(condition[4:-1]))
+    column, op, value = condition.split(".", 2)
+    current = row.get(column)
+    if op == "is":
+        return current is None
+    if current is None:
+        return False
+    typed = type(current)(value)
+    return {"eq": current == typed, "lt": current < typed, "gt": current > typed}[op]
+
+
+class _FakeQuery:
+    """Minimal PostgREST query builder over in-memory rows."""
+
+    def __init__(self, rows, calls):
+        self.rows, self.calls, self._limit = list(rows), calls, None
+        self._order = []
+
+    def select(self, columns):
+        self.calls.append(("select", columns))
+        self.columns = columns.split(",")
+        return self
+
+    def eq(self, column, value):
+        self.rows = [r for r in self.rows if r.get(column) == value]
+        return self
+
+    def gte(self, column, value):
+        self.rows = [r for r in self.rows if r.get(column) is not None and r[column] >= value]
+        return self
+
+    def lte(self, column, value):
+        self.rows = [r for r in self.rows if r.get(column) is not None and r[column] <= value]
+        return self
+
+    def or_(self, filters):
+        self.rows = [r for r in self.rows if any(_matches(r, c) for c in _split_top_level(filters))]
+        return self
+
+    def order(self, column, desc=False, nullsfirst=None):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size):
+        self._limit = size
+        return self
+
+    def execute(self):
+        rows = self.rows
+        for column, desc in reversed(self._order):
+            present = sorted((r for r in rows if r[column] is not None), key=lambda r: r[column], reverse=desc)
+            rows = present + [r for r in rows if r[column] is None]  # NULLs last
+        rows = [{c: r.get(c) for c in self.columns} for r in rows[: self._limit]]
+        return type("Response", (), {"data": rows, "error": None})()
+
+
+class _FakeClient:
+    def __init__(self, rows):
+        self.rows, self.calls = rows, []
+
+    def table(self, name):
+        assert name == "analisis_salud"
+        return _FakeQuery(self.rows, self.calls)
+
+
+@pytest.fixture
+def rows(monkeypatch):
+    rng = random.Random(3)
+    data = []
+    for analisis_id in range(1, 46):
+        fecha = None if analisis_id % 11 == 0 else (date(2025, 1, 1) + timedelta(days=rng.randint(0, 20))).isoformat()
+        data.append({
+            "id": analisis_id, "usuario_id": "u1", "fecha": fecha, "created_at": "2025-02-01T10:00:00",
+            "modelo": "diabetes" if analisis_id % 3 else "cardiovascular",
+            "riesgo_predicho": rng.random(), "categoria_riesgo": rng.choice(["Bajo", "moderate", "Alto"]),
+            "recomendacion_ia": "plan largo " * 100,
+        })
+    data.append(dict(data[0], id=99, usuario_id="u2"))
+    client = _FakeClient(data)
+    monkeypatch.setattr(database, "get_supabase", lambda access_token=None: client)
+    return data
+
+
+def test_keyset_pages_cover_history_once_in_order(rows):
+    seen, cursor = [], None
+    while True:
+        page = historial_service.obtener_historial("u1", limite=7, cursor=cursor)
+        assert "recomendacion_ia" not in page["historial"][0]
+        seen.extend(page["historial"])
+        cursor = page["siguiente_cursor"]
+        if cursor is None:
+            break
+
+    dated = sorted((r for r in rows if r["usuario_id"] == "u1" and r["fecha"]), key=lambda r: (r["fecha"], r["id"]), reverse=True)
+    undated = sorted((r for r in rows if r["usuario_id"] == "u1" and not r["fecha"]), key=lambda r: r["id"], reverse=True)
+    assert [r["id"] for r in seen] == [r["id"] for r in dated + undated]
+
+
+def test_invalid_cursor_is_a_client_error(rows):
+    assert historial_service.obtener_historial("u1", cursor="no-es-un-cursor")["status_code"] == 400
+
+
+def test_trajectory_aggregates_per_model_and_week(rows):
+    trayectoria = historial_service.obtener_trayectoria("u1", agrupacion="semana")
+
+    user_rows = [r for r in rows if r["usuario_id"] == "u1"]
+    assert trayectoria["total_analisis"] == len(user_rows)
+    series = {serie["modelo"]: serie for serie in trayectoria["series"]}
+    assert set(series) == {"diabetes", "cardiovascular"}
+    for modelo, serie in series.items():
+        expected = [r for r in user_rows if r["modelo"] == modelo]
+        assert sum(p["n"] for p in serie["puntos"]) == len(expected)
+        assert all(p["periodo"].weekday() == 0 for p in serie["puntos"])
+        assert sum(sum(p["niveles"].values()) for p in serie["puntos"]) == len(expected)
+        assert serie["tendencia"] == pytest.approx(
+            serie["puntos"][-1]["score_promedio"] - serie["puntos"][0]["score_promedio"], abs=1e-3
+        )
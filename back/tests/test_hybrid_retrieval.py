@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from app.ml.bm25_index import BM25Index, load_or_build_index
+from app.ml.rag_system import RAGRetriever
+
+SECTIONS = {
+    "A": "caminar ejercicio aeróbico diario",
+    "B": "ejercicio caminar trotar semana",
+    "C": "caminar trotar parque tarde",
+    "D": "dormir horas sueño noche",
+    "E": "sueño noche descanso dormir",
+    "F": "tabaco fumar cigarrillos dejar",
+    "G": "fumar tabaco riesgo pulmón",
+    "H": "sal presión arterial dieta",
+    "I": "dieta sal verduras presión",
+}
+CHUNKS = [{"source": "kb.md", "section": name, "content": text, "full_text": f"{name}\n{text}"}
+          for name, text in SECTIONS.items()]
+
+
+def _sections(hits):
+    return [hit["section"] for hit in hits]
+
+
+def test_dense_channel_recalls_sections_without_query_terms():
+    hybrid = RAGRetriever(index=BM25Index.from_chunks(CHUNKS, dense_dim=4))
+    bm25_only = RAGRetriever(index=BM25Index.from_chunks(CHUNKS, dense_dim=0))
+
+    # "C" never says "ejercicio" but shares "caminar"/"trotar" with the sections that do
+    assert "C" in _sections(hybrid.retrieve("ejercicio", top_k=3))
+    assert "C" not in _sections(bm25_only.retrieve("ejercicio", top_k=2))
+    assert _sections(hybrid.retrieve("descanso", top_k=2)) == ["E", "D"]
+
+    hit = hybrid.retrieve("ejercicio", top_k=1)[0]
+    assert hit["bm25_score"] > 0 and hit["score"] == pytest.approx(2 / 61)
+
+
+def test_small_kb_falls_back_to_bm25():
+    index = BM25Index.from_chunks(CHUNKS[:2])
+    assert index.dense is None and index.manifest["dense"] is None
+    assert "bm25_score" not in RAGRetriever(index=index).retrieve("caminar")[0]
+
+
+def test_dense_vectors_are_persisted_and_dimension_changes_rebuild(tmp_path):
+    kb = tmp_path / "kb"
+    kb.mkdir()
+    (kb / "guia.md").write_text("".join(f"## {name}\n{text}\n" for name, text in SECTIONS.items()), encoding="utf-8")
+
+    built = load_or_build_index(kb, tmp_path / "index", dense_dim=4)
+    assert isinstance(built.dense.doc_vectors, np.memmap)
+    assert built.dense.doc_vectors.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(built.dense.doc_vectors, axis=1), 1.0, rtol=1e-5)
+
+    in_memory = BM25Index.from_chunks(built.chunks[:], dense_dim=4)
+    queries = [["ejercicio"], ["sal", "dieta"]]
+    np.testing.assert_allclose(built.dense_score_batch(queries), in_memory.dense_score_batch(queries), atol=1e-6)
+
+    rebuilt = load_or_build_index(kb, tmp_path / "index", dense_dim=3)
+    assert rebuilt.dense.dim == 3
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import signal
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.ml.predictor import prediction_stage_stats
+from app.services.inference_executor import InferenceExecutor, InferenceQueueFull
+from app.services.micro_batcher import score_profiles
+
+PROFILE = dict(age=52, sex="M", height_cm=178, weight_kg=88, waist_cm=98,
+               glucosa_mgdl=110, hdl_mgdl=42, trigliceridos_mgdl=180, ldl_mgdl=140)
+
+
+@pytest.fixture(scope="module")
+def executor():
+    pool = InferenceExecutor(workers=1, max_queue=0, model_types=("cardiovascular",))
+    assert pool.wait_until_ready() == 1
+    yield pool
+    pool.shutdown()
+
+
+def _batch_count():
+    return prediction_stage_stats().get("cardiovascular", {}).get("batch", {}).get("total", {}).get("count", 0)
+
+
+def test_scores_in_worker_process(executor):
+    before = _batch_count()
+    results, fell_back = asyncio.run(executor.submit(score_profiles, "cardiovascular", [PROFILE]))
+
+    assert not fell_back
+    assert 0.0 <= results[0]["score"] <= 1.0
+    stats = executor.stats()
+    assert stats["completed"] == 1
+    assert len(stats["per_worker"]) == 1
+    # Stage timings measured in the worker are recorded in this process
+    assert _batch_count() == before + 1
+
+
+def test_rejects_when_queue_is_full(executor):
+    async def run():
+        busy = asyncio.create_task(executor.submit(time.sleep, 0.5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(InferenceQueueFull):
+            await executor.submit(time.sleep, 0)
+        await busy
+
+    asyncio.run(run())
+    assert executor.stats()["rejected"] == 1
+
+
+def test_waits_for_every_worker():
+    pool = InferenceExecutor(workers=2, max_queue=0, model_types=("cardiovascular",))
+    try:
+        started = time.monotonic()
+        assert pool.wait_until_ready(timeout=60) == 2
+        assert time.monotonic() - started < 60
+    finally:
+        pool.shutdown()
+
+
+def _kill_worker():
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def test_rebuilds_pool_after_worker_dies():
+    pool = InferenceExecutor(workers=1, max_queue=0, model_types=("cardiovascular",))
+    try:
+        assert pool.wait_until_ready(timeout=60) == 1
+        with pytest.raises(BrokenProcessPool):
+            asyncio.run(pool.submit(_kill_worker))
+
+        results, _ = asyncio.run(pool.submit(score_profiles, "cardiovascular", [PROFILE]))
+        assert 0.0 <= results[0]["score"] <= 1.0
+        stats = pool.stats()
+        assert stats["rebuilds"] == 1 and stats["failed"] == 1 and stats["completed"] == 1
+    finally:
+        pool.shutdown()
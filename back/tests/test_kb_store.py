@@ -0,0 +1,70 @@
+import json
+import os
+import time
+
+import pytest
+
+from app.agents import kb_store, rag_service
+from app.agents.kb_store import KBStore
+
+
+def _write(path, doc, mtime_ns=None):
+    path.write_text(json.dumps(doc, ensure_ascii=False), encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    kb = tmp_path / "kb"
+    kb.mkdir()
+    _write(kb / "default.json", {"cita": "guia_general", "termino_clave": "default", "texto": "Hábitos saludables."})
+    _write(kb / "sueño.json", {"cita": "guia_sueno", "termino_clave": "sueño", "texto": "Dormir 7 a 9 horas."})
+    (kb / "actividad.md").write_text("## Caminar\nCaminar 150 minutos por semana.\n", encoding="utf-8")
+    store = KBStore(kb)
+    monkeypatch.setattr(rag_service, "_kb_store", store)
+    return store
+
+
+def test_search_reads_no_files_and_counts_no_tokens(store, monkeypatch):
+    store.refresh()
+
+    def forbidden(*args, **kwargs):
+        raise AssertionError("disk read or tokenization on the retrieval path")
+
+    monkeypatch.setattr(kb_store, "count_tokens", forbidden)
+    monkeypatch.setattr(rag_service, "count_tokens", forbidden)
+    monkeypatch.setattr("builtins.open", forbidden)
+    monkeypatch.setattr("pathlib.Path.read_text", forbidden)
+
+    contexto, citas = rag_service.buscar_en_kb(["sleep_hours", "bmi"])
+    assert [doc["cita"] for doc in json.loads(contexto)] == ["guia_sueno", "guia_general"]
+    assert sorted(citas) == ["guia_general", "guia_sueno"]
+    assert store.retrieve("caminar")[0]["section"] == "Caminar"
+
+
+def test_refresh_swaps_snapshot_only_when_kb_changes(store, tmp_path):
+    before = store.snapshot
+    assert store.refresh() is False
+    assert store.snapshot is before
+
+    _write(tmp_path / "kb" / "sueño.json", {"cita": "guia_sueno_v2", "texto": "Dormir 8 horas."}, mtime_ns=10**18)
+    assert store.refresh() is True
+    assert store.snapshot is not before
+    assert store.get_entry("sueño").doc["cita"] == "guia_sueno_v2"
+    # The previous snapshot is untouched for searches still holding it
+    assert before.entradas["sueño"].doc["cita"] == "guia_sueno"
+    assert store.stats()["reloads"] == 1
+
+
+def test_watcher_reloads_changed_kb(store, tmp_path):
+    store.refresh()
+    store.start_watcher(0.02)
+    try:
+        _write(tmp_path / "kb" / "imc.json", {"cita": "guia_imc", "texto": "IMC saludable."})
+        deadline = time.monotonic() + 5
+        while store.get_entry("imc") is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        store.stop_watcher()
+    assert store.get_entry("imc").tokens > 0
@@ -0,0 +1,52 @@
+from app.utils.metrics import Histogram
+
+
+def test_histogram_snapshot():
+    histogram = Histogram(buckets=(1, 5, 10))
+    for value in (0.5, 2, 3, 7, 50):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 5
+    assert snapshot["buckets"] == {"1": 1, "5": 3, "10": 4, "+Inf": 5}
+    assert snapshot["p50"] == 5
+    assert snapshot["p99"] == 50
+    assert snapshot["max"] == 50
+
+
+def test_stage_timer_records_laps_and_total():
+    from app.utils.metrics import StageMetrics
+
+    metrics = StageMetrics(buckets=(1, 10))
+    timer = metrics.timer("diabetes", "single")
+    timer.lap("features")
+    timer.lap("predict_proba")
+    timer.lap("features")
+    laps = timer.finish()
+
+    assert list(laps) == ["features", "predict_proba", "total"]
+    assert laps["total"] >= laps["features"] + laps["predict_proba"] - 1e-9
+
+    snapshot = metrics.snapshot()
+    stages = snapshot["diabetes"]["single"]
+    assert set(stages) == {"features", "predict_proba", "total"}
+    assert all(stage["count"] == 1 for stage in stages.values())
+
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+def test_stage_metrics_forwarding_drains_observations():
+    from app.utils.metrics import StageMetrics
+
+    worker, parent = StageMetrics(buckets=(1, 10)), StageMetrics(buckets=(1, 10))
+    worker.observe("diabetes", "batch", "total", 3.0)
+    worker.start_forwarding()
+    worker.timer("diabetes", "batch").finish()
+
+    forwarded = worker.drain_forwarded()
+    assert [obs[:3] for obs in forwarded] == [("diabetes", "batch", "total")]
+    assert worker.drain_forwarded() == []
+    for observation in forwarded:
+        parent.observe(*observation)
+    assert parent.snapshot()["diabetes"]["batch"]["total"]["count"] == 1
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app.services.micro_batcher import MicroBatcher
+
+
+def _fake_batch(calls):
+    def score_batch(profiles, model_type):
+        calls.append(len(profiles))
+        if any(profile.get("age") is None for profile in profiles):
+            raise ValueError("Row 0: invalid profile")
+        return [{"score": profile["age"] / 100, "model_used": model_type} for profile in profiles]
+    return score_batch
+
+
+def _fake_one(model_type, age=None):
+    if age is None:
+        raise ValueError("invalid profile")
+    return {"score": age / 100, "model_used": model_type}
+
+
+def test_concurrent_requests_share_one_batch():
+    calls = []
+    batcher = MicroBatcher(max_batch_size=32, max_wait_ms=20, score_batch=_fake_batch(calls), score_one=_fake_one)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit("diabetes", {"age": age}) for age in range(10, 20)))
+
+    results = asyncio.run(run())
+
+    # The first request runs immediately; the rest queue behind it and share one batch
+    assert calls == [1, 9]
+    assert [result["score"] for result in results] == [age / 100 for age in range(10, 20)]
+    assert batcher.stats()["batch_size"]["count"] == 2
+
+
+def test_full_batch_flushes_without_waiting():
+    calls = []
+    batcher = MicroBatcher(max_batch_size=4, max_wait_ms=10_000, score_batch=_fake_batch(calls), score_one=_fake_one)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit("cardiovascular", {"age": 40}) for _ in range(8))), timeout=5
+        )
+
+    asyncio.run(run())
+    assert sum(calls) == 8
+    assert max(calls) == 4
+
+
+def test_invalid_profile_only_fails_its_caller():
+    batcher = MicroBatcher(max_batch_size=32, max_wait_ms=5, score_batch=_fake_batch([]), score_one=_fake_one)
+
+    async def run():
+        # The first request keeps a batch in flight, so the next two are scored together
+        return await asyncio.gather(
+            batcher.submit("diabetes", {"age": 10}),
+            batcher.submit("diabetes", {"age": 50}),
+            batcher.submit("diabetes", {"age": None}),
+            return_exceptions=True,
+        )
+
+    _, ok, failed = asyncio.run(run())
+    assert ok["score"] == pytest.approx(0.5)
+    assert isinstance(failed, ValueError)
+    assert batcher.stats()["fallbacks"] == 1
+
+
+def test_timed_submit_reports_compute_time_per_row_without_queueing():
+    import time
+
+    def slow_batch(profiles, model_type):
+        time.sleep(0.05)
+        return [{"score": profile["age"] / 100} for profile in profiles]
+
+    batcher = MicroBatcher(max_batch_size=32, max_wait_ms=500, score_batch=slow_batch, score_one=_fake_one)
+
+    async def run():
+        started = time.perf_counter()
+        timed = await asyncio.gather(*(batcher.submit_timed("diabetes", {"age": age}) for age in (10, 20, 30)))
+        return timed, (time.perf_counter() - started) * 1000
+
+    timed, wall_ms = asyncio.run(run())
+
+    # The last two waited for the first batch, then shared one 50 ms batch
+    assert wall_ms >= 100
+    assert [result["score"] for result, _ in timed] == [0.1, 0.2, 0.3]
+    assert 45 <= timed[0][1] < 80
+    assert timed[1][1] == timed[2][1] and 20 <= timed[1][1] < 40
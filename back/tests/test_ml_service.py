@@ -0,0 +1,52 @@
+import pytest
+
+from app.schemas.analisis_schema import AnalisisEntrada
+from app.services import ml_service
+from app.utils.cache import TTLCache
+
+
+def test_repeated_profile_is_served_from_cache(monkeypatch):
+    monkeypatch.setattr(ml_service, "_prediction_cache", TTLCache(maxsize=8, ttl_seconds=60))
+    calls = []
+    real_predict = ml_service.predict_risk
+
+    def counting_predict(**kwargs):
+        calls.append(kwargs)
+        return real_predict(**kwargs)
+
+    monkeypatch.setattr(ml_service, "predict_risk", counting_predict)
+
+    data = AnalisisEntrada(edad=50, genero="M", altura_cm=175, peso_kg=82, circunferencia_cintura=95,
+                           glucosa_mgdl=100, hdl_mgdl=45, trigliceridos_mgdl=150, ldl_mgdl=120)
+    first = ml_service.obtener_prediccion(data, model_type="cardiovascular")
+    second = ml_service.obtener_prediccion(data.model_copy(), model_type="cardiovascular")
+
+    assert len(calls) == 1
+    assert second == first
+    assert ml_service.estadisticas_cache_predicciones()["hits"] == 1
+
+    ml_service.obtener_prediccion(data, model_type="diabetes")
+    assert len(calls) == 2
+
+
+def test_simulation_reports_factors_with_input_names_and_values():
+    import asyncio
+
+    from app.schemas.analisis_schema import RangoNumerico, SimulacionEntrada
+
+    perfil = AnalisisEntrada(edad=55, genero="F", altura_cm=160, peso_kg=82, circunferencia_cintura=98,
+                             tabaquismo=True, actividad_fisica="sedentario")
+    entrada = SimulacionEntrada(perfil=perfil, peso_kg=RangoNumerico(min=72, max=82, paso=5),
+                                tabaquismo=[True, False], actividad_fisica=["sedentario", "activo"])
+
+    result = asyncio.run(ml_service.simular_escenarios_async(entrada))
+
+    assert result["ejes"] == {"peso_kg": [72, 77, 82], "tabaquismo": [True, False],
+                              "actividad_fisica": ["sedentario", "activo"]}
+    assert result["total_variantes"] == 12
+    assert [efecto["valor"] for efecto in result["efectos"]["peso_kg"]] == [72, 77, 82]
+    assert result["efectos"]["peso_kg"][-1]["score"] == pytest.approx(result["base"]["score"])
+    assert set(result["mejor"]["valores"]) == {"peso_kg", "tabaquismo", "actividad_fisica"}
+
+    invalid = entrada.model_copy(update={"actividad_fisica": ["extremo"]})
+    assert asyncio.run(ml_service.simular_escenarios_async(invalid))["status_code"] == 400
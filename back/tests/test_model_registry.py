@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from app.ml import bundles
+from app.ml.bundles import _write_bundle, convert_pickles, load_bundle
+from app.ml.model_loader import ModelRegistry, get_model_version
+from app.ml.predictor import build_profile_matrix, predict_risk_batch
+
+PROFILE = {"age": 58, "sex": "M", "height_cm": 172, "weight_kg": 90, "waist_cm": 104,
+           "glucosa_mgdl": 110, "hdl_mgdl": 38, "trigliceridos_mgdl": 190, "ldl_mgdl": 140}
+
+
+def _write_shifted_version(bundle_dir, root, shift):
+    """New cardiovascular version with the same folds and a shifted intercept."""
+    model, _, feature_names, _ = load_bundle(bundle_dir)
+    tables = {name: np.array(table) for name, table in model.tables.items()}
+    tables["intercept"] = tables["intercept"] + shift
+    return _write_bundle("cardiovascular", "calibrated_linear", feature_names, tables, root)
+
+
+@pytest.fixture
+def bundles_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(bundles, "get_bundles_dir", lambda: tmp_path)
+    return tmp_path
+
+
+def test_refresh_swaps_version_and_keeps_held_one(bundles_root):
+    first_dir = convert_pickles("cardiovascular", root=bundles_root)
+    registry = ModelRegistry()
+    held = registry.get("cardiovascular")
+    assert held.version == first_dir.name
+
+    second_dir = _write_shifted_version(first_dir, bundles_root, shift=1.0)
+    assert registry.refresh() == ["cardiovascular"]
+
+    active = registry.get("cardiovascular")
+    assert active.version == second_dir.name
+    assert active.artifact("linear_plan", lambda: None) is not None  # warmed before the swap
+
+    # A request that grabbed the previous version keeps scoring with it
+    _, X = build_profile_matrix([PROFILE], "cardiovascular", held.feature_names)
+    assert held.model.predict_proba(X)[0, 1] < active.model.predict_proba(X)[0, 1]
+    assert registry.stats()["swaps"][-1]["from"] == first_dir.name
+
+
+def test_broken_version_is_not_activated(bundles_root):
+    first_dir = convert_pickles("cardiovascular", root=bundles_root)
+    registry = ModelRegistry()
+    registry.get("cardiovascular")
+
+    broken_dir = _write_shifted_version(first_dir, bundles_root, shift=2.0)
+    np.save(broken_dir / "coef.npy", np.zeros((3, 19)))
+
+    assert registry.refresh() == []
+    assert registry.get("cardiovascular").version == first_dir.name
+    assert registry.stats()["failed"] == {"cardiovascular": broken_dir.name}
+
+
+def test_predictions_report_model_version():
+    result = predict_risk_batch([PROFILE], model_type="cardiovascular")[0]
+
+    assert result["model_used"] == "cardiovascular"
+    assert result["model_version"] == get_model_version("cardiovascular")
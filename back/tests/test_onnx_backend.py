@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("skl2onnx")
+pytest.importorskip("onnxmltools")
+
+from app.ml.model_loader import get_inference_model
+from app.ml.onnx_backend import check_equivalence
+
+
+@pytest.mark.parametrize("model_type", ["diabetes", "cardiovascular"])
+def test_onnx_matches_sklearn_on_nhanes_rows(model_type):
+    report = check_equivalence(model_type, limit=500)
+
+    assert report["rows"] > 0
+    assert report["passed"], report
+
+
+def test_sklearn_backend_is_default():
+    assert get_inference_model("diabetes") is None
+    assert get_inference_model("cardiovascular") is None
@@ -0,0 +1,69 @@
+import pytest
+
+from app.ml.predictor import prediction_stage_stats, predict_risk, predict_risk_batch, simulate_risk_grid
+
+PROFILES = [
+    dict(age=52, sex="M", height_cm=178, weight_kg=88, waist_cm=98, sleep_hours=6,
+         smokes_cig_day=10, days_mvpa_week=2, systolic_bp=135, total_cholesterol=220,
+         glucosa_mgdl=110, hdl_mgdl=42, trigliceridos_mgdl=180, ldl_mgdl=140),
+    dict(age=28, sex="F", height_cm=165, weight_kg=58, waist_cm=68, sleep_hours=8,
+         smokes_cig_day=0, days_mvpa_week=6, glucosa_mgdl=85, hdl_mgdl=65,
+         trigliceridos_mgdl=90, ldl_mgdl=100),
+    dict(age=68, sex="M", bmi=34.5, waist_cm=None, sleep_hours=None, smokes_cig_day=None,
+         days_mvpa_week=None, glucosa_mgdl=145, hdl_mgdl=None, trigliceridos_mgdl=250, ldl_mgdl=None),
+]
+
+
+@pytest.mark.parametrize("model_type", ["diabetes", "cardiovascular"])
+def test_batch_matches_single_predictions(model_type):
+    batch = predict_risk_batch(PROFILES, model_type=model_type)
+
+    assert len(batch) == len(PROFILES)
+    for profile, result in zip(PROFILES, batch):
+        single = predict_risk(model_type=model_type, **profile)
+        assert result["score"] == pytest.approx(single["score"])
+        assert result["risk_level"] == single["risk_level"]
+        assert [d["feature"] for d in result["drivers"]] == [d["feature"] for d in single["drivers"]]
+        assert [d["shap_value"] for d in result["drivers"]] == pytest.approx(
+            [d["shap_value"] for d in single["drivers"]]
+        )
+
+
+def test_batch_reports_invalid_row():
+    with pytest.raises(ValueError, match="Row 1"):
+        predict_risk_batch([PROFILES[0], dict(age=40, sex="F")], model_type="diabetes")
+
+
+@pytest.mark.parametrize("model_type", ["diabetes", "cardiovascular"])
+def test_what_if_grid_matches_single_predictions(model_type):
+    profile = {"age": 52, "sex": "M", "height_cm": 175, "weight_kg": 95, "waist_cm": 104, "sleep_hours": 6,
+               "smokes_cig_day": 10, "days_mvpa_week": 0, "glucosa_mgdl": 105, "hdl_mgdl": 40,
+               "trigliceridos_mgdl": 170, "ldl_mgdl": 130}
+    grid = {"weight_kg": [85, 90], "days_mvpa_week": [0, 4, 7]}
+
+    surface = simulate_risk_grid(profile, grid, model_type=model_type)
+
+    assert surface["variants"] == 6
+    assert surface["baseline"]["score"] == pytest.approx(predict_risk(model_type=model_type, **profile)["score"])
+    variant = dict(profile, weight_kg=90, bmi=90 / 1.75 ** 2, days_mvpa_week=4)
+    assert surface["scores"][1][1] == pytest.approx(predict_risk(model_type=model_type, **variant)["score"])
+    assert surface["marginal"]["weight_kg"][0]["score"] == pytest.approx(
+        predict_risk(model_type=model_type, **dict(profile, weight_kg=85, bmi=85 / 1.75 ** 2))["score"]
+    )
+    assert surface["best"]["score"] == pytest.approx(min(min(row) for row in surface["scores"]))
+
+
+def test_what_if_grid_rejects_non_modifiable_fields():
+    with pytest.raises(ValueError):
+        simulate_risk_grid({"age": 40, "sex": "F", "bmi": 24}, {"age": [30, 50]})
+
+
+def test_predict_records_stage_timings():
+    predict_risk(model_type="diabetes", **PROFILES[0])
+    predict_risk_batch(PROFILES, model_type="cardiovascular")
+
+    stats = prediction_stage_stats()
+    single = stats["diabetes"]["single"]
+    assert {"features", "impute", "predict_proba", "explain", "interpret", "total"} <= set(single)
+    assert single["total"]["count"] >= 1
+    assert {"features", "predict_proba", "explain", "interpret", "total"} <= set(stats["cardiovascular"]["batch"])
@@ -0,0 +1,52 @@
+import gc
+import os
+import time
+
+import pytest
+
+from app.core import preload
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="requires Linux smaps_rollup")
+
+
+def test_memory_report_lists_forked_workers():
+    pid = os.fork()
+    if pid == 0:
+        time.sleep(5)
+        os._exit(0)
+    try:
+        report = preload.reporte_memoria(os.getpid())
+    finally:
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+
+    assert report["preload"] and report["master"]["pid"] == os.getpid()
+    worker = next(entry for entry in report["workers"] if entry["pid"] == pid)
+    # A fresh fork shares almost everything with its parent
+    assert worker["shared_mb"] > worker["unique_mb"]
+    assert report["total_pss_mb"] >= report["master"]["pss_mb"]
+
+
+def test_preload_loads_models_and_freezes_gc(monkeypatch):
+    monkeypatch.delenv(preload.MASTER_PID_ENV, raising=False)
+    try:
+        summary = preload.precargar_para_fork()
+        assert summary["components"]["models"]["status"] == "ready"
+        assert gc.get_freeze_count() > 0
+        assert os.environ[preload.MASTER_PID_ENV] == str(os.getpid())
+    finally:
+        gc.unfreeze()
+        os.environ.pop(preload.MASTER_PID_ENV, None)
+
+
+def test_preload_does_not_build_missing_reference_store(monkeypatch, tmp_path):
+    from app.ml import explainers
+
+    def fail_build(*args, **kwargs):
+        raise AssertionError("reference store built before fork")
+
+    monkeypatch.setattr(explainers, "get_reference_store_path", lambda version: tmp_path / "missing.npz")
+    monkeypatch.setattr(explainers, "build_reference_store", fail_build)
+
+    preload._cargar_modelos()
+    assert explainers.get_reference_store("diabetes", build=False) is None
@@ -0,0 +1,38 @@
+import threading
+
+from app.ml.model_loader import load_candidate_model
+from app.ml.predictor import predict_risk_batch
+from app.services.shadow_scoring import ShadowScorer
+
+PROFILE = {"age": 58, "sex": "M", "height_cm": 172, "weight_kg": 90, "waist_cm": 104,
+           "glucosa_mgdl": 110, "hdl_mgdl": 38, "trigliceridos_mgdl": 190, "ldl_mgdl": 140}
+
+
+def test_candidate_comparisons_feed_rolling_stats():
+    scorer = ShadowScorer(load_candidate_model("cardiovascular", "model_cardiovascular.pkl"), sample_rate=1.0, window=10)
+    results = predict_risk_batch([PROFILE], model_type="cardiovascular")
+
+    assert scorer.offer("cardiovascular", [PROFILE], results, primary_ms=2.0)
+    assert not scorer.offer("diabetes", [PROFILE], results, primary_ms=2.0)
+    assert scorer.wait_idle()
+
+    stats = scorer.stats()
+    scorer.shutdown()
+    assert stats["window"] == 1
+    assert stats["category_agreement"] == 1.0
+    assert stats["score_delta"]["max_abs"] < 1e-6
+    assert stats["latency_ms_per_row"]["primary"]["p50"] == 2.0
+
+
+def test_offer_drops_samples_when_shadow_is_behind(monkeypatch):
+    scorer = ShadowScorer(load_candidate_model("cardiovascular", "model_cardiovascular.pkl"), sample_rate=1.0, max_pending=1)
+    release = threading.Event()
+    monkeypatch.setattr(scorer, "_score", lambda *args: release.wait(5))
+    results = predict_risk_batch([PROFILE], model_type="cardiovascular")
+
+    assert scorer.offer("cardiovascular", [PROFILE], results, primary_ms=1.0)
+    assert not scorer.offer("cardiovascular", [PROFILE], results, primary_ms=1.0)
+    release.set()
+    scorer.shutdown()
+
+    assert scorer.stats()["dropped"] == 1
@@ -0,0 +1,39 @@
+import pytest
+
+from app.ml.bm25_index import BM25Index
+from app.ml.rag_system import RAGRetriever
+from app.ml.spanish_analyzer import analyze, analyze_word
+
+
+@pytest.mark.parametrize("variants", [
+    ("sueño", "sueno", "SUEÑOS", "sueños"),
+    ("caminata", "caminatas", "Caminata"),
+    ("física", "fisica", "físicas"),
+    ("vez", "veces"),
+])
+def test_variants_share_one_term(variants):
+    assert len({tuple(analyze(word)) for word in variants}) == 1
+
+
+def test_stopwords_are_dropped_before_folding():
+    assert analyze("La falta de sueño y el riesgo de la obesidad") == ["falt", "suen", "riesg", "obesidad"]
+    # "si" (if) is a stopword, "sí" (yes) is not; negations are kept
+    assert analyze("si sí no sin") == ["si", "no", "sin"]
+
+
+def test_term_dictionary_is_memoized():
+    analyze_word.cache_clear()
+    analyze("dormir horas dormir horas")
+    assert analyze_word.cache_info().hits == 2
+
+
+def test_queries_match_accent_and_plural_variants():
+    chunks = [
+        {"source": "kb.md", "section": "Sueño", "content": "", "full_text": "Sueño\nDormir entre 7 y 9 horas."},
+        {"source": "kb.md", "section": "Tabaco", "content": "", "full_text": "Tabaco\nDejar de fumar cigarrillos."},
+        {"source": "kb.md", "section": "Sal", "content": "", "full_text": "Sal\nReducir la sal de las comidas."},
+    ]
+    retriever = RAGRetriever(index=BM25Index.from_chunks(chunks, dense_dim=0))
+
+    assert retriever.retrieve("problemas de sueno", top_k=1)[0]["section"] == "Sueño"
+    assert retriever.retrieve("el cigarrillo", top_k=1)[0]["section"] == "Tabaco"